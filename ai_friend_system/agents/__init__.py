@@ -1,15 +1,22 @@
 from .base_agent import BaseAgent
+from .lexicon import Lexicon, lexicon
 from .task_agent import TaskAgent
 from .emotion_agent import EmotionAgent
 from .context_agent import ContextAgent
+from .registry import AgentRegistry, AgentSpec, agent_registry
 from .agent_coordinator import AgentCoordinator
 from .advanced_emotion_analyzer import AdvancedEmotionAnalyzer  # Advanced version
 
 __all__ = [
     'BaseAgent',
+    'Lexicon',
+    'lexicon',
     'TaskAgent',
     'EmotionAgent',
     'ContextAgent',
     'AgentCoordinator',
+    'AgentRegistry',
+    'AgentSpec',
+    'agent_registry',
     'AdvancedEmotionAnalyzer'  # NEW
 ]
\ No newline at end of file
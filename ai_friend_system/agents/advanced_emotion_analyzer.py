@@ -2,18 +2,33 @@
 Advanced multi-modal emotion detection with context awareness
 Combines text sentiment, pitch analysis, conversation context, and intensity
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Hashable, Iterable, List, Optional
+from collections import defaultdict
 import re
-from textblob import TextBlob
+import numpy as np
 from utils.logger import Logger
+from utils.lru_cache import LRUCache
+from config import settings
+from .lexicon import lexicon, LexiconMatches
+from .sentiment import get_sentiment_lexicon
+from .executor import configured_mode, select_mode, run_cpu_bound, MODE_THREAD
 
 logger = Logger("AdvancedEmotionAnalyzer")
 
+# Memoized analyze() results, shared by every analyzer instance (chat, voice, agents routes)
+emotion_result_cache = LRUCache(settings.get('agents.emotion_cache_size', 2048))
+
 class AdvancedEmotionAnalyzer:
     """Advanced emotion detection with multi-modal fusion and context awareness"""
+
+    _REPEATED = re.compile(r'([a-z])\1{2,}')
     
     def __init__(self):
         self.logger = logger
+        self.sentiment = get_sentiment_lexicon()
+        # Long texts leave the event loop (thread by default; "process" for true parallelism)
+        self.execution_mode = configured_mode('advanced_emotion', MODE_THREAD)
+        self.last_loop_blocked = 0.0
         
         # Expanded emotion patterns with intensity indicators
         self.emotion_patterns = {
@@ -63,9 +78,19 @@ class AdvancedEmotionAnalyzer:
             'excited': ['happy', 'joy'],
             'neutral': ['friendly', 'calm']
         }
+
+        # Column order for batch scoring (pattern order, like analyze's dict order)
+        self._emotion_columns = list(self.emotion_patterns)
+
+        # Keywords, intensifiers and negators all live in the shared automaton
+        for emotion, patterns in self.emotion_patterns.items():
+            lexicon.register('adv.keyword', emotion, patterns['keywords'])
+            lexicon.register('adv.intensifier', emotion, patterns['intensifiers'])
+            lexicon.register('adv.negator', emotion, patterns['negators'])
     
     async def analyze(self, text: str, context: Optional[Dict[str, Any]] = None, 
-                     pitch_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                     pitch_data: Optional[Dict[str, Any]] = None,
+                     matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
         """
         Advanced multi-modal emotion analysis
         
@@ -73,55 +98,57 @@ class AdvancedEmotionAnalyzer:
             text: Input text to analyze
             context: Conversation context (previous emotions, topics)
             pitch_data: Voice pitch analysis data
+            matches: Lexicon scan of `text` if the caller already has one
         
         Returns:
             Comprehensive emotion analysis with confidence scores
         """
-        text_lower = text.lower()
-        words = set(text_lower.split())
-        
+        key = self._cache_key(text, context, pitch_data)
+        cached = emotion_result_cache.get(key)
+        if cached is not None:
+            self.last_loop_blocked = 0.0
+            return self._copy_result(cached)
+
+        mode = select_mode(self.execution_mode, len(text))
+        result, self.last_loop_blocked = await run_cpu_bound(
+            self, 'analyze_sync', text, context, pitch_data, matches, mode=mode
+        )
+        emotion_result_cache.set(key, self._copy_result(result))
+        return result
+
+    def warm_cache(self, texts: Iterable[str]) -> int:
+        """Precompute context-free results for known texts (e.g. canned replies)"""
+        texts = [text for text in dict.fromkeys(texts) if text]
+        for text, result in zip(texts, self.analyze_many(texts)):
+            emotion_result_cache.set(self._cache_key(text, None, None), result)
+        return len(texts)
+
+    def _cache_key(self, text: str, context: Optional[Dict[str, Any]],
+                   pitch_data: Optional[Dict[str, Any]]) -> Hashable:
+        """Only what analyze_sync actually reads: lowercased text plus the
+        all-caps flag, the pitch bucket and the previous-emotion transition"""
+        stripped = text.strip()
+        caps = text.isupper() and len(text) > 3
+        pitch = (self._pitch_to_emotion(pitch_data), pitch_data.get('emotion_hint')) if pitch_data else None
+        previous = None
+        if context is not None:
+            previous = context.get('previous_emotion')
+            previous = (previous if previous in self.emotion_transitions else None,)
+        return stripped.lower(), caps, pitch, previous
+
+    @staticmethod
+    def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        return {**result, 'all_emotions': dict(result['all_emotions'])}
+
+    def analyze_sync(self, text: str, context: Optional[Dict[str, Any]] = None,
+                     pitch_data: Optional[Dict[str, Any]] = None,
+                     matches: Optional[LexiconMatches] = None) -> Dict[str, Any]:
+        """CPU-bound body of analyze(); safe to run off the event loop"""
         # 1. TEXT-BASED EMOTION DETECTION (enhanced)
-        emotion_scores = {}
-        intensity_multiplier = 1.0
+        emotion_scores = self._keyword_scores(matches or lexicon.scan(text))
         
-        for emotion, patterns in self.emotion_patterns.items():
-            score = 0.0
-            
-            # Keyword matching
-            keyword_matches = len(words & patterns['keywords'])
-            if keyword_matches > 0:
-                score += keyword_matches * 0.3
-            
-            # Check for intensifiers before keywords
-            for intensifier in patterns['intensifiers']:
-                if intensifier in text_lower:
-                    # Check if intensifier is near emotion keywords
-                    intensifier_pos = text_lower.find(intensifier)
-                    for keyword in patterns['keywords']:
-                        keyword_pos = text_lower.find(keyword)
-                        if keyword_pos != -1 and abs(intensifier_pos - keyword_pos) < 20:
-                            intensity_multiplier = max(intensity_multiplier, 1.5)
-                            score += 0.2
-                            break
-            
-            # Check for negators (invert emotion)
-            for negator in patterns['negators']:
-                if negator in text_lower:
-                    negator_pos = text_lower.find(negator)
-                    for keyword in patterns['keywords']:
-                        keyword_pos = text_lower.find(keyword)
-                        if keyword_pos != -1 and abs(negator_pos - keyword_pos) < 10:
-                            score *= 0.3  # Reduce emotion score
-                            break
-            
-            if score > 0:
-                emotion_scores[emotion] = score * intensity_multiplier
-        
-        # 2. SENTIMENT ANALYSIS (TextBlob)
-        blob = TextBlob(text)
-        sentiment = blob.sentiment
-        sentiment_polarity = sentiment.polarity
-        sentiment_subjectivity = sentiment.subjectivity
+        # 2. SENTIMENT ANALYSIS (precompiled TextBlob lexicon)
+        sentiment_polarity, sentiment_subjectivity = self.sentiment.score(text)
         
         # Map sentiment to emotions
         if sentiment_polarity > 0.4:
@@ -191,6 +218,163 @@ class AdvancedEmotionAnalyzer:
             'context_aware': context is not None
         }
     
+    def _keyword_scores(self, matches: LexiconMatches) -> Dict[str, float]:
+        """Keyword / intensifier / negator scoring from one lexicon scan"""
+        positions = {
+            category: self._positions_by_label(matches, category)
+            for category in ('adv.keyword', 'adv.intensifier', 'adv.negator')
+        }
+        
+        emotion_scores = {}
+        intensity_multiplier = 1.0
+        
+        for emotion in self.emotion_patterns:
+            keywords = positions['adv.keyword'].get(emotion)
+            if not keywords:
+                continue
+            keyword_starts = [start for starts in keywords.values() for start in starts]
+            
+            # Keyword matching (distinct keywords)
+            score = len(keywords) * 0.3
+            
+            # Intensifiers near emotion keywords
+            for starts in positions['adv.intensifier'].get(emotion, {}).values():
+                if self._near(starts, keyword_starts, 20):
+                    intensity_multiplier = max(intensity_multiplier, 1.5)
+                    score += 0.2
+            
+            # Negators near emotion keywords (invert emotion)
+            for starts in positions['adv.negator'].get(emotion, {}).values():
+                if self._near(starts, keyword_starts, 10):
+                    score *= 0.3  # Reduce emotion score
+            
+            if score > 0:
+                emotion_scores[emotion] = score * intensity_multiplier
+        
+        return emotion_scores
+
+    def analyze_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Batch analysis for stored text (no pitch / conversation context)
+
+        Identical texts are scored once; the lexicon-driven parts still walk
+        each text, but sentiment mapping, intensity, argmax and confidence
+        run as numpy operations over the whole batch.
+        """
+        if not texts:
+            return []
+
+        # Dedupe: backfills are full of "hi", "ok", "thanks"
+        slot: Dict[str, int] = {}
+        unique: List[str] = []
+        inverse = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            text = text or ''
+            j = slot.get(text)
+            if j is None:
+                j = slot[text] = len(unique)
+                unique.append(text)
+            inverse[i] = j
+
+        emotions = self._emotion_columns
+        col = {emotion: c for c, emotion in enumerate(emotions)}
+        n = len(unique)
+
+        scores = np.zeros((n, len(emotions)), dtype=np.float64)
+        polarity = np.empty(n, dtype=np.float64)
+        subjectivity = np.empty(n, dtype=np.float64)
+        repeated = np.zeros(n, dtype=bool)
+        # Punctuation and caps per text in Python: a numpy string array is
+        # fixed-width, so one long text would size every row
+        exclamations = np.empty(n, dtype=np.int64)
+        questions = np.empty(n, dtype=np.int64)
+        caps = np.zeros(n, dtype=bool)
+        for i, text in enumerate(unique):
+            for emotion, score in self._keyword_scores(lexicon.scan(text)).items():
+                scores[i, col[emotion]] = score
+            polarity[i], subjectivity[i] = self.sentiment.score(text)
+            repeated[i] = self._REPEATED.search(text.lower()) is not None
+            exclamations[i] = text.count('!')
+            questions[i] = text.count('?')
+            caps[i] = text.isupper() and len(text) > 3
+
+        # Insertion rank, so ties break like max() over analyze's dict:
+        # keyword emotions in pattern order, then the one sentiment adds
+        columns = np.arange(len(emotions))
+        rank = np.where(scores > 0, columns, columns + len(emotions))
+
+        # Sentiment -> emotion contribution (same thresholds as analyze)
+        P = polarity
+        scores[:, col['joy']] += np.where(P > 0.4, P * 0.5, 0.0)
+        scores[:, col['friendly']] += np.where((P <= 0.4) & (P > 0.1), P * 0.3, 0.0)
+        scores[:, col['sadness']] += np.where(P < -0.4, -P * 0.5, 0.0)
+        scores[:, col['anger']] += np.where((P >= -0.4) & (P < -0.1), -P * 0.3, 0.0)
+
+        # Intensity codes: 0 low, 1 medium, 2 high, 3 very_high
+        level = np.select([exclamations >= 3, exclamations >= 2, exclamations >= 1], [3, 2, 1], 0)
+        level = np.where(caps | repeated, np.where(level == 3, 3, 2), level)
+        level = np.where((questions >= 2) & (level == 0), 1, level)
+        scores *= np.where(level == 3, 1.5, np.where(level == 2, 1.2, 1.0))[:, None]
+
+        # Primary emotion + confidence
+        present = scores > 0
+        has_scores = present.any(axis=1)
+        best_score = scores.max(axis=1)
+        best = np.where(scores == best_score[:, None], rank, 2 * len(emotions)).argmin(axis=1)
+        confidence = np.minimum(1.0, best_score / np.maximum(scores.sum(axis=1), 1.0))
+        confidence = np.where(has_scores, confidence, np.where(np.abs(P) > 0.2, 0.6, 0.5))
+
+        # Intensity level (vectorized _calculate_intensity_level)
+        level_names = np.select(
+            [
+                ~has_scores,
+                (level == 3) | ((best_score > 2.0) & (confidence > 0.8)),
+                (level == 2) | ((best_score > 1.0) & (confidence > 0.7)),
+                (best_score > 0.5) & (confidence > 0.6),
+            ],
+            ['neutral', 'very_high', 'high', 'medium'],
+            'low'
+        )
+
+        # Back to plain Python once; per-element numpy indexing is slow
+        intensity_names = ('low', 'medium', 'high', 'very_high')
+        primary = np.where(P > 0.2, 'friendly', np.where(P < -0.2, 'sadness', 'neutral')).astype(object)
+        primary[has_scores] = np.array(emotions, dtype=object)[best[has_scores]]
+        order = np.argsort(np.where(present, rank, 2 * len(emotions)), axis=1, kind='stable')
+        rows = zip(
+            primary.tolist(), confidence.tolist(), scores.tolist(), order.tolist(),
+            present.sum(axis=1).tolist(), P.tolist(), subjectivity.tolist(),
+            level.tolist(), level_names.tolist()
+        )
+
+        results = [
+            {
+                'primary_emotion': emotion,
+                'confidence': round(conf, 3),
+                'all_emotions': {emotions[c]: round(row[c], 3) for c in cols[:k]},
+                'sentiment_score': round(pol, 3),
+                'subjectivity': round(subj, 3),
+                'intensity': intensity_names[code],
+                'intensity_level': level_name,
+                'pitch_contribution': None,
+                'context_aware': False
+            }
+            for emotion, conf, row, cols, k, pol, subj, code, level_name in rows
+        ]
+
+        return [results[j] for j in inverse.tolist()]
+
+    @staticmethod
+    def _positions_by_label(matches: LexiconMatches, category: str) -> Dict[str, Dict[str, List[int]]]:
+        """{label: {phrase: [start, ...]}} for one lexicon category"""
+        grouped: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for hit in matches.get(category):
+            grouped[hit.label][hit.phrase].append(hit.start)
+        return grouped
+
+    @staticmethod
+    def _near(starts: List[int], others: List[int], window: int) -> bool:
+        return any(abs(a - b) < window for a in starts for b in others)
+
     def _detect_intensity(self, text: str) -> str:
         """Detect emotional intensity from text features"""
         intensity = 'low'
@@ -209,7 +393,7 @@ class AdvancedEmotionAnalyzer:
             intensity = 'very_high' if intensity == 'very_high' else 'high'
         
         # Repeated letters (e.g., "sooo", "yesss")
-        if re.search(r'([a-z])\1{2,}', text.lower()):
+        if self._REPEATED.search(text.lower()):
             intensity = 'high' if intensity != 'very_high' else 'very_high'
         
         # Question marks (uncertainty can indicate emotion)
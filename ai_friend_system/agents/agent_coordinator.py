@@ -1,10 +1,16 @@
 import asyncio
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, Iterable, List, Optional
 from concurrent.futures import ThreadPoolExecutor
+from .base_agent import BaseAgent
 from .emotion_agent import EmotionAgent
 from .context_agent import ContextAgent
 from .task_agent import TaskAgent
+from .registry import AgentRegistry, AgentSpec, agent_registry
 from utils.logger import Logger
+from utils.lru_cache import LRUCache
+from utils.tracing import tracer
+from config import settings
 
 # class AgentCoordinator:
 #     def __init__(self):
@@ -46,67 +52,129 @@ from utils.logger import Logger
         
 #         return combined_result
 
+# Memoized agent results, shared by every session's coordinator
+agent_result_cache = LRUCache(settings.get('agents.cache_size', 512))
+
+
 class AgentCoordinator:
-    def __init__(self):
-        self.emotion_agent = EmotionAgent()
-        self.context_agent = ContextAgent()
-        self.task_agent = TaskAgent()
-
-        # Future-safe agent registry
-        self.agents = [
-            self.emotion_agent,
-            self.context_agent,
-            self.task_agent
-        ]
+    """Schedules registered agents concurrently along their dependencies
+
+    Only agents whose outputs are requested (plus what they depend on) run;
+    cacheable agents are memoized per agent.cache_key(text).
+    """
 
+    def __init__(self, registry: Optional[AgentRegistry] = None):
+        from core.performance_monitor import perf_monitor  # Local: core imports agents
+
+        self.registry = registry or agent_registry
+        self.perf_monitor = perf_monitor
+        self.cache = agent_result_cache
         self.logger = Logger("AgentCoordinator")
 
-    async def process_parallel(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        # Reduced timeout for faster responses (0.8s per agent)
-        tasks = [
-            asyncio.wait_for(agent.execute(input_data), timeout=0.8)
-            for agent in self.agents
-        ]
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        combined_result = {
-            "emotion": {},
-            "context": {},
-            "task": {},
-            "memories": [],
-            "success": True
-        }
-
-        for result in results:
-            if isinstance(result, Exception):
-                self.logger.error(f"Agent failed: {result}")
+        # Instantiate up front so every lexicon is compiled before the first scan
+        for spec in self.registry.specs():
+            spec.agent
+
+    @property
+    def agents(self) -> List[BaseAgent]:
+        return [spec.agent for spec in self.registry.specs()]
+
+    async def process_parallel(self, input_data: Dict[str, Any],
+                               outputs: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Run the agents needed for `outputs` (default: the configured pipeline outputs)"""
+        if outputs is None:
+            outputs = settings.get('agents.pipeline_outputs')
+        specs = self.registry.resolve(outputs)
+
+        text = input_data.get('text', '')
+        results: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(spec: AgentSpec):
+            if spec.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in spec.depends_on))
+
+            if len(text.strip()) < spec.min_chars:
+                self.perf_monitor.track_agent(spec.name, 0.0, "skipped")
+                results[spec.name] = {'success': True, 'agent_type': spec.name, 'result': {}}
+                return
+
+            cache_key = (spec.name, spec.agent.cache_key(text)) if self._is_cacheable(spec) else None
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.perf_monitor.track_agent(spec.name, 0.0, "cached")
+                    results[spec.name] = cached
+                    return
+
+            agent_input = input_data
+            if spec.depends_on:
+                agent_input = {
+                    **input_data,
+                    'agent_results': {dep: results[dep].get('result', {}) for dep in spec.depends_on}
+                }
+
+            start = time.perf_counter()
+            try:
+                result = await self._run_agent(spec.agent, agent_input, timeout=spec.timeout)
+            except asyncio.TimeoutError:
+                self.perf_monitor.track_agent(spec.name, time.perf_counter() - start, "timeout")
+                self.logger.warning(f"Agent {spec.name} timed out after {spec.timeout}s")
+                results[spec.name] = {'success': False, 'agent_type': spec.name, 'error': 'timeout'}
+                return
+
+            ok = isinstance(result, dict) and result.get('success', False)
+            self.perf_monitor.track_agent(
+                spec.name, time.perf_counter() - start, "ok" if ok else "error",
+                loop_blocked=result.get('loop_blocked') if isinstance(result, dict) else None
+            )
+            results[spec.name] = result
+            if ok and cache_key:
+                self.cache.set(cache_key, result)
+
+        # Dependency order guarantees dependency tasks exist before dependents
+        for spec in specs:
+            tasks[spec.name] = asyncio.create_task(run(spec))
+
+        settled = await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        combined_result = {spec.name: {} for spec in self.registry.specs()}
+        combined_result.update({"memories": [], "success": True})
+
+        for spec, outcome in zip(specs, settled):
+            if isinstance(outcome, Exception):
+                self.logger.error(f"Agent failed: {outcome}")
                 combined_result["success"] = False
                 continue
 
+            result = results.get(spec.name)
             if not isinstance(result, dict):
                 self.logger.error("Agent returned invalid data")
                 combined_result["success"] = False
                 continue
 
-            agent_type = result.get("agent_type")
-            agent_success = result.get("success", False)
             agent_output = result.get("result", {})
-
-            if agent_type not in ("emotion", "context", "task"):
-                self.logger.error(f"Unknown agent type: {agent_type}")
-                combined_result["success"] = False
-                continue
-
             if not isinstance(agent_output, dict):
                 agent_output = {}
 
-            combined_result[agent_type] = agent_output
+            combined_result[spec.name] = agent_output
 
-            if not agent_success:
+            if not result.get("success", False):
                 combined_result["success"] = False
 
             if isinstance(agent_output.get("memories"), list):
                 combined_result["memories"].extend(agent_output["memories"])
 
         return combined_result
+
+    def _is_cacheable(self, spec: AgentSpec) -> bool:
+        """Memoizable only if the agent and everything it depends on are text-determined"""
+        if not spec.cacheable:
+            return False
+        return all(self._is_cacheable(self.registry.get(dep)) for dep in spec.depends_on)
+
+    async def _run_agent(self, agent, input_data: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        with tracer.span(f"agent.{agent.agent_type}") as span:
+            result = await asyncio.wait_for(agent.execute(input_data), timeout=timeout)
+            span.set_attribute("success", bool(result.get("success")) if isinstance(result, dict) else False)
+            return result
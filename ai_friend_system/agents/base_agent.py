@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Hashable, Optional
 from datetime import datetime
 import asyncio
 
@@ -34,31 +34,77 @@ import asyncio
 
 import time
 import asyncio
+from .executor import MODE_INLINE, configured_mode, select_mode, run_cpu_bound
+from .lexicon import normalize
+from .telemetry import agent_telemetry
+from utils.text_features import TextFeatures
 
 class BaseAgent(ABC):
-    def __init__(self, agent_type: str):
+    """Agents implement process_sync (pure CPU work) or override process
+
+    execute() runs process_sync inline, on the agent thread pool or in the
+    process pool depending on the agent's mode and the input size, and
+    reports how long the event loop was blocked.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Either hook can be the implementation, which @abstractmethod can't
+        # express; still fail at class creation, not on the first turn
+        declares_abstract = any(getattr(value, '__isabstractmethod__', False) for value in vars(cls).values())
+        if not declares_abstract and cls.process_sync is BaseAgent.process_sync and cls.process is BaseAgent.process:
+            raise TypeError(f"{cls.__name__} must implement process_sync or process")
+
+    def __init__(self, agent_type: str, execution_mode: Optional[str] = None):
         self.agent_type = agent_type
+        self.execution_mode = execution_mode or configured_mode(agent_type)
+
+    def process_sync(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def cache_key(self, text: str) -> Hashable:
+        """Memoization key for cacheable agents: everything the result depends on"""
+        return ' '.join(normalize(text).split())
 
-    @abstractmethod
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        pass
+        return self.process_sync(input_data)
+
+    @staticmethod
+    def features(input_data: Dict[str, Any]) -> TextFeatures:
+        """The pipeline's shared TextFeatures, or one built from input_data['text']"""
+        return input_data.get('features') or TextFeatures(input_data.get('text', ''))
+
+    def _select_mode(self, input_data: Dict[str, Any]) -> str:
+        if type(self).process_sync is BaseAgent.process_sync:
+            return MODE_INLINE  # Async-only agent: nothing to offload
+        return select_mode(self.execution_mode, len(input_data.get('text', '')))
 
     async def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         start = time.perf_counter()
+        mode = self._select_mode(input_data)
         try:
-            result = await self.process(input_data)
-            return {
+            if mode == MODE_INLINE and type(self).process_sync is BaseAgent.process_sync:
+                result = await self.process(input_data)
+                blocked = time.perf_counter() - start  # Upper bound for async agents
+            else:
+                result, blocked = await run_cpu_bound(self, 'process_sync', input_data, mode=mode)
+            outcome = {
                 'success': True,
                 'agent_type': self.agent_type,
                 'result': result,
-                'execution_time': round(time.perf_counter() - start, 4)
+                'execution_time': round(time.perf_counter() - start, 6),
+                'mode': mode,
+                'loop_blocked': round(blocked, 6)
             }
         except asyncio.CancelledError:
             raise
         except Exception as e:
-            return {
+            outcome = {
                 'success': False,
                 'agent_type': self.agent_type,
                 'error': str(e),
-                'execution_time': round(time.perf_counter() - start, 4)
+                'execution_time': round(time.perf_counter() - start, 6),
+                'mode': mode
             }
+        agent_telemetry.record(self.agent_type, input_data, outcome, input_data.get('conversation_id'))
+        return outcome
@@ -1,47 +1,59 @@
 from typing import Dict, Any, List
 from .base_agent import BaseAgent
+from .lexicon import lexicon
+from utils.text_features import TextFeatures
 
 class ContextAgent(BaseAgent):
     def __init__(self):
         super().__init__("context")
-        # Pre-compiled sets for faster lookup
+        # Compiled into the shared lexicon automaton
         self.question_words = {'what', 'when', 'where', 'why', 'how', 'who', 'which', 'whose'}
         self.command_phrases = {'please', 'can you', 'could you', 'tell me', 'show me', 'help me'}
         self.personal_words = {'i', 'me', 'my', 'mine', 'myself', 'i am', 'my name', 'i like', 'i love'}
+        self.statement_words = {'is', 'are', 'was', 'were'}
+        self.first_person_words = {'i', 'me', 'my', 'mine'}
 
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        lexicon.register('context', 'question', self.question_words)
+        lexicon.register('context', 'command', self.command_phrases)
+        lexicon.register('context', 'personal', self.personal_words)
+        lexicon.register('context', 'statement', self.statement_words)
+        lexicon.register('context', 'first_person', self.first_person_words)
+        lexicon.register('context', 'memory', ['remember'], prefix=True)
+
+    def process_sync(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         raw_text = input_data.get('text', '')
-        text = raw_text.lower()
-        words = set(text.split())
+        features = self.features(input_data)
+        matches = input_data.get('lexicon') or lexicon.scan(raw_text)
+        found = matches.labels('context')
         history = input_data.get('history', [])
 
         intent_scores = {}
         
-        # Fast checks using set operations
-        if '?' in text or words & self.question_words:
+        # One lexicon pass covers every phrase check
+        if features.has_question or 'question' in found:
             intent_scores['question'] = 2
         
-        if words & self.command_phrases:
+        if 'command' in found:
             intent_scores['command'] = 2
         
-        if '.' in text or any(w in words for w in {'is', 'are', 'was', 'were'}):
+        if features.has_period or 'statement' in found:
             intent_scores['statement'] = 1
         
-        if words & {'i', 'me', 'my', 'mine'}:
+        if 'first_person' in found:
             intent_scores['personal'] = 1
 
         primary_intent = max(intent_scores, key=intent_scores.get) if intent_scores else 'statement'
-        entities = self._extract_entities(raw_text)
-        is_personal = bool(words & self.personal_words) or any(phrase in text for phrase in {'i am', 'my name', 'i like', 'i love'})
+        entities = self._extract_entities(features)
+        is_personal = 'personal' in found
 
         return {
             'intent': primary_intent,
             'entities': entities,
             'is_personal_info': is_personal,
-            'requires_memory': is_personal or 'remember' in text,
+            'requires_memory': is_personal or 'memory' in found,
             'conversation_depth': len(history)
         }
 
-    def _extract_entities(self, text: str) -> List[str]:
+    def _extract_entities(self, features: TextFeatures) -> List[str]:
         # Fast entity extraction - only check capitalized words
-        return [word for word in text.split() if word and word[0].isupper() and len(word) > 2]    
\ No newline at end of file
+        return [word for word in features.words if word[0].isupper() and len(word) > 2]
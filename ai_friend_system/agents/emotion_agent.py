@@ -1,32 +1,34 @@
-from typing import Dict, Any
+from typing import Dict, Any, Hashable
 from .base_agent import BaseAgent
+from .lexicon import lexicon
 from config.constants import EmotionType
 
 class EmotionAgent(BaseAgent):
     def __init__(self):
         super().__init__("emotion")
-        # Pre-compiled keyword sets for faster lookup
+        # Compiled into the shared lexicon automaton (phrases like "cant wait" match too)
         self.emotion_keywords = {
             EmotionType.HAPPY: {'happy', 'joy', 'excited', 'great', 'wonderful', 'amazing', 'love', 'awesome', 'fantastic'},
             EmotionType.SAD: {'sad', 'unhappy', 'depressed', 'terrible', 'awful', 'crying', 'upset', 'down'},
             EmotionType.EXCITED: {'excited', 'thrilled', 'pumped', 'energized', 'cant wait', 'wow', 'yay'},
             EmotionType.CONFUSED: {'confused', 'dont understand', 'unclear', 'puzzled', 'lost', 'huh'},
         }
+        lexicon.register_map('emotion', self.emotion_keywords)
     
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        text = input_data.get('text', '').lower()
-        words = set(text.split())  # Convert to set for O(1) lookup
+    def cache_key(self, text: str) -> Hashable:
+        # '!' bumps EXCITED, so "wow" and "wow!" must not share an entry
+        return super().cache_key(text), '!' in text
 
-        emotion_scores = {}
+    def process_sync(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        text = input_data.get('text', '')
+        matches = input_data.get('lexicon') or lexicon.scan(text)
 
-        # Fast set intersection instead of regex
-        for emotion, keywords in self.emotion_keywords.items():
-            matches = len(words & keywords)  # Set intersection
-            if matches:
-                emotion_scores[emotion.value] = matches
+        # Distinct keywords matched per emotion (declaration order breaks ties)
+        counts = matches.label_counts('emotion')
+        emotion_scores = {e.value: counts[e.value] for e in self.emotion_keywords if e.value in counts}
 
         # Quick punctuation check
-        if '!' in text:
+        if self.features(input_data).has_exclamation:
             emotion_scores[EmotionType.EXCITED.value] = emotion_scores.get(EmotionType.EXCITED.value, 0) + 1
 
         detected = max(emotion_scores, key=emotion_scores.get) if emotion_scores else EmotionType.NEUTRAL.value
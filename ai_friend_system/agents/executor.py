@@ -0,0 +1,104 @@
+"""
+Execution modes for CPU-bound agent work
+inline  - run on the event loop (cheapest for tiny inputs)
+thread  - shared thread pool (frees the loop; pure-Python work still shares the GIL)
+process - spawn-based process pool (true parallelism; class must build with no args)
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+
+MODE_INLINE = "inline"
+MODE_THREAD = "thread"
+MODE_PROCESS = "process"
+
+MODES = (MODE_INLINE, MODE_THREAD, MODE_PROCESS)
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Instances built inside process-pool workers, one per class
+_worker_instances: Dict[type, Any] = {}
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        with _pool_lock:
+            if _thread_pool is None:
+                _thread_pool = ThreadPoolExecutor(
+                    max_workers=settings.get('agents.execution.thread_workers', 4),
+                    thread_name_prefix="agent"
+                )
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _pool_lock:
+            if _process_pool is None:
+                # spawn: forking a process that runs the loop and logging threads is unsafe
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=settings.get('agents.execution.process_workers', 2),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _process_pool
+
+
+def _invoke_in_worker(cls: type, method: str, args: tuple) -> Any:
+    instance = _worker_instances.get(cls)
+    if instance is None:
+        instance = _worker_instances[cls] = cls()
+    return getattr(instance, method)(*args)
+
+
+def configured_mode(name: str, default: str = MODE_INLINE) -> str:
+    mode = settings.get(f'agents.execution.modes.{name}', default)
+    return mode if mode in MODES else MODE_INLINE
+
+
+def select_mode(mode: str, size: int, threshold: Optional[int] = None) -> str:
+    """Small inputs stay inline: a pool hop costs more than the work itself"""
+    if threshold is None:
+        threshold = settings.get('agents.execution.offload_threshold_chars', 280)
+    return mode if size >= threshold else MODE_INLINE
+
+
+async def run_cpu_bound(instance: Any, method: str, *args, mode: str = MODE_INLINE) -> Tuple[Any, float]:
+    """Call instance.method(*args) in the given mode
+
+    Returns (result, seconds the event loop was blocked by the call).
+    """
+    start = time.perf_counter()
+
+    if mode == MODE_INLINE:
+        result = getattr(instance, method)(*args)
+        return result, time.perf_counter() - start
+
+    loop = asyncio.get_running_loop()
+    if mode == MODE_PROCESS:
+        future = loop.run_in_executor(
+            _get_process_pool(), _invoke_in_worker, type(instance), method, args
+        )
+    else:
+        future = loop.run_in_executor(_get_thread_pool(), partial(getattr(instance, method), *args))
+    blocked = time.perf_counter() - start
+
+    return await future, blocked
+
+
+def shutdown_executors():
+    global _thread_pool, _process_pool
+    if _thread_pool:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,181 @@
+"""
+Shared multi-pattern lexicon engine
+All keyword agents register their phrase lists here; they are compiled into a
+single Aho-Corasick automaton so one pass over a message yields every
+positioned match (keywords, intensifiers, negators, intents) at once
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Apostrophes are dropped so "can't wait" and "cant wait" are the same phrase
+_STRIP = str.maketrans('', '', "'’")
+
+
+def normalize(text: str) -> str:
+    return text.lower().translate(_STRIP)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class Hit:
+    """One phrase occurrence for one (category, label) registration"""
+    __slots__ = ("start", "end", "phrase", "category", "label")
+
+    def __init__(self, start: int, end: int, phrase: str, category: str, label: str):
+        self.start = start
+        self.end = end
+        self.phrase = phrase
+        self.category = category
+        self.label = label
+
+    def __repr__(self) -> str:
+        return f"Hit({self.category}:{self.label} '{self.phrase}' @{self.start})"
+
+
+class LexiconMatches:
+    """Result of one scan, indexed by category"""
+    __slots__ = ("text", "hits", "_by_category")
+
+    def __init__(self, text: str, hits: List[Hit]):
+        self.text = text
+        self.hits = hits
+        self._by_category: Dict[str, List[Hit]] = defaultdict(list)
+        for hit in hits:
+            self._by_category[hit.category].append(hit)
+
+    def get(self, category: str, label: Optional[str] = None) -> List[Hit]:
+        hits = self._by_category.get(category, [])
+        if label is None:
+            return hits
+        return [h for h in hits if h.label == label]
+
+    def has(self, category: str, label: Optional[str] = None) -> bool:
+        return bool(self.get(category, label))
+
+    def labels(self, category: str) -> Set[str]:
+        return {h.label for h in self._by_category.get(category, [])}
+
+    def label_counts(self, category: str) -> Dict[str, int]:
+        """Distinct phrases matched per label (repeats of a phrase count once)"""
+        phrases: Dict[str, Set[str]] = defaultdict(set)
+        for hit in self._by_category.get(category, []):
+            phrases[hit.label].add(hit.phrase)
+        return {label: len(found) for label, found in phrases.items()}
+
+
+class Lexicon:
+    """Aho-Corasick automaton over registered phrases
+
+    Matches respect word boundaries on the left always, and on the right
+    unless the phrase was registered with prefix=True (stems like "remind"
+    that should also match "reminder").
+    """
+
+    def __init__(self):
+        # phrase -> [(category, label, prefix)]
+        self._entries: Dict[str, List[Tuple[str, str, bool]]] = defaultdict(list)
+        self._registered: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+        self._dirty = True
+
+        # Compiled automaton
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+    def register(self, category: str, label: str, phrases: Iterable[str], prefix: bool = False):
+        """Add phrases under (category, label); safe to call repeatedly"""
+        with self._lock:
+            for phrase in phrases:
+                phrase = normalize(phrase).strip()
+                key = (phrase, category, label)
+                if not phrase or key in self._registered:
+                    continue
+                self._registered.add(key)
+                self._entries[phrase].append((category, label, prefix))
+                self._dirty = True
+
+    def register_map(self, category: str, mapping: Dict[str, Iterable[str]], prefix: bool = False):
+        for label, phrases in mapping.items():
+            self.register(category, str(getattr(label, 'value', label)), phrases, prefix=prefix)
+
+    def compile(self):
+        """Build the goto/fail/output tables (BFS over the phrase trie)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            goto: List[Dict[str, int]] = [{}]
+            out: List[List[str]] = [[]]
+
+            for phrase in self._entries:
+                state = 0
+                for ch in phrase:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        out.append([])
+                    state = nxt
+                out[state].append(phrase)
+
+            fail = [0] * len(goto)
+            queue = list(goto[0].values())
+            head = 0
+            while head < len(queue):
+                state = queue[head]
+                head += 1
+                for ch, nxt in goto[state].items():
+                    queue.append(nxt)
+                    f = fail[state]
+                    while f and ch not in goto[f]:
+                        f = fail[f]
+                    fail[nxt] = goto[f].get(ch, 0)
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+            self._goto, self._fail, self._out = goto, fail, out
+            self._dirty = False
+
+    def scan(self, text: str) -> LexiconMatches:
+        """Single pass over the normalized text; returns all boundary-valid hits"""
+        if self._dirty:
+            self.compile()
+
+        norm = normalize(text)
+        goto, fail, out, entries = self._goto, self._fail, self._out, self._entries
+        length = len(norm)
+        hits: List[Hit] = []
+        state = 0
+
+        for i, ch in enumerate(norm):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+
+            end = i + 1
+            right_ok = end == length or not _is_word_char(norm[end])
+            for phrase in out[state]:
+                start = end - len(phrase)
+                if start > 0 and _is_word_char(norm[start - 1]):
+                    continue
+                for category, label, prefix in entries[phrase]:
+                    if right_ok or prefix:
+                        hits.append(Hit(start, end, phrase, category, label))
+
+        return LexiconMatches(norm, hits)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "phrases": len(self._entries),
+            "states": len(self._goto),
+            "registrations": len(self._registered)
+        }
+
+
+# Shared instance: agents register at construction, compiled on first scan
+lexicon = Lexicon()
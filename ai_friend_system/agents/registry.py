@@ -0,0 +1,128 @@
+"""
+Agent registry
+Agents declare what they produce, what they need, how expensive they are and
+whether their results can be memoized; the coordinator schedules from here
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .base_agent import BaseAgent
+from config import settings
+
+# Cost classes (informational + used to skip work on trivial messages)
+COST_CHEAP = "cheap"
+COST_MODERATE = "moderate"
+COST_EXPENSIVE = "expensive"
+
+
+@dataclass
+class AgentSpec:
+    """Declaration of one agent
+
+    `outputs` are the keys the agent fills in the combined result (its
+    result dict goes under its own name). Dependencies receive their
+    results in input_data['agent_results'] before the agent runs.
+    """
+    name: str
+    factory: Callable[[], BaseAgent]
+    outputs: Tuple[str, ...] = ()
+    depends_on: Tuple[str, ...] = ()
+    cost: str = COST_CHEAP
+    timeout: float = 0.8
+    cacheable: bool = False
+    min_chars: int = 0  # Skip for messages shorter than this
+    _instance: Optional[BaseAgent] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.outputs:
+            self.outputs = (self.name,)
+
+    @property
+    def agent(self) -> BaseAgent:
+        if self._instance is None:
+            self._instance = self.factory()
+        return self._instance
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "type": self.name,
+            "outputs": list(self.outputs),
+            "depends_on": list(self.depends_on),
+            "cost": self.cost,
+            "timeout": self.timeout,
+            "cacheable": self.cacheable,
+            "min_chars": self.min_chars,
+            "status": "active" if self._instance is not None else "registered"
+        }
+
+
+class AgentRegistry:
+    def __init__(self):
+        self._specs: Dict[str, AgentSpec] = {}
+
+    def register(self, spec: AgentSpec) -> AgentSpec:
+        # Per-agent timeouts can be tuned from config without code changes
+        spec.timeout = settings.get(f'agents.timeouts.{spec.name}', spec.timeout)
+        self._specs[spec.name] = spec
+        return spec
+
+    def unregister(self, name: str):
+        self._specs.pop(name, None)
+
+    def get(self, name: str) -> Optional[AgentSpec]:
+        return self._specs.get(name)
+
+    def specs(self) -> List[AgentSpec]:
+        return list(self._specs.values())
+
+    def resolve(self, outputs: Optional[Iterable[str]] = None) -> List[AgentSpec]:
+        """Agents needed for the requested outputs (plus their dependencies), in dependency order"""
+        if outputs is None:
+            wanted = list(self._specs)
+        else:
+            outputs = set(outputs)
+            wanted = [name for name, spec in self._specs.items() if outputs & set(spec.outputs)]
+
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Agent dependency cycle at: {name}")
+            if name not in self._specs:
+                raise ValueError(f"Unknown agent dependency: {name}")
+            state[name] = 1
+            for dep in self._specs[name].depends_on:
+                visit(dep)
+            state[name] = 2
+            order.append(name)
+
+        for name in wanted:
+            visit(name)
+        return [self._specs[name] for name in order]
+
+
+def _register_builtin(registry: AgentRegistry):
+    from .emotion_agent import EmotionAgent
+    from .context_agent import ContextAgent
+    from .task_agent import TaskAgent
+
+    registry.register(AgentSpec(
+        name="emotion", factory=EmotionAgent,
+        cost=COST_CHEAP, timeout=0.8, cacheable=True
+    ))
+    # Context reads conversation history, so its result is not a function of the text alone
+    registry.register(AgentSpec(
+        name="context", factory=ContextAgent,
+        cost=COST_CHEAP, timeout=0.8, cacheable=False
+    ))
+    registry.register(AgentSpec(
+        name="task", factory=TaskAgent,
+        cost=COST_CHEAP, timeout=0.8, cacheable=True, min_chars=4
+    ))
+
+
+# Shared registry with the built-in agents
+agent_registry = AgentRegistry()
+_register_builtin(agent_registry)
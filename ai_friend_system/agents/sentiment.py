@@ -0,0 +1,154 @@
+"""
+Precompiled sentiment lexicon
+Drop-in replacement for TextBlob's pattern analyzer: the same word polarity /
+subjectivity / intensity table (shipped as agents/sentiment_lexicon.json) with
+the same negation, modifier and emoticon rules, but a single compiled
+tokenizer and flat dict lookups instead of a TextBlob per call
+
+Regenerate the table after a TextBlob upgrade with:
+    python -m agents.sentiment --build
+"""
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LEXICON_PATH = Path(__file__).parent / 'sentiment_lexicon.json'
+
+NEGATIONS = frozenset(("no", "not", "n't", "never"))
+
+# Same punctuation set TextBlob skips before its emoticon lookup
+PUNCTUATION = frozenset(".,;:!?()[]{}`''\"@#$^&*+-|=~_")
+
+
+class SentimentLexicon:
+    """(polarity, subjectivity) scoring with TextBlob-compatible rules"""
+
+    def __init__(self, path: Optional[Path] = None):
+        with open(path or LEXICON_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # word -> (polarity, subjectivity, intensity, is_adverb_modifier)
+        self.words: Dict[str, Tuple[float, float, float, bool]] = {
+            w: (p, s, i, bool(rb)) for w, (p, s, i, rb) in data['words'].items()
+        }
+        self.emoticons: Dict[str, float] = data['emoticons']
+
+        emoticon_re = '|'.join(
+            re.escape(e) for e in sorted(self.emoticons, key=len, reverse=True)
+        )
+        self._token_re = re.compile(
+            r"(?:%s)(?=\s|$)"      # emoticons
+            r"|\(\s?!\s?\)"        # sarcasm marker (!)
+            r"|\w+(?:-\w+)*"       # words (apostrophes split them, as in TextBlob)
+            r"|[^\w\s]" % emoticon_re,
+            re.IGNORECASE
+        )
+
+    def tokenize(self, text: str) -> List[str]:
+        return [t.lower().replace(' ', '') for t in self._token_re.findall(text)]
+
+    def score(self, text: str) -> Tuple[float, float]:
+        """Returns (polarity -1..1, subjectivity 0..1) for the text"""
+        assessments = self.assessments(self.tokenize(text))
+        if not assessments:
+            return 0.0, 0.0
+        n = len(assessments)
+        return (
+            sum(a[0] for a in assessments) / n,
+            sum(a[1] for a in assessments) / n
+        )
+
+    def assessments(self, tokens: List[str]) -> List[Tuple[float, float]]:
+        """Port of pattern's Sentiment.assessments for untagged input
+
+        A known word optionally preceded by a modifier ("very good") or a
+        negation ("not good") forms one chunk; negated chunks get p * -0.5.
+        """
+        words = self.words
+        chunks: List[List[float]] = []  # [p, s, i, negated]
+        m = None  # Preceding modifier word
+        n = None  # Preceding negation
+
+        for w in tokens:
+            entry = words.get(w)
+            if entry is not None:
+                p, s, i, is_modifier = entry
+                if m is None:
+                    chunks.append([p, s, i, False])
+                else:
+                    last = chunks[-1]
+                    last[0] = max(-1.0, min(p * last[2], 1.0))
+                    last[1] = max(-1.0, min(s * last[2], 1.0))
+                    last[2] = i
+                if n is not None:
+                    chunks[-1][2] = 1.0 / chunks[-1][2]
+                    chunks[-1][3] = True
+                m = None
+                n = None
+                if is_modifier:
+                    m = w
+                if w in NEGATIONS:
+                    n = w
+                continue
+
+            if w in NEGATIONS:
+                n = w
+            elif n and len(w.strip("'")) > 1:
+                n = None
+            if n is not None and m is not None and m.endswith("ly"):
+                chunks[-1][3] = True
+                n = None
+            elif m and len(w) > 2:
+                m = None
+            if w == "!" and chunks:
+                chunks[-1][0] = max(-1.0, min(chunks[-1][0] * 1.25, 1.0))
+            elif w == "(!)":
+                chunks.append([0.0, 1.0, 1.0, False])
+            elif not w.isalpha() and len(w) <= 5 and w not in PUNCTUATION:
+                polarity = self.emoticons.get(w)
+                if polarity is not None:
+                    chunks.append([polarity, 1.0, 1.0, False])
+
+        return [(c[0] * -0.5 if c[3] else c[0], c[1]) for c in chunks]
+
+
+def build_lexicon(path: Path = LEXICON_PATH):
+    """Export TextBlob's (post-load) English sentiment table to JSON"""
+    from textblob.en import sentiment as pattern_sentiment
+    from textblob._text import EMOTICONS
+
+    len(pattern_sentiment)  # lazydict: force the XML load
+    words = {}
+    for w, by_pos in dict.items(pattern_sentiment):
+        if None not in by_pos:
+            continue
+        p, s, i = by_pos[None]
+        words[w] = [round(p, 6), round(s, 6), round(i, 6), int("RB" in by_pos)]
+
+    emoticons = {}
+    for (_, polarity), faces in EMOTICONS.items():
+        for face in faces:
+            emoticons[face.lower()] = polarity
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"words": words, "emoticons": emoticons}, f,
+                  ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return len(words)
+
+
+_lexicon: Optional[SentimentLexicon] = None
+
+
+def get_sentiment_lexicon() -> SentimentLexicon:
+    """Shared instance, loaded on first use"""
+    global _lexicon
+    if _lexicon is None:
+        _lexicon = SentimentLexicon()
+    return _lexicon
+
+
+if __name__ == "__main__":
+    import sys
+    if "--build" in sys.argv:
+        print(f"Wrote {build_lexicon()} words to {LEXICON_PATH}")
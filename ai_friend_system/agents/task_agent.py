@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .base_agent import BaseAgent
+from .lexicon import lexicon
 
 class TaskAgent(BaseAgent):
     def __init__(self):
@@ -10,19 +11,21 @@ class TaskAgent(BaseAgent):
             'calculation': ['calculate', 'compute', 'sum', 'total'],
             'information': ['what is', 'tell me about', 'explain']
         }
+        # Stems match word prefixes ("remind" -> "reminder") like the old substring scan
+        lexicon.register_map('task', self.task_keywords, prefix=True)
+        lexicon.register('task.priority', 'high', ['urgent', 'important'], prefix=True)
     
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        text = input_data.get('text', '').lower()
+    def process_sync(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        matches = input_data.get('lexicon') or lexicon.scan(input_data.get('text', ''))
         
-        detected_tasks = []
-        for task_type, keywords in self.task_keywords.items():
-            if any(kw in text for kw in keywords):
-                detected_tasks.append(task_type)
+        # Keep declaration order of task types
+        found = matches.labels('task')
+        detected_tasks = [task_type for task_type in self.task_keywords if task_type in found]
         
         has_task = len(detected_tasks) > 0
         
         return {
             'has_task': has_task,
             'task_types': detected_tasks,
-            'priority': 'high' if 'urgent' in text or 'important' in text else 'normal'
+            'priority': 'high' if matches.has('task.priority') else 'normal'
         }
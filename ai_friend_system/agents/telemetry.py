@@ -0,0 +1,172 @@
+"""
+Sampled agent telemetry
+BaseAgent.execute hands every result to agent_telemetry.record(); a sampled
+subset is buffered in memory and a background task flushes it to agent_logs
+in batched inserts, so the turn never waits on a write
+"""
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+from config import settings, db_config
+from database.schema import AgentLog
+from utils.logger import Logger, get_request_id
+
+# Input keys that are large or not meaningful offline
+_SKIP_INPUT_KEYS = frozenset(('lexicon', 'features', 'agent_results', 'conversation_id'))
+
+
+class AgentTelemetry:
+    """Buffers sampled agent executions and flushes them to agent_logs"""
+
+    def __init__(self):
+        self.logger = Logger("AgentTelemetry")
+        self.enabled = settings.get('agents.telemetry.enabled', True)
+        self.sample_rate = float(settings.get('agents.telemetry.sample_rate', 0.1))
+        self.batch_size = settings.get('agents.telemetry.batch_size', 200)
+        self.flush_interval = settings.get('agents.telemetry.flush_interval_seconds', 5.0)
+        self.max_payload_chars = settings.get('agents.telemetry.max_payload_chars', 2000)
+
+        # Oldest records go first when the writer falls behind
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=settings.get('agents.telemetry.buffer_size', 5000))
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, agent_type: str, input_data: Dict[str, Any], result: Dict[str, Any],
+               conversation_id: Optional[int] = None):
+        """Hot path: a sampling check and a deque append (serialization happens at flush)"""
+        if not self.running or random.random() >= self.sample_rate:
+            return
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({
+            'agent_type': agent_type,
+            'conversation_id': conversation_id,
+            'input': {k: v for k, v in input_data.items() if k not in _SKIP_INPUT_KEYS},
+            'result': result,
+            'request_id': get_request_id(),
+            'timestamp': datetime.utcnow()
+        })
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self.logger.info("Agent telemetry started (sample_rate=%s)", self.sample_rate)
+
+    async def stop(self):
+        """Stop the writer and flush what is left"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write buffered records in batches; returns how many were written"""
+        if not self._buffer or db_config.async_session is None:
+            return 0
+
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            start = time.perf_counter()
+            try:
+                async with db_config.async_session() as session:
+                    session.add_all([AgentLog(**self._to_row(record)) for record in batch])
+                    await session.commit()
+            except Exception as e:
+                self.flush_errors += 1
+                self.dropped += len(batch)
+                self.logger.warning("Agent telemetry flush failed (%d records dropped): %s", len(batch), e)
+                break
+            written += len(batch)
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        self.written += written
+        return written
+
+    def _to_row(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        result = record['result']
+        output = result.get('result') if result.get('success') else {'error': result.get('error')}
+        confidence = output.get('confidence') if isinstance(output, dict) else None
+        return {
+            'agent_type': record['agent_type'],
+            'conversation_id': record['conversation_id'],
+            'action': f"execute:{result.get('mode', 'inline')}",
+            'input_data': self._serialize({**record['input'], 'request_id': record['request_id']}),
+            'output_data': self._serialize(output),
+            'execution_time': result.get('execution_time'),
+            'confidence_score': confidence if isinstance(confidence, (int, float)) else None,
+            'success': bool(result.get('success')),
+            'timestamp': record['timestamp']
+        }
+
+    def _serialize(self, payload: Any) -> str:
+        text = json.dumps(payload, default=str, ensure_ascii=False, separators=(',', ':'))
+        if len(text) <= self.max_payload_chars:
+            return text
+
+        # Stay valid JSON so the training export can load it back; the preview
+        # is escaped again, so search for the longest one whose wrapper fits
+        def wrap(keep: int) -> str:
+            return json.dumps(
+                {'truncated': True, 'chars': len(text), 'preview': text[:keep]},
+                ensure_ascii=False, separators=(',', ':')
+            )
+
+        low, high = 0, self.max_payload_chars
+        while low < high:
+            mid = (low + high + 1) // 2
+            if len(wrap(mid)) <= self.max_payload_chars:
+                low = mid
+            else:
+                high = mid - 1
+        return wrap(low)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "sample_rate": self.sample_rate,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+
+# Shared writer, started and stopped with the app
+agent_telemetry = AgentTelemetry()
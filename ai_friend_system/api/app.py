@@ -12,9 +12,11 @@ from fastapi_limiter import FastAPILimiter
 from core.lifecycle import SystemLifecycle
 from services.redis_client import redis_client
 from core.startup_diagnostics import StartupDiagnostics
+from config import settings
 from utils.logger import Logger
+from utils.tracing import tracer
 
-from .middleware import timing_middleware, error_handler_middleware
+from .middleware import timing_middleware, error_handler_middleware, request_id_middleware
 from .routes import (
     chat,
     memory,
@@ -64,6 +66,7 @@ app.add_middleware(
 # Custom middleware
 app.middleware("http")(timing_middleware)
 app.middleware("http")(error_handler_middleware)
+app.middleware("http")(request_id_middleware)  # Outermost: id is bound for all the above
 
 # ------------------------------------------------------------------
 # ROUTES
@@ -102,6 +105,37 @@ async def startup_event():
     else:
         logger.warning("⚠️ Rate limiter disabled: Redis not available")
 
+    # ---- EMOTION CACHE WARMUP (canned SimpleChatbot replies) ----
+    if settings.get('agents.emotion_cache_warmup', True):
+        from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer
+        from core.llm_providers import SimpleChatbot
+        warmed = AdvancedEmotionAnalyzer().warm_cache(SimpleChatbot().canned_responses())
+        logger.info("✅ Emotion cache warmed with %d canned replies", warmed)
+
+    # ---- EMBEDDING SERVICE (micro-batching worker thread) ----
+    from services.embedding_service import embedding_service
+    embedding_service.start()
+
+    # ---- SEMANTIC MEMORY WARM-LOAD (persistent store, background) ----
+    if settings.get('memory_index.warm_load', True):
+        from memory.semantic_memory import semantic_memory
+        semantic_memory.start_warm_load()
+
+    # ---- EVENT-LOOP WATCHDOG ----
+    if settings.get('performance.loop_watchdog.enabled', True):
+        from utils.loop_watchdog import loop_watchdog
+        from core.performance_monitor import perf_monitor
+        loop_watchdog.on_lag = perf_monitor.track_loop_lag
+        loop_watchdog.start()
+
+    # ---- AGENT TELEMETRY WRITER ----
+    from agents.telemetry import agent_telemetry
+    agent_telemetry.start()
+
+    # ---- MEMORY MAINTENANCE (chunked expiry + consolidation) ----
+    from memory.maintenance import memory_maintenance
+    memory_maintenance.start()
+
     # ---- SESSION CLEANUP TASK ----
     from core.session_manager import sessions
     asyncio.create_task(sessions.start_cleanup_task())
@@ -115,8 +149,25 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("👋 AI Friend API shutting down...")
+    from core.session_manager import sessions
+    await sessions.hibernate_all()
+
+    from agents.telemetry import agent_telemetry
+    await agent_telemetry.stop()
+
+    from memory.maintenance import memory_maintenance
+    await memory_maintenance.stop()
     await SystemLifecycle.shutdown()
 
+    from agents.executor import shutdown_executors
+    shutdown_executors()
+
+    from services.embedding_service import embedding_service
+    embedding_service.stop()
+
+    from utils.loop_watchdog import loop_watchdog
+    loop_watchdog.stop()
+
 # ------------------------------------------------------------------
 # ENDPOINTS
 # ------------------------------------------------------------------
@@ -154,6 +205,44 @@ async def health_check():
 @app.get("/stats")
 async def system_stats():
     from core.session_manager import sessions
+    from database.db_manager import tier_cache
+    from memory.maintenance import memory_maintenance
+    from memory.semantic_memory import semantic_memory
+    from services.embedding_service import embedding_service
     return {
         "active_sessions": sessions.get_active_sessions(),
+        "turn_queues": sessions.get_queue_stats(),
+        "hibernation": await sessions.get_hibernation_stats(),
+        "embeddings": embedding_service.get_stats(),
+        "semantic_memory": semantic_memory.get_stats(),
+        "memory_maintenance": memory_maintenance.get_stats(),
+        "tier_cache": tier_cache.get_stats(),
+        "logging": Logger.get_stats(),
     }
+
+@app.get("/loop")
+async def loop_health(limit: int = 20):
+    """Event-loop stalls aggregated by call site, with the last captured stack"""
+    from utils.loop_watchdog import loop_watchdog
+    return {
+        "watchdog": loop_watchdog.get_stats(),
+        "incidents": loop_watchdog.report(limit),
+    }
+
+@app.get("/traces")
+async def recent_traces(limit: int = 20):
+    """Most recent sampled chat traces with their span trees"""
+    return {
+        "tracing": tracer.get_stats(),
+        "traces": tracer.recent(limit),
+    }
+
+@app.get("/traces/export")
+async def export_traces(limit: int = 0):
+    """Recent traces as OTLP/JSON (OpenTelemetry collector compatible)"""
+    return tracer.export_otlp(limit or None)
+
+@app.put("/traces/sampling")
+async def update_trace_sampling(sample_rate: float = None, enabled: bool = None):
+    tracer.set_sampling(sample_rate=sample_rate, enabled=enabled)
+    return tracer.get_stats()
@@ -1,16 +1,23 @@
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-from utils.logger import Logger
+from utils.logger import Logger, set_request_id
 import time
 
 logger = Logger("Middleware")
 
+async def request_id_middleware(request: Request, call_next):
+    # Honour an upstream correlation id, otherwise mint one for this request
+    request_id = set_request_id(request.headers.get("X-Request-ID"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 async def timing_middleware(request: Request, call_next):
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
-    logger.debug(f"{request.method} {request.url.path} took {process_time:.3f}s")
+    logger.debug("%s %s took %.3fs", request.method, request.url.path, process_time)
     return response
 
 async def error_handler_middleware(request: Request, call_next):
@@ -1,15 +1,51 @@
-from fastapi import APIRouter
+import time
+from typing import Annotated, List
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from agents.registry import agent_registry
+from agents.agent_coordinator import agent_result_cache
+from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer, emotion_result_cache
+from agents.executor import run_cpu_bound, MODE_THREAD
+from agents.lexicon import lexicon
+from agents.telemetry import agent_telemetry
+from core.performance_monitor import perf_monitor
 from utils.logger import Logger
 
 router = APIRouter()
 logger = Logger("AgentsRoute")
+emotion_analyzer = AdvancedEmotionAnalyzer()
+
+MAX_BATCH = 1000
+MAX_TEXT_CHARS = 10000
+
+class EmotionBatchRequest(BaseModel):
+    texts: List[Annotated[str, Field(max_length=MAX_TEXT_CHARS)]]
 
 @router.get("/status")
 async def get_agents_status():
     return {
-        "agents": [
-            {"type": "emotion", "status": "active"},
-            {"type": "context", "status": "active"},
-            {"type": "task", "status": "active"}
-        ]
-    }
\ No newline at end of file
+        "agents": [spec.describe() for spec in agent_registry.specs()],
+        "cache": agent_result_cache.get_stats(),
+        "emotion_cache": emotion_result_cache.get_stats(),
+        "telemetry": agent_telemetry.get_stats(),
+        "lexicon": lexicon.get_stats(),
+        "metrics": perf_monitor.get_agent_stats()
+    }
+
+@router.post("/analyze/batch")
+async def analyze_batch(request: EmotionBatchRequest):
+    """Emotion analysis for many texts in one call (text only: no pitch or context)"""
+    if len(request.texts) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} texts per batch")
+
+    start = time.perf_counter()
+    results, _ = await run_cpu_bound(emotion_analyzer, 'analyze_many', request.texts, mode=MODE_THREAD)
+    elapsed = time.perf_counter() - start
+
+    logger.debug("Batch emotion analysis: %d texts in %.1fms", len(results), elapsed * 1000)
+    return {
+        "results": results,
+        "count": len(results),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "messages_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else None
+    }
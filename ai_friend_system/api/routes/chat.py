@@ -5,22 +5,23 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Depends, WebSocket
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
-from core.session_manager import AIFriendSessions
+from core.session_manager import sessions
+from core.turn_queue import TurnRejected
 # from api.routes.auth import get_current_user
 from .user import get_anonymous_user as get_current_user
 
-from memory.semantic_memory import SemanticMemoryEngine
+from memory.semantic_memory import semantic_memory
 from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer
-from utils.logger import Logger
+from utils.logger import Logger, set_request_id
 from sse_starlette.sse import EventSourceResponse
 import asyncio
+import json
 
 router = APIRouter()
 logger = Logger("ChatRoute")
 
-# Global instances
-sessions = AIFriendSessions()
-semantic_memory = SemanticMemoryEngine()
+# Global instances (sessions are shared with the voice routes so a user's
+# REST and WebSocket turns go through the same inbound queue)
 emotion_analyzer = AdvancedEmotionAnalyzer()
 
 class ChatRequest(BaseModel):
@@ -76,6 +77,12 @@ async def send_message(
             memories_used=len(relevant_memories),
             session_id=session.ai_friend.session_id
         )
+    except TurnRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.to_dict(),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -89,7 +96,14 @@ async def stream_chat(
     
     async def generate():
         session = await sessions.get_or_create(user_id)
-        result = await session.chat(message)
+        try:
+            result = await session.chat(message)
+        except TurnRejected as e:
+            yield {
+                "event": "busy",
+                "data": json.dumps(e.to_dict())
+            }
+            return
         
         # Simulate streaming by splitting response
         words = result['response'].split()
@@ -111,13 +125,20 @@ async def stream_chat(
 async def websocket_chat(websocket: WebSocket, user_id: str):
     '''WebSocket for real-time bidirectional chat'''
     await websocket.accept()
+    session = None
     
     try:
-        session = await sessions.get_or_create(user_id)
+        # Pinned so the sweep cannot hibernate it between messages
+        session = await sessions.pin(user_id)
         
         while True:
             data = await websocket.receive_text()
-            result = await session.chat(data)
+            set_request_id()  # One correlation id per message on the socket
+            try:
+                result = await session.chat(data)
+            except TurnRejected as e:
+                await websocket.send_json({'type': 'busy', **e.to_dict()})
+                continue
             
             await websocket.send_json({
                 'response': result['response'],
@@ -127,6 +148,9 @@ async def websocket_chat(websocket: WebSocket, user_id: str):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         await websocket.close()
+    finally:
+        if session is not None:
+            sessions.unpin(session)
 
 @router.get("/history")
 async def get_chat_history(
@@ -155,5 +179,6 @@ async def get_performance_stats():
     
     return {
         "performance": perf_monitor.get_stats(),
-        "cache": response_cache.get_stats()
+        "cache": response_cache.get_stats(),
+        "turn_queues": sessions.get_queue_stats()
     }
\ No newline at end of file
@@ -5,12 +5,11 @@ from datetime import datetime
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from memory.semantic_memory import SemanticMemoryEngine
+from memory.semantic_memory import semantic_memory
 # from api.routes.auth import get_current_user
 from .user import get_anonymous_user as get_current_user
 
 router = APIRouter()
-semantic_memory = SemanticMemoryEngine()
 
 class MemorySaveRequest(BaseModel):
     content: str
@@ -158,14 +158,15 @@ from typing import Optional
 from pydantic import BaseModel
 
 from voice.audio_manager import AudioManager
-from core.session_manager import AIFriendSessions
+from core.session_manager import sessions
+from core.turn_queue import TurnRejected
 from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer
 from config import db_config
+from utils.logger import set_request_id
 
 router = APIRouter()
 logger = logging.getLogger("VOICE")
 
-sessions = AIFriendSessions()
 emotion_analyzer = AdvancedEmotionAnalyzer()
 
 
@@ -201,7 +202,8 @@ async def voice_stream(websocket: WebSocket, user_id: str):
     logger.info(f"🎤 Voice connected | user={user_id}")
 
     manager = await voice_engine.get_manager(user_id)
-    session = await sessions.get_or_create(user_id)
+    # Pinned so the sweep cannot hibernate it while the socket is open
+    session = await sessions.pin(user_id)
     loop = asyncio.get_running_loop()
     
     # Track pitch history for emotion detection
@@ -402,10 +404,16 @@ async def voice_stream(websocket: WebSocket, user_id: str):
                 })
 
                 # Generate response with emotion context (optimized, parallel)
+                set_request_id()  # One correlation id per utterance
                 chat_task = session.chat(user_text)
                 
-                # Wait for response
-                chat_result = await chat_task
+                # Wait for response (queue may push back on bursty clients)
+                try:
+                    chat_result = await chat_task
+                except TurnRejected as e:
+                    await websocket.send_json({"type": "busy", **e.to_dict()})
+                    await websocket.send_json({"type": "status", "state": "listening"})
+                    continue
                 ai_text = chat_result["response"]
                 
                 # Extract emotion from response (multiple sources for best accuracy)
@@ -564,6 +572,7 @@ async def voice_stream(websocket: WebSocket, user_id: str):
         logger.error(f"❌ Voice error | user={user_id}: {e}")
 
     finally:
+        sessions.unpin(session)
         await voice_engine.cleanup(user_id)
 
 
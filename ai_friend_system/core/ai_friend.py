@@ -1,4 +1,5 @@
 from typing import Optional, Dict, Any, List
+from collections import deque
 from datetime import datetime
 import uuid
 import asyncio
@@ -13,8 +14,11 @@ from .message_processor import MessageProcessor
 from .response_generator import ResponseGenerator
 from .performance_monitor import perf_monitor, track_performance
 from .conversation_flow import ConversationFlowTracker
+from .turn_pipeline import TurnPipeline, Stage
+from utils.tracing import tracer
 
-from utils.logger import Logger
+from utils.logger import Logger, request_context
+from utils.text_features import TextFeatures
 from config import settings, db_config
 from config.constants import MessageType, EmotionType
 
@@ -51,6 +55,9 @@ class AIFriend:
         # Advanced: Conversation flow tracking
         self.flow_tracker = ConversationFlowTracker(max_history=10)
 
+        # Recent turns kept in RAM (history fallback + hibernation state)
+        self.history_ring = deque(maxlen=settings.get('sessions.history_ring_size', 6))
+
         # State
         self.initialized = False
         self.active = False
@@ -104,6 +111,32 @@ class AIFriend:
         self.active = True
         self.logger.info(f"Conversation started ({self.conversation_id})")
 
+    def to_state(self) -> Dict[str, Any]:
+        """Everything needed to revive this conversation in a fresh instance"""
+        return {
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "conversation_id": self.conversation_id,
+            "flow": self.flow_tracker.to_state(),
+            "history": list(self.history_ring)
+        }
+
+    async def restore_state(self, state: Dict[str, Any]):
+        """Revive a hibernated conversation instead of starting a new one"""
+        await self.initialize()
+        self.user_id = state["user_id"]
+        self.session_id = state.get("session_id") or self.session_id
+        self.conversation_id = state.get("conversation_id")
+        self.flow_tracker = ConversationFlowTracker.from_state(state.get("flow", {}), max_history=10)
+        self.history_ring.extend(state.get("history", []))
+
+        if not self.conversation_id:
+            await self.start_conversation(self.user_id)
+            return
+
+        self.active = True
+        self.logger.info(f"Conversation revived ({self.conversation_id})")
+
     async def end_conversation(self):
         self.active = False
         self.logger.info("Conversation ended")
@@ -113,6 +146,11 @@ class AIFriend:
     # =====================================================
     @track_performance
     async def chat(self, user_message: str) -> Dict[str, Any]:
+        # Correlate every log line of this turn (REST/WS bind one upstream)
+        with request_context() as request_id:
+            return await self._chat_turn(user_message, request_id)
+
+    async def _chat_turn(self, user_message: str, request_id: str) -> Dict[str, Any]:
         if not self.initialized:
             await self.initialize()
 
@@ -122,131 +160,28 @@ class AIFriend:
         start_time = time.perf_counter()
 
         try:
-            # Optimized: Get session once and reuse
-            async for session in db_config.get_session():
-
-                # ---- PROCESS MESSAGE (optimized with parallel operations) ----
-                processed = await self.message_processor.process_message(
-                    session=session,
-                    conversation_id=self.conversation_id,
-                    user_message=user_message
-                ) or {}
-
-
-                agent_results = processed.get("agent_results")
-                if not isinstance(agent_results, dict):
-                    agent_results = {}
-
-                memories = processed.get("memories")
-                if not isinstance(memories, list):
-                    memories = []
-
-                history = processed.get("history")
-                if not isinstance(history, list):
-                    history = []
-
-
-
-                # ---- ADVANCED: CONVERSATION FLOW TRACKING ----
-                emotion_data = agent_results.get("emotion", {})
-                detected_emotion = emotion_data.get("emotion", EmotionType.NEUTRAL) if isinstance(emotion_data, dict) else str(emotion_data) if emotion_data else EmotionType.NEUTRAL
-                
-                # Track conversation flow
-                self.flow_tracker.track_message(user_message, detected_emotion)
-                flow_context = self.flow_tracker.get_conversation_context()
-                
-                # ADVANCED: Re-retrieve memories with semantic scoring if needed
-                # (memories from agent_results may not have semantic scoring)
-                if not memories or len(memories) == 0:
-                    conversation_context_for_memory = {
-                        'emotion': agent_results.get("emotion"),
-                        'current_topic': flow_context.get('current_topic'),
-                        'emotion_trend': flow_context.get('emotion_trend')
-                    }
-                    memories = await self.memory_manager.retrieve_context(
-                        session, self.conversation_id, user_message, conversation_context_for_memory
-                    )
-                
-                # ---- CONTEXT (Enhanced with conversation flow) ----
-                context = {
-                    "emotion": agent_results.get("emotion"),
-                    "memories": memories,
-                    "user": self.user_id,
-                    "user_name": self.user_id,  # Can be enhanced with actual name
-                    "conversation_flow": flow_context  # Advanced: conversation context
-                }
-
-                # ---- RESPONSE GENERATION ----
-                messages = history + [{"role": "user", "content": user_message}]
-                
-                # Debug: Log before generation
-                self.logger.info(f"💬 Generating response for: '{user_message[:100]}...'")
-                
-                response_text = await self.response_generator.generate_response(
-                    messages, context
-                )
-
-                response_text = response_text or "I'm here with you."
-                
-                # Debug: Log after generation
-                self.logger.info(f"💬 Generated response: '{response_text[:100]}...'")
-                self.logger.info(f"   Response length: {len(response_text)} chars")
-                self.logger.info(f"   Word count: {len(response_text.split())} words")
-
-                # ---- EMOTION ----
-                emotion_data = agent_results.get("emotion", {})
-                emotion = emotion_data.get(
-                    "emotion", EmotionType.NEUTRAL
-                )
+            pipeline = TurnPipeline(self._build_turn_stages(user_message, start_time))
+            with tracer.trace("chat.turn", user_id=self.user_id,
+                              conversation_id=self.conversation_id,
+                              request_id=request_id) as span:
+                run = await pipeline.run()
+                span.set_attribute("critical_path", " > ".join(run.critical_path))
+            turn = run.results["generate"]
 
-                # ---- SAVE MESSAGE WITH TRAINING DATA ----
-                from database.models import MessageModel
-                import json
-
-                processing_time = time.perf_counter() - start_time
-                
-                # Calculate quality score based on response characteristics
-                quality_score = self._calculate_quality_score(
-                    response_text, processing_time, emotion_data, memories
-                )
-                
-                # Prepare training data
-                agent_outputs_json = json.dumps(agent_results) if agent_results else None
-                memory_context_json = json.dumps([
-                    {"content": m.get("content", ""), "tier": m.get("tier", "")}
-                    for m in memories[:5]
-                ]) if memories else None
-                
-                msg = MessageModel(
-                    id=None,
-                    conversation_id=self.conversation_id,
-                    role=MessageType.ASSISTANT,
-                    content=response_text,
-                    emotion=emotion,
-                    confidence=emotion_data.get("confidence", 0.5) if isinstance(emotion_data, dict) else 0.5,
-                    model_used=self.response_generator.ollama.model if self.response_generator.ollama.available else "default",
-                    processing_time=processing_time,
-                    memory_tier=None,
-                    importance_score=0.7,
-                    # Training data
-                    agent_outputs=agent_outputs_json,
-                    memory_context=memory_context_json,
-                    quality_score=quality_score,
-                    training_flag=True  # Mark for training by default
-                )
-
-                await self.db_manager.save_message(session, msg)
-                await session.commit()
+            processing_time = time.perf_counter() - start_time
 
             # Track performance
             perf_monitor.track_response_time(processing_time)
+            perf_monitor.track_pipeline(run)
 
             return {
-                "response": response_text,
-                "emotion": emotion_data,
+                "response": turn["response"],
+                "emotion": turn["emotion_data"],
                 "processing_time": round(processing_time, 3),
-                "memories_used": len(memories),
-                "session_id": self.session_id
+                "memories_used": len(turn["memories"]),
+                "session_id": self.session_id,
+                "critical_path": run.critical_path,
+                "request_id": request_id
             }
 
         except Exception as e:
@@ -260,6 +195,185 @@ class AIFriend:
                 "session_id": self.session_id
             }
 
+    def _build_turn_stages(self, user_message: str, start_time: float) -> List[Stage]:
+        """
+        Turn DAG:
+
+            history ─┐
+            prepare ─┴─ agents ─┐
+            memories ───────────┴─ generate ── save
+
+        Memory retrieval only needs the raw message and the flow context from
+        previous turns, so it runs beside the agents instead of after them.
+        History, memories and save each use their own DB session.
+        """
+        stage_timeouts = settings.get('performance.stage_timeouts', {}) or {}
+        conversation_id = self.conversation_id
+        # Raw-message features shared by memory scoring and flow tracking
+        user_features = TextFeatures(user_message)
+
+        async def history_stage(_):
+            return await self.message_processor.fetch_history(conversation_id, limit=3)
+
+        async def prepare_stage(_):
+            return await self.message_processor.prepare_text(user_message)
+
+        async def agents_stage(deps):
+            return await self.message_processor.run_agents(deps["prepare"], deps["history"], conversation_id)
+
+        async def memories_stage(_):
+            # Read before any await: this is the flow state left by previous turns
+            flow_context = self.flow_tracker.get_conversation_context()
+            conversation_context_for_memory = {
+                'current_topic': flow_context.get('current_topic'),
+                'emotion_trend': flow_context.get('emotion_trend'),
+                'emotion': flow_context.get('recent_emotions', [None])[-1] if flow_context.get('recent_emotions') else None
+            }
+            memories = []
+            async for session in db_config.get_session():
+                memories = await self.memory_manager.retrieve_context(
+                    session, conversation_id, user_features, conversation_context_for_memory
+                )
+            return memories
+
+        async def generate_stage(deps):
+            agent_results = deps["agents"] if isinstance(deps["agents"], dict) else {}
+            history = deps["history"] if isinstance(deps["history"], list) else []
+
+            # Agent-provided memories win; otherwise use the concurrently retrieved ones
+            memories = agent_results.get("memories")
+            if not isinstance(memories, list) or not memories:
+                memories = deps["memories"] if isinstance(deps["memories"], list) else []
+
+            # ---- ADVANCED: CONVERSATION FLOW TRACKING ----
+            emotion_data = agent_results.get("emotion", {})
+            detected_emotion = emotion_data.get("emotion", EmotionType.NEUTRAL) if isinstance(emotion_data, dict) else str(emotion_data) if emotion_data else EmotionType.NEUTRAL
+
+            # Track conversation flow
+            self.flow_tracker.track_message(user_features, detected_emotion)
+            flow_context = self.flow_tracker.get_conversation_context()
+
+            # ---- CONTEXT (Enhanced with conversation flow) ----
+            context = {
+                "emotion": agent_results.get("emotion"),
+                "memories": memories,
+                "user": self.user_id,
+                "user_name": self.user_id,  # Can be enhanced with actual name
+                "conversation_flow": flow_context  # Advanced: conversation context
+            }
+
+            # ---- RESPONSE GENERATION ----
+            messages = history + [{"role": "user", "content": user_message}]
+
+            # Debug: Log before generation
+            self.logger.debug("💬 Generating response for: '%.100s'", user_message)
+
+            response_text = await self.response_generator.generate_response(
+                messages, context
+            )
+
+            response_text = response_text or "I'm here with you."
+
+            self.history_ring.append({"role": "user", "content": user_message})
+            self.history_ring.append({"role": "assistant", "content": response_text})
+
+            # Debug: Log after generation
+            self.logger.debug(
+                "💬 Generated response: '%.100s' (%d chars)",
+                response_text, len(response_text)
+            )
+
+            return {
+                "response": response_text,
+                "emotion_data": emotion_data if isinstance(emotion_data, dict) else {},
+                "agent_results": agent_results,
+                "memories": memories
+            }
+
+        async def save_stage(deps):
+            turn = deps["generate"]
+            emotion_data = turn["emotion_data"]
+            memories = turn["memories"]
+            agent_results = turn["agent_results"]
+            response_text = turn["response"]
+
+            # ---- EMOTION ----
+            emotion = emotion_data.get(
+                "emotion", EmotionType.NEUTRAL
+            )
+
+            # ---- SAVE MESSAGE WITH TRAINING DATA ----
+            from database.models import MessageModel
+            import json
+
+            processing_time = time.perf_counter() - start_time
+
+            # Calculate quality score based on response characteristics
+            quality_score = self._calculate_quality_score(
+                response_text, processing_time, emotion_data, memories
+            )
+
+            # Prepare training data
+            agent_outputs_json = json.dumps(agent_results) if agent_results else None
+            memory_context_json = json.dumps([
+                {"content": m.get("content", ""), "tier": m.get("tier", "")}
+                for m in memories[:5]
+            ]) if memories else None
+
+            msg = MessageModel(
+                id=None,
+                conversation_id=conversation_id,
+                role=MessageType.ASSISTANT,
+                content=response_text,
+                emotion=emotion,
+                confidence=emotion_data.get("confidence", 0.5),
+                model_used=self.response_generator.ollama.model if self.response_generator.ollama.available else "default",
+                processing_time=processing_time,
+                memory_tier=None,
+                importance_score=0.7,
+                # Training data
+                agent_outputs=agent_outputs_json,
+                memory_context=memory_context_json,
+                quality_score=quality_score,
+                training_flag=True  # Mark for training by default
+            )
+
+            async for session in db_config.get_session():
+                await self.db_manager.save_message(session, msg)
+                await session.commit()
+            return True
+
+        def fallback_response(deps):
+            agent_results = deps.get("agents") if isinstance(deps.get("agents"), dict) else {}
+            emotion_data = agent_results.get("emotion", {})
+            return {
+                "response": "I'm here with you.",
+                "emotion_data": emotion_data if isinstance(emotion_data, dict) else {},
+                "agent_results": agent_results,
+                "memories": deps.get("memories") or []
+            }
+
+        return [
+            Stage("history", history_stage,
+                  timeout=stage_timeouts.get("history", 1.0),
+                  fallback=lambda _: list(self.history_ring)[-3:]),
+            Stage("prepare", prepare_stage,
+                  timeout=stage_timeouts.get("prepare", 0.5),
+                  fallback=lambda _: {"cleaned_text": user_message, "analysis": {}}),
+            Stage("agents", agents_stage, depends_on=("prepare", "history"),
+                  timeout=stage_timeouts.get("agents", 1.5),
+                  fallback=lambda _: {"emotion": {}, "context": {}, "task": {}, "memories": [], "success": False}),
+            Stage("memories", memories_stage,
+                  timeout=stage_timeouts.get("memories", 1.5),
+                  fallback=lambda _: []),
+            Stage("generate", generate_stage, depends_on=("agents", "memories", "history"),
+                  timeout=stage_timeouts.get("generate", 30.0),
+                  fallback=fallback_response),
+            Stage("save", save_stage, depends_on=("generate",),
+                  timeout=stage_timeouts.get("save", 3.0),
+                  fallback=lambda _: False),
+        ]
+
     # =====================================================
     # VOICE CHAT (SYNC + CLI SAFE)
     # =====================================================
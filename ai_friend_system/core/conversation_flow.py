@@ -2,13 +2,106 @@
 Advanced conversation flow tracking and topic continuity
 Maintains conversation context, tracks topics, and ensures personality consistency
 """
-from typing import Dict, Any, List, Optional, Set
-from collections import deque
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
+from collections import Counter, deque
 from datetime import datetime
+import base64
+import math
+import zlib
+import numpy as np
 from utils.logger import Logger
+from utils.text_features import TextFeatures
+from config import settings
 
 logger = Logger("ConversationFlow")
 
+_TERM_PUNCTUATION = '.,!?;:"\'()[]'
+
+
+class TopicVector:
+    """Decayed, hashed term-frequency vector for one conversation
+
+    Terms hash (crc32) into `dim` buckets. Each turn the vector decays by
+    `decay` and adds the message's term counts. Decay is a lazy scale factor
+    and the squared norm is maintained incrementally, so observing a message
+    costs O(its terms) and the state never grows beyond the fixed arrays.
+    """
+
+    __slots__ = ('dim', 'decay', '_v', '_scale', '_norm_sq', '_terms')
+
+    def __init__(self, dim: int = 256, decay: float = 0.7):
+        self.dim = dim
+        self.decay = decay
+        self._v = np.zeros(dim, dtype=np.float32)
+        self._scale = 1.0
+        self._norm_sq = 0.0
+        self._terms: Dict[int, str] = {}  # bucket -> latest term seen there (labels for top-k)
+
+    def _bucket(self, term: str) -> int:
+        return zlib.crc32(term.encode('utf-8')) % self.dim
+
+    def observe(self, terms: List[str]) -> Optional[float]:
+        """Fold a message in; returns its cosine similarity to the topic before it
+        (None if there was no topic yet or the message has no terms)"""
+        counts: Dict[int, float] = {}
+        for term, count in Counter(terms).items():
+            bucket = self._bucket(term)
+            counts[bucket] = counts.get(bucket, 0.0) + count
+            self._terms[bucket] = term
+        if not counts:
+            return None
+
+        v = self._v
+        message_norm_sq = sum(c * c for c in counts.values())
+        dot = self._scale * sum(float(v[b]) * c for b, c in counts.items())
+        similarity = None
+        if self._norm_sq > 0:
+            similarity = max(0.0, min(1.0, dot / math.sqrt(self._norm_sq * message_norm_sq)))
+
+        # topic' = decay * topic + message
+        self._scale *= self.decay
+        self._norm_sq = self.decay * self.decay * self._norm_sq + 2 * self.decay * dot + message_norm_sq
+        for bucket, count in counts.items():
+            v[bucket] += count / self._scale
+
+        if self._scale < 1e-6:  # Fold the scale back in before float32 runs out of range
+            self._renormalize()
+        return similarity
+
+    def _renormalize(self):
+        self._v *= self._scale
+        self._scale = 1.0
+        self._norm_sq = float(np.dot(self._v, self._v))
+        # Forget labels of buckets that decayed away
+        self._terms = {b: t for b, t in self._terms.items() if self._v[b] > 1e-3}
+
+    def top_terms(self, k: int = 5) -> List[Tuple[str, float]]:
+        """Heaviest topic terms with their decayed weights"""
+        v = self._v
+        k = min(k, self.dim)
+        candidates = np.argpartition(-v, k - 1)[:k]
+        ranked = sorted(candidates.tolist(), key=lambda b: -v[b])
+        return [
+            (self._terms[b], round(float(v[b]) * self._scale, 3))
+            for b in ranked if v[b] > 0 and b in self._terms
+        ]
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'dim': self.dim,
+            'v': base64.b64encode((self._v * self._scale).astype(np.float32).tobytes()).decode('ascii'),
+            'terms': {str(b): t for b, t in self._terms.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], dim: int, decay: float) -> 'TopicVector':
+        vector = cls(dim=dim, decay=decay)
+        if state.get('dim') == dim and state.get('v'):
+            vector._v = np.frombuffer(base64.b64decode(state['v']), dtype=np.float32).copy()
+            vector._norm_sq = float(np.dot(vector._v, vector._v))
+            vector._terms = {int(b): t for b, t in state.get('terms', {}).items()}
+        return vector
+
 class ConversationFlowTracker:
     """Tracks conversation flow, topics, and maintains personality consistency"""
     
@@ -20,25 +113,25 @@ class ConversationFlowTracker:
         self.current_topic: Optional[str] = None
         self.topic_continuity_score = 0.0
         self.logger = logger
+
+        self.topic_dim = settings.get('conversation_flow.topic_dim', 256)
+        self.topic_decay = settings.get('conversation_flow.topic_decay', 0.7)
+        self.topic_top_k = settings.get('conversation_flow.topic_top_k', 5)
+        self.continuation_threshold = settings.get('conversation_flow.continuation_threshold', 0.5)
+        self.topic_vector = TopicVector(self.topic_dim, self.topic_decay)
     
-    def track_message(self, text: str, emotion: str, intent: Optional[str] = None):
+    def track_message(self, text: Union[str, TextFeatures], emotion: str, intent: Optional[str] = None):
         """Track a new message in conversation flow"""
         # Extract topic keywords
-        topic_keywords = self._extract_topic_keywords(text)
+        features = TextFeatures.of(text)
+        topic_keywords = self._extract_topic_keywords(features)
         
-        # Update topic if significant change
+        # Continuity = cosine similarity of this message to the decayed topic vector
+        terms = [w.strip(_TERM_PUNCTUATION) for w in features.content_terms]
+        similarity = self.topic_vector.observe([w for w in terms if len(w) > 3])
         if topic_keywords:
-            if self.current_topic:
-                # Check topic continuity
-                overlap = len(set(topic_keywords) & set(self.current_topic.split()))
-                if overlap < 2:  # Topic shift
-                    self.topic_continuity_score = 0.3
-                    self.current_topic = ' '.join(topic_keywords[:3])
-                else:
-                    self.topic_continuity_score = min(1.0, overlap / len(topic_keywords))
-            else:
-                self.current_topic = ' '.join(topic_keywords[:3])
-                self.topic_continuity_score = 1.0
+            self.topic_continuity_score = 1.0 if similarity is None else similarity
+            self.current_topic = ' '.join(term for term, _ in self.topic_vector.top_terms(3))
         
         # Track history
         self.topic_history.append({
@@ -55,16 +148,11 @@ class ConversationFlowTracker:
                 'timestamp': datetime.now()
             })
     
-    def _extract_topic_keywords(self, text: str) -> List[str]:
+    def _extract_topic_keywords(self, text: Union[str, TextFeatures]) -> List[str]:
         """Extract key topic words from text"""
         # Simple keyword extraction (can be enhanced with NLP)
-        words = text.lower().split()
-        
-        # Filter out common words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'}
-        
-        # Extract meaningful words (nouns, verbs, adjectives)
-        keywords = [w for w in words if len(w) > 3 and w not in stop_words]
+        # Meaningful words (nouns, verbs, adjectives): stop words already filtered
+        keywords = [w for w in TextFeatures.of(text).content_terms if len(w) > 3]
         
         # Return top 5 most frequent or unique
         return keywords[:5]
@@ -79,8 +167,9 @@ class ConversationFlowTracker:
             'topic_continuity': round(self.topic_continuity_score, 2),
             'recent_emotions': recent_emotions,
             'emotion_trend': emotion_trend,
+            'topic_terms': [term for term, _ in self.topic_vector.top_terms(self.topic_top_k)],
             'conversation_length': len(self.topic_history),
-            'needs_topic_continuation': self.topic_continuity_score > 0.5
+            'needs_topic_continuation': self.topic_continuity_score > self.continuation_threshold
         }
     
     def _calculate_emotion_trend(self, emotions: List[str]) -> str:
@@ -105,8 +194,33 @@ class ConversationFlowTracker:
     
     def should_continue_topic(self) -> bool:
         """Determine if current topic should be continued"""
-        return self.topic_continuity_score > 0.5 and self.current_topic is not None
+        return self.topic_continuity_score > self.continuation_threshold and self.current_topic is not None
     
+    def to_state(self) -> Dict[str, Any]:
+        """Compact, JSON-safe snapshot (timestamps as epoch seconds)"""
+        return {
+            'topic': self.current_topic,
+            'continuity': self.topic_continuity_score,
+            'topics': [[e['keywords'], e['timestamp'].timestamp()] for e in self.topic_history],
+            'emotions': [[e['emotion'], e['timestamp'].timestamp()] for e in self.emotion_history],
+            'intents': [[e['intent'], e['timestamp'].timestamp()] for e in self.intent_history],
+            'vector': self.topic_vector.to_state()
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], max_history: int = 10) -> 'ConversationFlowTracker':
+        tracker = cls(max_history=max_history)
+        tracker.current_topic = state.get('topic')
+        tracker.topic_continuity_score = state.get('continuity', 0.0)
+        tracker.topic_vector = TopicVector.from_state(state.get('vector', {}), tracker.topic_dim, tracker.topic_decay)
+        for keywords, ts in state.get('topics', []):
+            tracker.topic_history.append({'keywords': keywords, 'timestamp': datetime.fromtimestamp(ts)})
+        for emotion, ts in state.get('emotions', []):
+            tracker.emotion_history.append({'emotion': emotion, 'timestamp': datetime.fromtimestamp(ts)})
+        for intent, ts in state.get('intents', []):
+            tracker.intent_history.append({'intent': intent, 'timestamp': datetime.fromtimestamp(ts)})
+        return tracker
+
     def get_suggested_response_style(self) -> Dict[str, Any]:
         """Get suggested response style based on conversation flow"""
         context = self.get_conversation_context()
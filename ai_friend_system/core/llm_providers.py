@@ -273,7 +273,7 @@ class HuggingFaceProvider:
                 )
                 response = self.tokenizer.decode(outputs[0][input_length:], skip_special_tokens=True).strip()
             
-            self.logger.info(f"HuggingFace generated {len(response.split())} words: {response[:100]}...")
+            self.logger.debug("HuggingFace generated %d chars: %.100s", len(response), response)
             return response
             
         except Exception as e:
@@ -336,6 +336,22 @@ class SimpleChatbot:
                 "Interesting perspective! What led you to think that way?"
             ]
         }
+        
+        self.question_responses = [
+            "That's a great question! Let me think...",
+            "Hmm, interesting question! From what I understand...",
+            "Good question! Here's what I think...",
+        ]
+    
+    def canned_responses(self) -> List[str]:
+        '''Every reply generate() can return (for warming emotion caches)'''
+        replies = [reply for options in self.responses.values() for reply in options]
+        replies += [
+            f"{question} {reply}"
+            for question in self.question_responses
+            for reply in self.responses['default']
+        ]
+        return replies
     
     async def generate(self, messages: List[Dict], system_prompt: str) -> str:
         '''Generate simple rule-based response'''
@@ -354,12 +370,7 @@ class SimpleChatbot:
         
         # Check for questions
         if '?' in user_message:
-            question_responses = [
-                "That's a great question! Let me think...",
-                "Hmm, interesting question! From what I understand...",
-                "Good question! Here's what I think...",
-            ]
-            return random.choice(question_responses) + " " + random.choice(self.responses['default'])
+            return random.choice(self.question_responses) + " " + random.choice(self.responses['default'])
         
         # Default response
         return random.choice(self.responses['default'])
\ No newline at end of file
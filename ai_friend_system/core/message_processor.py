@@ -1,12 +1,16 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from agents import AgentCoordinator
+from agents.lexicon import lexicon
 from memory import MemoryManager
 from .nlp_engine import NLPEngine
 from database import DatabaseManager, MessageModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.logger import Logger
 from config.constants import MessageType
+from config import db_config
+from utils.tracing import traced
+from utils.text_features import TextFeatures
 import asyncio
 
 class MessageProcessor:
@@ -40,39 +44,18 @@ class MessageProcessor:
         start_time = datetime.now()
         
         # Optimized: Run text cleaning and history retrieval in parallel
-        cleaned_text_task = asyncio.create_task(
-            asyncio.to_thread(self.nlp_engine.clean_text, user_message)
+        prepared, recent_messages = await asyncio.gather(
+            self.prepare_text(user_message),
+            self.db_manager.get_recent_messages(session, conversation_id, limit=3)  # Reduced from 5
         )
-        history_task = self.db_manager.get_recent_messages(session, conversation_id, limit=3)  # Reduced from 5
-        
-        # Wait for both
-        cleaned_text, recent_messages = await asyncio.gather(
-            cleaned_text_task,
-            history_task
-        )
-        
-        # Quick text analysis (lightweight)
-        text_analysis = self.nlp_engine.analyze_text(cleaned_text)
         history = [{'role': msg.role, 'content': msg.content} for msg in reversed(recent_messages)]
-        
-        # Build agent input
-        agent_input = {
-            'text': cleaned_text,
-            'history': history,
-            'analysis': text_analysis
-        }
 
         # RUN AGENTS (already optimized with timeouts)
-        agent_results = await self.agent_coordinator.process_parallel(agent_input)
-
-        # FIX: return a full dictionary (previously missing → caused NoneType)
-# SAFETY GUARD
-        if not isinstance(agent_results, dict):
-            agent_results = {}
+        agent_results = await self.run_agents(prepared, history, conversation_id)
 
         return {
-            "cleaned_text": cleaned_text,
-            "analysis": text_analysis,
+            "cleaned_text": prepared["cleaned_text"],
+            "analysis": prepared["analysis"],
             "history": history,
 
             # REQUIRED BY AIFriend
@@ -82,3 +65,43 @@ class MessageProcessor:
             "success": agent_results.get("success", True)
         }
 
+    # =====================================================
+    # PIPELINE STAGES (used independently by the turn DAG)
+    # =====================================================
+    @traced("message_processor.fetch_history")
+    async def fetch_history(self, conversation_id: int, limit: int = 3) -> List[Dict[str, str]]:
+        """Recent history on a dedicated session so it can run beside other stages"""
+        recent_messages = []
+        async for session in db_config.get_session():
+            recent_messages = await self.db_manager.get_recent_messages(session, conversation_id, limit=limit)
+        return [{'role': msg.role, 'content': msg.content} for msg in reversed(recent_messages)]
+
+    @traced("message_processor.prepare_text")
+    async def prepare_text(self, user_message: str) -> Dict[str, Any]:
+        """Clean the raw message off the event loop, then run quick analysis"""
+        cleaned_text = await asyncio.to_thread(self.nlp_engine.clean_text, user_message)
+        features = TextFeatures(cleaned_text)  # Built once, read by analysis and every agent
+        return {
+            "cleaned_text": cleaned_text,
+            "features": features,
+            "analysis": self.nlp_engine.analyze_text(features)  # Quick text analysis (lightweight)
+        }
+
+    @traced("message_processor.run_agents")
+    async def run_agents(self, prepared: Dict[str, Any], history: List[Dict[str, str]],
+                         conversation_id: Optional[int] = None) -> Dict[str, Any]:
+        agent_input = {
+            'text': prepared["cleaned_text"],
+            'conversation_id': conversation_id,  # Telemetry rows join the training export on it
+            'history': history,
+            'analysis': prepared["analysis"],
+            'features': prepared.get("features"),
+            # One automaton pass shared by every keyword agent
+            'lexicon': lexicon.scan(prepared["cleaned_text"])
+        }
+        agent_results = await self.agent_coordinator.process_parallel(agent_input)
+
+        # SAFETY GUARD
+        if not isinstance(agent_results, dict):
+            agent_results = {}
+        return agent_results
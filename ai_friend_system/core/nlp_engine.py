@@ -1,20 +1,26 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Union
 from utils.logger import Logger
+from utils.text_features import TextFeatures
 import re
 
+_SENTENCE_SPLIT = re.compile(r'[.!?]+')
+_SPECIAL_CHARS = re.compile(r'[^\w\s.!?,\'-]')
+
 class NLPEngine:
     def __init__(self):
         self.logger = Logger("NLPEngine")
     
-    def analyze_text(self, text: str) -> Dict[str, Any]:
+    def analyze_text(self, text: Union[str, TextFeatures]) -> Dict[str, Any]:
+        features = TextFeatures.of(text)
+        word_count = len(features.words)
         analysis = {
-            'word_count': len(text.split()),
-            'sentence_count': len(re.split(r'[.!?]+', text)),
-            'has_question': '?' in text,
-            'has_exclamation': '!' in text,
-            'capitalized_words': len([w for w in text.split() if w[0].isupper()]),
-            'is_short': len(text.split()) < 5,
-            'is_long': len(text.split()) > 50
+            'word_count': word_count,
+            'sentence_count': len(_SENTENCE_SPLIT.split(features.text)),
+            'has_question': features.has_question,
+            'has_exclamation': features.has_exclamation,
+            'capitalized_words': sum(1 for w in features.words if w[0].isupper()),
+            'is_short': word_count < 5,
+            'is_long': word_count > 50
         }
         
         return analysis
@@ -31,9 +37,10 @@ class NLPEngine:
         
         return phrases[:5]
     
-    def clean_text(self, text: str) -> str:
+    def clean_text(self, text: Union[str, TextFeatures]) -> str:
         # Remove extra whitespace
-        text = ' '.join(text.split())
+        words = text.words if isinstance(text, TextFeatures) else text.split()
+        text = ' '.join(words)
         # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s.!?,\'-]', '', text)
+        text = _SPECIAL_CHARS.sub('', text)
         return text.strip()
\ No newline at end of file
@@ -2,7 +2,8 @@
 Performance monitoring and optimization helpers
 """
 import time
-from typing import Dict, Any
+from collections import Counter, defaultdict, deque
+from typing import Dict, Any, Optional
 from functools import wraps
 from utils.logger import Logger
 
@@ -18,9 +19,23 @@ class PerformanceMonitor:
             "cache_hits": 0,
             "cache_misses": 0,
             "agent_timeouts": 0,
-            "llm_timeouts": 0
+            "llm_timeouts": 0,
+            "loop_lag_incidents": 0
         }
         self.response_times = []
+
+        # Turn pipeline (per-stage) metrics
+        self.stage_times = defaultdict(lambda: deque(maxlen=100))
+        self.stage_failures = defaultdict(Counter)
+        self.critical_paths = Counter()
+
+        # Per-agent metrics (latency of executed runs + outcome counters)
+        self.agent_times = defaultdict(lambda: deque(maxlen=100))
+        self.agent_outcomes = defaultdict(Counter)
+        self.agent_blocking = defaultdict(lambda: deque(maxlen=100))
+
+        # Event-loop scheduling delay (sampled by the loop watchdog)
+        self.loop_lags = deque(maxlen=500)
     
     def track_response_time(self, duration: float):
         """Track response time for averaging"""
@@ -31,6 +46,32 @@ class PerformanceMonitor:
         self.metrics["total_requests"] += 1
         self.metrics["avg_response_time"] = sum(self.response_times) / len(self.response_times)
     
+    def track_pipeline(self, run):
+        """Track per-stage durations, failures and the critical path of one turn"""
+        for name, timing in run.timings.items():
+            self.stage_times[name].append(timing.duration)
+            if timing.status != "ok":
+                self.stage_failures[name][timing.status] += 1
+        if run.critical_path:
+            self.critical_paths[" > ".join(run.critical_path)] += 1
+    
+    def track_agent(self, name: str, duration: float, status: str = "ok",
+                    loop_blocked: Optional[float] = None):
+        """Track one agent run (status: ok / timeout / error / cached / skipped)"""
+        if status in ("ok", "timeout", "error"):
+            self.agent_times[name].append(duration)
+        if loop_blocked is not None:
+            self.agent_blocking[name].append(loop_blocked)
+        self.agent_outcomes[name][status] += 1
+        if status == "timeout":
+            self.metrics["agent_timeouts"] += 1
+
+    def track_loop_lag(self, lag: float, incident: bool = False):
+        """One event-loop scheduling delay sample (incident = past the stall threshold)"""
+        self.loop_lags.append(lag)
+        if incident:
+            self.metrics["loop_lag_incidents"] += 1
+
     def get_stats(self) -> Dict[str, Any]:
         """Get performance statistics"""
         return {
@@ -38,14 +79,43 @@ class PerformanceMonitor:
             "p95_response_time": self._percentile(95),
             "p99_response_time": self._percentile(99),
             "min_response_time": min(self.response_times) if self.response_times else 0,
-            "max_response_time": max(self.response_times) if self.response_times else 0
+            "max_response_time": max(self.response_times) if self.response_times else 0,
+            "stages": self.get_stage_stats(),
+            "critical_paths": dict(self.critical_paths.most_common(5)),
+            "agents": self.get_agent_stats(),
+            "loop_lag_p95": round(self._percentile(95, self.loop_lags), 4),
+            "loop_lag_max": round(max(self.loop_lags), 4) if self.loop_lags else 0.0
+        }
+
+    def get_stage_stats(self) -> Dict[str, Any]:
+        """Per-stage latency summary for the turn pipeline"""
+        return {
+            name: {
+                "avg": round(sum(times) / len(times), 4) if times else 0.0,
+                "p95": round(self._percentile(95, times), 4),
+                **dict(self.stage_failures[name])
+            }
+            for name, times in self.stage_times.items()
+        }
+    
+    def get_agent_stats(self) -> Dict[str, Any]:
+        """Per-agent latency summary and outcome counters"""
+        return {
+            name: {
+                "avg": round(sum(times) / len(times), 4) if times else 0.0,
+                "p95": round(self._percentile(95, times), 4),
+                "loop_blocked_p95": round(self._percentile(95, self.agent_blocking[name]), 6),
+                **dict(self.agent_outcomes[name])
+            }
+            for name, times in {**{n: [] for n in self.agent_outcomes}, **self.agent_times}.items()
         }
     
-    def _percentile(self, p: int) -> float:
+    def _percentile(self, p: int, values=None) -> float:
         """Calculate percentile"""
-        if not self.response_times:
+        values = self.response_times if values is None else values
+        if not values:
             return 0.0
-        sorted_times = sorted(self.response_times)
+        sorted_times = sorted(values)
         index = int(len(sorted_times) * p / 100)
         return sorted_times[min(index, len(sorted_times) - 1)]
 
@@ -6,6 +6,7 @@ import json
 from typing import Optional, Dict, Any
 from services.redis_client import redis_client
 from utils.logger import Logger
+from utils.tracing import traced
 import asyncio
 
 logger = Logger("ResponseCache")
@@ -30,6 +31,7 @@ class ResponseCache:
         cache_string = f"{last_message.lower().strip()}:{context_key}"
         return hashlib.md5(cache_string.encode()).hexdigest()
     
+    @traced("cache.get")
     async def get(self, messages: list, context: Dict[str, Any]) -> Optional[str]:
         """Get cached response if available"""
         if not redis_client:
@@ -50,6 +52,7 @@ class ResponseCache:
             logger.warning(f"Cache get error: {e}")
             return None
     
+    @traced("cache.set")
     async def set(self, messages: list, context: Dict[str, Any], response: str):
         """Cache response for future use"""
         if not redis_client:
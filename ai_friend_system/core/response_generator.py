@@ -4,6 +4,7 @@ import openai
 from config import settings
 from utils.logger import Logger
 from .response_cache import response_cache
+from utils.tracing import tracer
 import asyncio
 import threading
 
@@ -53,8 +54,8 @@ class ResponseGenerator:
             
             # Only log at startup, not on every request
             self.logger.info("✅ ResponseGenerator initialized (singleton)")
-            self.logger.debug(f"Ollama available: {self.ollama.available}")
-            self.logger.debug(f"HuggingFace available: {self.huggingface.available}")
+            self.logger.debug("Ollama available: %s", self.ollama.available)
+            self.logger.debug("HuggingFace available: %s", self.huggingface.available)
             
             self._initialized = True
     
@@ -78,36 +79,39 @@ class ResponseGenerator:
     async def generate_response(self, messages: List[Dict], context: Dict[str, Any]) -> str:
         '''Generate response with cascading fallback and caching'''
         
-        # Debug: Log incoming request
+        # Debug: Log incoming request (lazy args; %.200s truncates at format time)
         user_message = messages[-1].get('content', '') if messages else ''
-        self.logger.info(f"📥 INCOMING REQUEST:")
-        self.logger.info(f"   User message: {user_message[:200]}...")
-        self.logger.info(f"   Emotion: {context.get('emotion', {}).get('emotion', 'neutral')}")
-        self.logger.info(f"   Memories: {len(context.get('memories', []))} memories")
-        self.logger.info(f"   History length: {len(messages)} messages")
+        self.logger.debug(
+            "📥 INCOMING REQUEST: %.200s | emotion=%s memories=%d history=%d",
+            user_message,
+            context.get('emotion', {}).get('emotion', 'neutral'),
+            len(context.get('memories', [])),
+            len(messages)
+        )
         
         # Check cache first for instant responses
         cached = await self.cache.get(messages, context)
         if cached:
             self.logger.debug("⚡ Cache HIT - instant response")
-            self.logger.info(f"📤 OUTGOING RESPONSE (cached): {cached[:200]}...")
+            self.logger.debug("📤 OUTGOING RESPONSE (cached): %.200s", cached)
             return cached
         
         system_prompt = self._build_system_prompt(context)
-        self.logger.debug(f"System prompt length: {len(system_prompt)} chars")
+        self.logger.debug("System prompt length: %d chars", len(system_prompt))
         
         # Try providers in order with timeouts for speed
         # 1. Try Ollama (free local, fastest)
         if self.ollama.available:
             try:
-                self.logger.info("🤖 Trying Ollama provider...")
-                response = await asyncio.wait_for(
+                self.logger.debug("🤖 Trying Ollama provider...")
+                response = await self._call_provider(
+                    "ollama",
                     self.ollama.generate(messages, system_prompt),
                     timeout=5.0  # Increased timeout for better responses
                 )
                 if response:
-                    self.logger.info(f"📤 OUTGOING RESPONSE (Ollama): {response[:200]}...")
-                    self.logger.info(f"   Response length: {len(response)} chars")
+                    self.logger.info("📤 Response from Ollama (%d chars)", len(response))
+                    self.logger.debug("📤 OUTGOING RESPONSE (Ollama): %.200s", response)
                     await self.cache.set(messages, context, response)
                     return response
             except asyncio.TimeoutError:
@@ -116,14 +120,15 @@ class ResponseGenerator:
         # 2. Try Cloud APIs (faster than HuggingFace)
         if self.anthropic_client:
             try:
-                self.logger.info("🤖 Trying Anthropic provider...")
-                response = await asyncio.wait_for(
+                self.logger.debug("🤖 Trying Anthropic provider...")
+                response = await self._call_provider(
+                    "anthropic",
                     self._try_anthropic(messages, context),
                     timeout=8.0  # Increased for better responses
                 )
                 if response:
-                    self.logger.info(f"📤 OUTGOING RESPONSE (Anthropic): {response[:200]}...")
-                    self.logger.info(f"   Response length: {len(response)} chars")
+                    self.logger.info("📤 Response from Anthropic (%d chars)", len(response))
+                    self.logger.debug("📤 OUTGOING RESPONSE (Anthropic): %.200s", response)
                     await self.cache.set(messages, context, response)
                     return response
             except asyncio.TimeoutError:
@@ -131,14 +136,15 @@ class ResponseGenerator:
         
         if self.openai_client:
             try:
-                self.logger.info("🤖 Trying OpenAI provider...")
-                response = await asyncio.wait_for(
+                self.logger.debug("🤖 Trying OpenAI provider...")
+                response = await self._call_provider(
+                    "openai",
                     self._try_openai(messages, context),
                     timeout=8.0  # Increased for better responses
                 )
                 if response:
-                    self.logger.info(f"📤 OUTGOING RESPONSE (OpenAI): {response[:200]}...")
-                    self.logger.info(f"   Response length: {len(response)} chars")
+                    self.logger.info("📤 Response from OpenAI (%d chars)", len(response))
+                    self.logger.debug("📤 OUTGOING RESPONSE (OpenAI): %.200s", response)
                     await self.cache.set(messages, context, response)
                     return response
             except asyncio.TimeoutError:
@@ -147,27 +153,36 @@ class ResponseGenerator:
         # 3. Try HuggingFace (slower, local fallback)
         if self.huggingface.available:
             try:
-                self.logger.info("🤖 Trying HuggingFace provider...")
-                response = await asyncio.wait_for(
+                self.logger.debug("🤖 Trying HuggingFace provider...")
+                response = await self._call_provider(
+                    "huggingface",
                     self.huggingface.generate(messages, system_prompt),
                     timeout=10.0  # Increased for better responses
                 )
                 if response:
-                    self.logger.info(f"📤 OUTGOING RESPONSE (HuggingFace): {response[:200]}...")
-                    self.logger.info(f"   Response length: {len(response)} chars")
+                    self.logger.info("📤 Response from HuggingFace (%d chars)", len(response))
+                    self.logger.debug("📤 OUTGOING RESPONSE (HuggingFace): %.200s", response)
                     await self.cache.set(messages, context, response)
                     return response
             except asyncio.TimeoutError:
                 self.logger.debug("HuggingFace timeout")
         
         # 4. Fallback to simple chatbot (instant, always works!)
-        self.logger.info("🤖 Using fallback chatbot...")
-        response = await self.simple_chatbot.generate(messages, system_prompt)
-        self.logger.info(f"📤 OUTGOING RESPONSE (Fallback): {response[:200]}...")
-        self.logger.info(f"   Response length: {len(response)} chars")
+        self.logger.debug("🤖 Using fallback chatbot...")
+        with tracer.span("llm.simple_chatbot"):
+            response = await self.simple_chatbot.generate(messages, system_prompt)
+        self.logger.info("📤 Response from fallback chatbot (%d chars)", len(response))
+        self.logger.debug("📤 OUTGOING RESPONSE (Fallback): %.200s", response)
         await self.cache.set(messages, context, response)
         return response
     
+    async def _call_provider(self, name: str, coro, timeout: float) -> Optional[str]:
+        """Run one provider call under its timeout inside a tracing span"""
+        with tracer.span(f"llm.{name}", timeout=timeout) as span:
+            response = await asyncio.wait_for(coro, timeout=timeout)
+            span.set_attribute("response_chars", len(response) if response else 0)
+            return response
+    
     async def _try_anthropic(self, messages: List[Dict], context: Dict) -> Optional[str]:
         if not self.anthropic_client:
             return None
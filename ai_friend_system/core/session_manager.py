@@ -2,11 +2,21 @@
 Multi-user session manager for isolated AI instances
 """
 
-from typing import Dict
+from typing import AsyncIterator, Dict, Any, List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import asyncio
 from .ai_friend import AIFriend
+from .turn_queue import TurnQueue
+from .session_store import SessionStore
 from utils.logger import Logger
+from config import settings
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
 
 
 class AIFriendSession:
@@ -16,6 +26,19 @@ class AIFriendSession:
         self.created_at = datetime.now()
         self.last_accessed = datetime.now()
         self.is_initialized = False
+        # Open connections (WebSockets) holding this session between messages
+        self.pins = 0
+
+        # Single consumer for this user's inbound turns
+        queue_config = settings.get('sessions.turn_queue', {}) or {}
+        self.turn_queue = TurnQueue(
+            self.ai_friend.chat,
+            max_depth=queue_config.get('max_depth', 4),
+            policy=queue_config.get('policy', 'queue'),
+            retry_after=queue_config.get('retry_after_seconds', 1.0),
+            max_coalesce=queue_config.get('max_coalesce', 8),
+            max_coalesce_chars=queue_config.get('max_coalesce_chars', 4000)
+        )
 
     async def initialize(self):
         if not self.is_initialized:
@@ -23,55 +46,223 @@ class AIFriendSession:
             await self.ai_friend.start_conversation(self.user_id)
             self.is_initialized = True
 
+    async def revive(self, state: Dict[str, Any]):
+        """Initialize from a hibernated state, continuing the same conversation"""
+        await self.ai_friend.restore_state(state)
+        self.is_initialized = True
+
+    def is_idle(self) -> bool:
+        """Safe to hibernate: nothing queued or running, no connection holding it"""
+        return self.pins == 0 and self.turn_queue.depth == 0
+
     async def chat(self, message: str):
         self.last_accessed = datetime.now()
-        return await self.ai_friend.chat(message)
+        # Raises TurnRejected when the queue applies backpressure
+        return await self.turn_queue.submit(message)
 
     def is_expired(self, timeout_minutes: int = 30) -> bool:
         return (datetime.now() - self.last_accessed) > timedelta(minutes=timeout_minutes)
 
 
 class AIFriendSessions:
-    def __init__(self, session_timeout_minutes: int = 30):
+    """Resident sessions for active users; idle ones hibernate to disk
+
+    Sessions idle past the timeout, or the least recently used ones once the
+    resident count / process RSS exceeds its budget, are serialized through
+    SessionStore and revived transparently by get_or_create.
+    """
+
+    def __init__(self, session_timeout_minutes: int = 30, max_resident: int = 500,
+                 max_rss_mb: float = 0, store: Optional[SessionStore] = None):
         self.sessions: Dict[str, AIFriendSession] = {}
         self.session_timeout = session_timeout_minutes
+        self.max_resident = max(1, int(max_resident))
+        self.max_rss_mb = max_rss_mb  # 0 disables the memory-pressure check
+        self.store = store or SessionStore(retention_days=settings.get('sessions.store_retention_days', 7))
         self.logger = Logger("SessionManager")
+        # Per-user locks held while a session is created, revived or hibernated,
+        # so concurrent first messages share one session and nobody is handed
+        # a session that is being written out and evicted
+        self._user_locks: Dict[str, List[Any]] = {}  # user_id -> [lock, holders + waiters]
+        self._pressure_task: Optional[asyncio.Task] = None
 
     async def get_or_create(self, user_id: str) -> AIFriendSession:
         user_id = str(user_id)
 
-        if user_id not in self.sessions:
-            self.logger.info(f"Creating new session for user: {user_id}")
-            session = AIFriendSession(user_id)
-            await session.initialize()
-            self.sessions[user_id] = session
-        else:
+        if user_id in self.sessions and user_id not in self._user_locks:
             self.sessions[user_id].last_accessed = datetime.now()
+            return self.sessions[user_id]
+
+        async with self._user_lock(user_id):
+            if user_id not in self.sessions:
+                session = AIFriendSession(user_id)
+                state = await self.store.load(user_id)
+                if state:
+                    self.logger.info(f"Reviving hibernated session for user: {user_id}")
+                    await session.revive(state)
+                else:
+                    self.logger.info(f"Creating new session for user: {user_id}")
+                    await session.initialize()
+                self.sessions[user_id] = session
+            else:
+                self.sessions[user_id].last_accessed = datetime.now()
+
+        if len(self.sessions) > self.max_resident and not self._pressure_task:
+            self._pressure_task = asyncio.create_task(self._relieve_pressure())
 
         return self.sessions[user_id]
 
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str) -> AsyncIterator[None]:
+        entry = self._user_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            # Dropped only once nobody holds or waits on it, so every caller
+            # for this user serializes on the same lock
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+
+    async def pin(self, user_id: str) -> AIFriendSession:
+        """Session for a long-lived connection; not hibernated until unpinned"""
+        session = await self.get_or_create(user_id)
+        session.pins += 1
+        return session
+
+    def unpin(self, session: AIFriendSession):
+        session.pins = max(0, session.pins - 1)
+        session.last_accessed = datetime.now()  # Idle timeout starts at disconnect
+
     async def remove(self, user_id: str):
+        """Drop the session entirely, including any hibernated state"""
         user_id = str(user_id)
         if user_id in self.sessions:
             del self.sessions[user_id]
             self.logger.info(f"Removed session for user: {user_id}")
+        await self.store.delete(user_id)
+
+    async def hibernate(self, user_id: str) -> bool:
+        """Spill an idle session to disk and evict it from RAM"""
+        user_id = str(user_id)
+        session = self.sessions.get(user_id)
+        if not session or not session.is_idle() or user_id in self._user_locks:
+            return False
+
+        # get_or_create waits on this lock instead of handing the session out
+        # while it is being written, then revives it from the saved state
+        async with self._user_lock(user_id):
+            turns = session.turn_queue.stats_counters["processed"]
+            await self.store.save(user_id, session.ai_friend.to_state())
+
+            # A turn ran or queued on a reference taken before the save started:
+            # the saved state is stale and the session still in use
+            if (self.sessions.get(user_id) is not session or not session.is_idle()
+                    or session.turn_queue.stats_counters["processed"] != turns):
+                await self.store.delete(user_id)
+                return False
+
+            del self.sessions[user_id]
+        self.logger.debug(f"Hibernated session for user: {user_id}")
+        return True
+
+    async def hibernate_all(self):
+        """Persist every idle session (used at shutdown)"""
+        for uid in list(self.sessions):
+            await self.hibernate(uid)
+
+    def _rss_mb(self) -> float:
+        if not PSUTIL_AVAILABLE:
+            return 0.0
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+    def _under_pressure(self) -> bool:
+        if len(self.sessions) > self.max_resident:
+            return True
+        return bool(self.max_rss_mb) and self._rss_mb() > self.max_rss_mb
+
+    def _eviction_candidates(self) -> List[str]:
+        """Idle sessions, least recently used first"""
+        idle = [(s.last_accessed, uid) for uid, s in self.sessions.items() if s.is_idle()]
+        return [uid for _, uid in sorted(idle)]
+
+    async def _relieve_pressure(self):
+        try:
+            if not self._under_pressure():
+                return
+
+            candidates = self._eviction_candidates()
+            if len(self.sessions) > self.max_resident:
+                budget = len(self.sessions) - self.max_resident
+            else:
+                # RSS does not drop immediately after eviction, so take a fixed slice
+                budget = max(1, len(candidates) // 4)
+
+            hibernated = 0
+            for uid in candidates[:budget]:
+                if await self.hibernate(uid):
+                    hibernated += 1
+            if hibernated:
+                self.logger.info(f"Memory pressure: hibernated {hibernated} idle sessions")
+        finally:
+            self._pressure_task = None
 
     async def cleanup_expired(self):
+        """Hibernate sessions idle past the timeout, then enforce the resident budget"""
         expired_users = [
             uid for uid, session in self.sessions.items()
             if session.is_expired(self.session_timeout)
         ]
         for uid in expired_users:
-            await self.remove(uid)
+            await self.hibernate(uid)
+
+        if self._under_pressure():
+            await self._relieve_pressure()
+
+        await asyncio.to_thread(self.store.purge_expired)
 
     async def start_cleanup_task(self):
+        interval = settings.get('sessions.sweep_interval_seconds', 60)
         while True:
-            await asyncio.sleep(300)
-            await self.cleanup_expired()
+            await asyncio.sleep(interval)
+            try:
+                await self.cleanup_expired()
+            except Exception as e:
+                self.logger.error(f"Session sweep failed: {e}")
 
     def get_active_sessions(self) -> int:
         return len(self.sessions)
 
+    async def get_hibernation_stats(self) -> Dict[str, Any]:
+        # The stored count globs the state directory: keep it off the loop
+        store_stats = await asyncio.to_thread(self.store.get_stats)
+        return {
+            "resident": len(self.sessions),
+            "max_resident": self.max_resident,
+            "rss_mb": round(self._rss_mb(), 1) if PSUTIL_AVAILABLE else None,
+            "max_rss_mb": self.max_rss_mb or None,
+            **store_stats
+        }
+
+    def get_queue_depths(self) -> Dict[str, int]:
+        """Inbound turn queue depth per user"""
+        return {uid: session.turn_queue.depth for uid, session in self.sessions.items()}
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        depths = self.get_queue_depths()
+        return {
+            "per_user": depths,
+            "total_depth": sum(depths.values()),
+            "max_depth": max(depths.values()) if depths else 0,
+            "busy_users": sum(1 for d in depths.values() if d > 0)
+        }
+
 
 # ✅ GLOBAL INSTANCE
-sessions = AIFriendSessions()
+sessions = AIFriendSessions(
+    settings.get('sessions.timeout_minutes', 30),
+    max_resident=settings.get('sessions.max_resident', 500),
+    max_rss_mb=settings.get('sessions.max_rss_mb', 0)
+)
@@ -0,0 +1,111 @@
+"""
+Hibernated session store
+Keeps idle sessions as compact JSON files under data/sessions so they can be
+evicted from RAM and revived on the user's next message
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from utils.logger import Logger
+
+logger = Logger("SessionStore")
+
+STATE_VERSION = 1
+
+
+class SessionStore:
+    """One file per hibernated user; writes are atomic (tmp + rename)"""
+
+    def __init__(self, directory: Optional[Path] = None, retention_days: float = 7):
+        self.directory = Path(directory or Path(__file__).parent.parent / 'data' / 'sessions')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retention_seconds = retention_days * 86400 if retention_days and retention_days > 0 else None
+
+        self.stats_counters = {
+            "hibernated": 0,
+            "revived": 0,
+            "expired": 0,
+            "bytes_written": 0
+        }
+
+    def _path(self, user_id: str) -> Path:
+        # User ids come from clients; never use them as file names directly
+        digest = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def _write(self, user_id: str, state: Dict[str, Any]) -> int:
+        payload = json.dumps(
+            {"v": STATE_VERSION, "saved_at": time.time(), **state},
+            separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+        path = self._path(user_id)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return len(payload)
+
+    def _read(self, user_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(user_id)
+        try:
+            with open(path, 'rb') as f:
+                state = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable session state for {user_id}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        if state.get("v") != STATE_VERSION or state.get("user_id") != str(user_id):
+            path.unlink(missing_ok=True)
+            return None
+
+        if self.retention_seconds and time.time() - state.get("saved_at", 0) > self.retention_seconds:
+            path.unlink(missing_ok=True)
+            self.stats_counters["expired"] += 1
+            return None
+
+        return state
+
+    async def save(self, user_id: str, state: Dict[str, Any]):
+        size = await asyncio.to_thread(self._write, user_id, state)
+        self.stats_counters["hibernated"] += 1
+        self.stats_counters["bytes_written"] += size
+
+    async def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Read a hibernated state and remove it from disk (the session is resident again)"""
+        state = await asyncio.to_thread(self._read, user_id)
+        if state is not None:
+            await self.delete(user_id)
+            self.stats_counters["revived"] += 1
+        return state
+
+    async def delete(self, user_id: str):
+        await asyncio.to_thread(self._path(user_id).unlink, missing_ok=True)
+
+    def purge_expired(self) -> int:
+        """Drop hibernated states older than the retention window"""
+        if not self.retention_seconds:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        removed = 0
+        for path in self.directory.glob('*.json'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        self.stats_counters["expired"] += removed
+        return removed
+
+    def count(self) -> int:
+        return sum(1 for _ in self.directory.glob('*.json'))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"stored": self.count(), **self.stats_counters}
@@ -0,0 +1,158 @@
+"""
+Turn pipeline DAG
+Declares a chat turn as stages with explicit dependencies and runs them with
+maximal concurrency, each stage under its own timeout and fallback
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from utils.logger import Logger
+from utils.tracing import tracer
+
+logger = Logger("TurnPipeline")
+
+
+@dataclass
+class Stage:
+    """One node of the turn DAG
+
+    `run` receives a dict of {dependency name: result}. When the stage times
+    out or raises, `fallback` (called with the same dict) supplies its result.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+
+@dataclass
+class StageTiming:
+    start: float
+    end: float
+    status: str = "ok"  # ok / timeout / error
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class PipelineResult:
+    results: Dict[str, Any]
+    timings: Dict[str, StageTiming]
+    critical_path: List[str] = field(default_factory=list)
+    total_time: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact per-turn report (ms)"""
+        return {
+            "total_ms": round(self.total_time * 1000, 1),
+            "critical_path": self.critical_path,
+            "stages": {
+                name: {
+                    "ms": round(t.duration * 1000, 1),
+                    "status": t.status
+                }
+                for name, t in self.timings.items()
+            }
+        }
+
+
+class TurnPipeline:
+    """Runs a small DAG of async stages as soon as their dependencies finish"""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Cycle detected at stage: {name}")
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage dependency: {name}")
+            state[name] = 1
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def run(self) -> PipelineResult:
+        results: Dict[str, Any] = {}
+        timings: Dict[str, StageTiming] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        async def run_stage(stage: Stage):
+            if stage.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in stage.depends_on))
+
+            inputs = {dep: results[dep] for dep in stage.depends_on}
+            start = time.perf_counter()
+            status, error = "ok", None
+            try:
+                with tracer.span(f"stage.{stage.name}"):
+                    if stage.timeout:
+                        value = await asyncio.wait_for(stage.run(inputs), timeout=stage.timeout)
+                    else:
+                        value = await stage.run(inputs)
+            except asyncio.TimeoutError:
+                status = "timeout"
+                value = stage.fallback(inputs) if stage.fallback else None
+                logger.warning(f"Stage '{stage.name}' timed out after {stage.timeout}s, using fallback")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status, error = "error", str(e)
+                value = stage.fallback(inputs) if stage.fallback else None
+                logger.error(f"Stage '{stage.name}' failed: {e}")
+
+            results[stage.name] = value
+            timings[stage.name] = StageTiming(start - started, time.perf_counter() - started, status, error)
+
+        # Dependencies come first in topological order, so their tasks exist
+        for name in self.order:
+            tasks[name] = asyncio.create_task(run_stage(self.stages[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        return PipelineResult(
+            results=results,
+            timings=timings,
+            critical_path=self._critical_path(timings),
+            total_time=time.perf_counter() - started
+        )
+
+    def _critical_path(self, timings: Dict[str, StageTiming]) -> List[str]:
+        """Walk back from the last stage to finish through its latest-finishing dependency"""
+        if not timings:
+            return []
+
+        current = max(timings, key=lambda name: timings[name].end)
+        path = [current]
+        while self.stages[current].depends_on:
+            current = max(self.stages[current].depends_on, key=lambda dep: timings[dep].end)
+            path.append(current)
+        path.reverse()
+        return path
@@ -0,0 +1,166 @@
+"""
+Per-session inbound turn queue
+Serializes chat turns for a single user so concurrent sends (double-send,
+WebSocket + REST) never run the pipeline against the same state at once
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from utils.logger import Logger, get_request_id, set_request_id
+
+logger = Logger("TurnQueue")
+
+# Overflow / merge policies
+POLICY_QUEUE = "queue"              # FIFO, reject new turns when full
+POLICY_DROP_OLDEST = "drop_oldest"  # FIFO, evict the oldest waiting turn when full
+POLICY_COALESCE = "coalesce"        # Merge waiting messages into one turn (up to a size cap)
+
+POLICIES = (POLICY_QUEUE, POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+
+class TurnRejected(Exception):
+    """Backpressure signal: the turn was refused or dropped from the queue"""
+
+    def __init__(self, reason: str, queue_depth: int, retry_after: float):
+        super().__init__(f"Turn {reason} (queue depth {queue_depth})")
+        self.reason = reason
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "error": "busy",
+            "reason": self.reason,
+            "queue_depth": self.queue_depth,
+            "retry_after": self.retry_after
+        }
+
+
+class _PendingTurn:
+    __slots__ = ("messages", "futures", "request_id", "chars")
+
+    def __init__(self, message: str, future: asyncio.Future, request_id: Optional[str] = None):
+        self.messages: List[str] = [message]
+        self.futures: List[asyncio.Future] = [future]
+        self.chars = len(message)
+        # The worker task outlives the submitter's context, so carry its id
+        self.request_id = request_id
+
+
+class TurnQueue:
+    """Bounded inbound queue with a single consumer per session"""
+
+    def __init__(self, handler: Callable[[str], Awaitable[Dict[str, Any]]],
+                 max_depth: int = 4, policy: str = POLICY_QUEUE,
+                 retry_after: float = 1.0, max_coalesce: int = 8,
+                 max_coalesce_chars: int = 4000):
+        if policy not in POLICIES:
+            logger.warning(f"Unknown turn queue policy '{policy}', using '{POLICY_QUEUE}'")
+            policy = POLICY_QUEUE
+
+        self.handler = handler
+        self.max_depth = max(1, int(max_depth))
+        self.policy = policy
+        self.retry_after = retry_after
+        # A merged turn never grows past these; further messages start a new
+        # turn (and hit max_depth like any other)
+        self.max_coalesce = max(1, int(max_coalesce))
+        self.max_coalesce_chars = max(1, int(max_coalesce_chars))
+
+        self._pending: Deque[_PendingTurn] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self._busy = False
+
+        self.stats_counters = {
+            "processed": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "coalesced": 0
+        }
+
+    @property
+    def depth(self) -> int:
+        """Waiting turns plus the one currently running"""
+        return len(self._pending) + (1 if self._busy else 0)
+
+    async def submit(self, message: str) -> Dict[str, Any]:
+        """Enqueue a turn and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+
+        if self.policy == POLICY_COALESCE and self._pending and self._can_coalesce(self._pending[-1], message):
+            # Turn not started yet: fold this message into it
+            turn = self._pending[-1]
+            turn.messages.append(message)
+            turn.futures.append(future)
+            turn.chars += len(message) + 1
+            self.stats_counters["coalesced"] += 1
+            return await future
+
+        if len(self._pending) >= self.max_depth:
+            if self.policy == POLICY_DROP_OLDEST:
+                dropped = self._pending.popleft()
+                self.stats_counters["dropped"] += 1
+                error = TurnRejected("dropped", self.depth, self.retry_after)
+                for waiter in dropped.futures:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+            else:
+                self.stats_counters["rejected"] += 1
+                raise TurnRejected("rejected", self.depth, self.retry_after)
+
+        self._pending.append(_PendingTurn(message, future, get_request_id()))
+        self._ensure_worker()
+        return await future
+
+    def _can_coalesce(self, turn: _PendingTurn, message: str) -> bool:
+        return (len(turn.messages) < self.max_coalesce
+                and turn.chars + 1 + len(message) <= self.max_coalesce_chars)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        """Single consumer: run queued turns one at a time until empty"""
+        while self._pending:
+            turn = self._pending.popleft()
+            self._busy = True
+            set_request_id(turn.request_id)
+            try:
+                result = await self.handler("\n".join(turn.messages))
+            except Exception as e:
+                for waiter in turn.futures:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            except BaseException:
+                # Worker cancelled (shutdown) or interrupted: nobody will run
+                # this turn or the queued ones, so release every waiter
+                self._cancel_waiters(turn)
+                while self._pending:
+                    self._cancel_waiters(self._pending.popleft())
+                raise
+            else:
+                if len(turn.futures) > 1:
+                    result = {**result, "coalesced_messages": len(turn.futures)}
+                for waiter in turn.futures:
+                    if not waiter.done():
+                        waiter.set_result(result)
+            finally:
+                self._busy = False
+                self.stats_counters["processed"] += 1
+
+    @staticmethod
+    def _cancel_waiters(turn: _PendingTurn):
+        for waiter in turn.futures:
+            if not waiter.done():
+                waiter.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "policy": self.policy,
+            "max_coalesce": self.max_coalesce,
+            "max_coalesce_chars": self.max_coalesce_chars,
+            **self.stats_counters
+        }
@@ -0,0 +1,130 @@
+"""
+Backfill / re-score emotion labels on stored messages
+
+Streams the messages table in keyset-paginated chunks (WHERE id > last_id),
+scores each chunk with AdvancedEmotionAnalyzer.analyze_many and writes
+emotion + confidence back with one executemany per chunk.
+
+Usage:
+    cd ai_friend_system
+    python database/backfill_emotions.py                 # rows without an emotion
+    python database/backfill_emotions.py --all           # re-score everything
+    python database/backfill_emotions.py --role user --batch-size 1000 --dry-run
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add current directory to path for imports
+current_dir = Path(__file__).parent.parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+try:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError as e:
+    print("ERROR: Missing dependencies. Please activate virtual environment:")
+    print("  source ../venv/bin/activate")
+    print("  pip install -r requirements.txt")
+    sys.exit(1)
+
+try:
+    from config import settings
+    from utils.logger import Logger
+    from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer
+except ImportError as e:
+    print(f"ERROR: Cannot import project modules: {e}")
+    print("Make sure you're running from the ai_friend_system directory")
+    sys.exit(1)
+
+logger = Logger("Backfill")
+
+
+async def backfill_emotions(batch_size: int = 500, role: str = None,
+                            rescore_all: bool = False, dry_run: bool = False) -> dict:
+    """Score messages chunk by chunk; returns totals and throughput"""
+    database_url = f"sqlite+aiosqlite:///{settings.database_path}"
+    engine = create_async_engine(database_url, echo=False)
+    analyzer = AdvancedEmotionAnalyzer()
+
+    filters = ["id > :last_id"]
+    if not rescore_all:
+        filters.append("emotion IS NULL")
+    if role:
+        filters.append("role = :role")
+    select_chunk = text(
+        f"SELECT id, content FROM messages WHERE {' AND '.join(filters)} "
+        f"ORDER BY id LIMIT :limit"
+    )
+    update_rows = text("UPDATE messages SET emotion = :emotion, confidence = :confidence WHERE id = :id")
+
+    last_id = 0
+    total = 0
+    scoring_time = 0.0
+    start = time.perf_counter()
+
+    try:
+        while True:
+            async with engine.begin() as conn:
+                rows = (await conn.execute(
+                    select_chunk, {"last_id": last_id, "role": role, "limit": batch_size}
+                )).all()
+                if not rows:
+                    break
+
+                chunk_start = time.perf_counter()
+                results = analyzer.analyze_many([content for _, content in rows])
+                chunk_scoring = time.perf_counter() - chunk_start
+                scoring_time += chunk_scoring
+
+                if not dry_run:
+                    await conn.execute(update_rows, [
+                        {"id": row_id, "emotion": r['primary_emotion'], "confidence": r['confidence']}
+                        for (row_id, _), r in zip(rows, results)
+                    ])
+
+            last_id = rows[-1][0]
+            total += len(rows)
+            logger.info(
+                "Chunk up to id=%d: %d messages (%.0f msgs/sec scoring, %d total)",
+                last_id, len(rows), len(rows) / chunk_scoring if chunk_scoring > 0 else 0, total
+            )
+    finally:
+        await engine.dispose()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "messages": total,
+        "elapsed_seconds": round(elapsed, 2),
+        "messages_per_sec": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        "scoring_messages_per_sec": round(total / scoring_time, 1) if scoring_time > 0 else 0.0,
+        "dry_run": dry_run
+    }
+    logger.info(
+        "✅ Backfill complete: %d messages in %.2fs (%.1f msgs/sec end-to-end, %.1f scoring)%s",
+        total, elapsed, stats["messages_per_sec"], stats["scoring_messages_per_sec"],
+        " [dry run]" if dry_run else ""
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill emotion labels on stored messages")
+    parser.add_argument("--batch-size", type=int, default=500, help="Messages per chunk")
+    parser.add_argument("--role", choices=["user", "assistant"], help="Only messages with this role")
+    parser.add_argument("--all", action="store_true", dest="rescore_all",
+                        help="Re-score every message, not just those without an emotion")
+    parser.add_argument("--dry-run", action="store_true", help="Score but do not write back")
+    args = parser.parse_args()
+
+    asyncio.run(backfill_emotions(
+        batch_size=max(1, args.batch_size), role=args.role,
+        rescore_all=args.rescore_all, dry_run=args.dry_run
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict, Any
+from collections import namedtuple
 from datetime import datetime, timedelta
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from .schema import *
 from .models import *
@@ -8,11 +9,108 @@ from config.constants import MemoryTier
 from config import settings
 import asyncio
 import json
+from utils.lru_cache import LRUCache
+from utils.tracing import traced
+
+
+# What retrieval scores (no context/embedding/related_memories blobs)
+CONTEXT_COLUMNS = (
+    Memory.id, Memory.tier, Memory.content, Memory.importance, Memory.created_at,
+    Memory.last_accessed, Memory.tags, Memory.emotion_at_creation
+)
+ContextRow = namedtuple('ContextRow', [column.key for column in CONTEXT_COLUMNS])
+CONTEXT_LIMIT = 5  # Rows per tier in the context
+
+
+def _context_order(row):
+    """Sort key matching the tier query's ORDER BY importance DESC, last_accessed DESC"""
+    return (
+        row.importance if row.importance is not None else float('-inf'),
+        row.last_accessed or datetime.min
+    )
+
+
+def _rows_size(rows) -> int:
+    """Approximate bytes held by cached context rows (text columns + per-row overhead)"""
+    return sum(256 + len(mem.content or '') + len(mem.tags or '') for mem in rows)
+
+
+# Long-lived tier rows by (conversation id, tier): filled on first read,
+# invalidated by the writes below; volatile tiers always hit the database
+CACHED_TIERS = frozenset(settings.get('tier_cache.tiers', [MemoryTier.PERMANENT.value, MemoryTier.PERSONAL.value]))
+tier_cache = LRUCache(
+    settings.get('tier_cache.max_entries', 2048),
+    maxbytes=settings.get('tier_cache.max_bytes', 32 * 1024 * 1024),
+    sizeof=_rows_size
+)
+# Keys with reads in flight -> [generation, readers]; invalidation bumps the
+# generation so a read that raced a write doesn't cache stale rows. Entries
+# only live while a read is running, so this stays as small as the concurrency
+_tier_reads: Dict[Any, List[int]] = {}
+
+
+def _supersede_tier_reads(key):
+    """Reads in flight for `key` saw the old rows: don't let them fill the cache"""
+    if key in _tier_reads:
+        _tier_reads[key][0] += 1
+
+
+def invalidate_tier_cache(conversation_id: int, tier: Optional[str] = None):
+    for cached_tier in ([tier] if tier is not None else CACHED_TIERS):
+        if cached_tier in CACHED_TIERS:
+            key = (conversation_id, cached_tier)
+            _supersede_tier_reads(key)
+            tier_cache.pop(key)
+
+
+def _touch_tier_cache(accessed: List[Any], accessed_at: datetime):
+    """Apply an access bump to cached tiers without dropping them
+
+    `accessed` rows are (id, conversation_id, tier, importance). Cached rows
+    get the new last_accessed and are re-sorted; a bumped row that isn't
+    cached only matters if it now outranks the last cached row, in which
+    case that tier is dropped.
+    """
+    by_key: Dict[Any, Dict[int, float]] = {}
+    for row in accessed:
+        if row.tier in CACHED_TIERS:
+            by_key.setdefault((row.conversation_id, row.tier), {})[row.id] = row.importance
+    for key, importances in by_key.items():
+        _supersede_tier_reads(key)
+        cached = tier_cache.peek(key)
+        if cached is None:
+            continue
+        cached_ids = {row.id for row in cached}
+        floor = _context_order(cached[-1])[0] if cached else None
+        if any(memory_id not in cached_ids and (floor is None or (importance or 0.0) >= floor)
+               for memory_id, importance in importances.items()):
+            tier_cache.pop(key)
+            continue
+        rows = [row._replace(last_accessed=accessed_at) if row.id in importances else row for row in cached]
+        rows.sort(key=_context_order, reverse=True)
+        tier_cache.set(key, tuple(rows))
+
+
+def _begin_tier_read(key) -> int:
+    entry = _tier_reads.setdefault(key, [0, 0])
+    entry[1] += 1
+    return entry[0]
+
+
+def _end_tier_read(key, generation: int) -> bool:
+    """Ends a read; True if nothing invalidated the key since it began"""
+    entry = _tier_reads[key]
+    entry[1] -= 1
+    if entry[1] == 0:
+        del _tier_reads[key]
+    return entry[0] == generation
+
 
 class DatabaseManager:
     def __init__(self):
         self.config = settings.memory_config
     
+    @traced("db.create_conversation")
     async def create_conversation(self, session: AsyncSession, user_id: str, session_id: str) -> int:
         conv = Conversation(
             user_id=user_id, 
@@ -26,10 +124,9 @@ class DatabaseManager:
         await session.refresh(conv)
         return conv.id
     
+    @traced("db.update_conversation_stats")
     async def update_conversation_stats(self, session: AsyncSession, conversation_id: int):
         """Update conversation statistics"""
-        from sqlalchemy import func
-        
         # Get message stats
         msg_stats = await session.execute(
             select(
@@ -53,6 +150,7 @@ class DatabaseManager:
             )
             await session.commit()
     
+    @traced("db.save_message")
     async def save_message(self, session: AsyncSession, msg: MessageModel) -> int:
         db_msg = Message(
             conversation_id=msg.conversation_id,
@@ -85,6 +183,7 @@ class DatabaseManager:
 
 
     
+    @traced("db.save_memory")
     async def save_memory(self, session: AsyncSession, mem: MemoryModel) -> int:
         db_mem = Memory(
             conversation_id=mem.conversation_id,
@@ -108,12 +207,14 @@ class DatabaseManager:
 
         session.add(db_mem)
         await session.commit()
+        invalidate_tier_cache(db_mem.conversation_id, db_mem.tier)
         await session.refresh(db_mem)
 
         return db_mem.id
 
 
     
+    @traced("db.get_recent_messages")
     async def get_recent_messages(self, session: AsyncSession, conversation_id: int, limit: int = 10) -> List[Message]:
         # Optimized: Only select needed columns and use index
         result = await session.execute(
@@ -124,42 +225,180 @@ class DatabaseManager:
         )
         return list(result.scalars().all())  # Convert to list for faster iteration
     
+    @traced("db.get_memories_by_tier")
     async def get_memories_by_tier(self, session: AsyncSession, conversation_id: int, tier: str) -> List[Memory]:
         # Optimized: Limit results and use index
         result = await session.execute(
             select(Memory)
             .where(Memory.conversation_id == conversation_id, Memory.tier == tier)
             .order_by(Memory.importance.desc(), Memory.last_accessed.desc())
-            .limit(5)  # Limit for speed
+            .limit(CONTEXT_LIMIT)  # Limit for speed
         )
         return list(result.scalars().all())
     
-    async def cleanup_expired_memories(self, session: AsyncSession):
-        now = datetime.now()
+    @traced("db.get_top_memories_by_tiers")
+    async def get_top_memories_by_tiers(self, session: AsyncSession, conversation_id: int,
+                                        tiers: List[str], limit: int = CONTEXT_LIMIT) -> Dict[str, List[Any]]:
+        """Top `limit` context rows per tier (importance, then recency) in one statement
+
+        ROW_NUMBER() partitioned by tier over the (conversation_id, tier,
+        importance, last_accessed) index; rows are lightweight tuples of
+        CONTEXT_COLUMNS. Results for long-lived tiers fill the tier cache
+        (only at the default limit, which is what cache readers expect)
+        """
+        generations = {
+            tier: _begin_tier_read((conversation_id, tier))
+            for tier in tiers if tier in CACHED_TIERS and limit == CONTEXT_LIMIT
+        }
+        by_tier: Dict[str, List[Any]] = {tier: [] for tier in tiers}
+        try:
+            rank = func.row_number().over(
+                partition_by=Memory.tier,
+                order_by=(Memory.importance.desc(), Memory.last_accessed.desc())
+            ).label('rank')
+            ranked = (
+                select(*CONTEXT_COLUMNS, rank)
+                .where(Memory.conversation_id == conversation_id, Memory.tier.in_(tiers))
+                .subquery()
+            )
+            result = await session.execute(
+                select(*(ranked.c[column.key] for column in CONTEXT_COLUMNS))
+                .where(ranked.c.rank <= limit)
+                .order_by(ranked.c.tier, ranked.c.rank)
+            )
+            for row in result.all():
+                by_tier[row.tier].append(ContextRow(*row))
+        except BaseException:
+            for tier, generation in generations.items():
+                _end_tier_read((conversation_id, tier), generation)
+            raise
+        
+        # Skip caching if a write invalidated a tier while the query ran
+        for tier, generation in generations.items():
+            if _end_tier_read((conversation_id, tier), generation):
+                tier_cache.set((conversation_id, tier), tuple(by_tier[tier]))
+        return by_tier
+    
+    def get_cached_memories_by_tier(self, conversation_id: int, tier: str) -> Optional[List[Any]]:
+        """Cached context rows of a long-lived tier, or None (no session needed)"""
+        if tier not in CACHED_TIERS:
+            return None
+        cached = tier_cache.get((conversation_id, tier))
+        return list(cached) if cached is not None else None
+    
+    @traced("db.get_memories_by_ids")
+    async def get_memories_by_ids(self, session: AsyncSession, memory_ids: List[int]) -> List[Memory]:
+        if not memory_ids:
+            return []
+        result = await session.execute(select(Memory).where(Memory.id.in_(memory_ids)))
+        return list(result.scalars().all())
+    
+    @traced("db.get_memory_embeddings")
+    async def get_memory_embeddings(self, session: AsyncSession, conversation_id: int) -> List[Any]:
+        """(id, content, embedding) rows for every memory of a conversation"""
+        result = await session.execute(
+            select(Memory.id, Memory.content, Memory.embedding)
+            .where(Memory.conversation_id == conversation_id)
+            .order_by(Memory.id)
+        )
+        return list(result.all())
+    
+    @traced("db.get_memory_texts")
+    async def get_memory_texts(self, session: AsyncSession, conversation_id: int) -> List[Any]:
+        """(id, content) rows for every memory of a conversation"""
+        result = await session.execute(
+            select(Memory.id, Memory.content)
+            .where(Memory.conversation_id == conversation_id)
+            .order_by(Memory.id)
+        )
+        return list(result.all())
+    
+    @traced("db.get_recent_memories")
+    async def get_recent_memories(self, session: AsyncSession, conversation_id: int, limit: int) -> List[Memory]:
+        result = await session.execute(
+            select(Memory)
+            .where(Memory.conversation_id == conversation_id)
+            .order_by(Memory.id.desc())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @traced("db.merge_memories")
+    async def merge_memories(self, session: AsyncSession, conversation_id: int,
+                             canonical_rows: List[Dict[str, Any]], merged_ids: List[int]):
+        """Update the canonical memories (bulk, by primary key) and delete the ones folded into them"""
+        if not canonical_rows:
+            return
+        await session.execute(update(Memory), canonical_rows)
+        await session.execute(delete(Memory).where(Memory.id.in_(merged_ids)))
+        await session.commit()
+        invalidate_tier_cache(conversation_id)
+    
+    @traced("db.update_memory_embeddings")
+    async def update_memory_embeddings(self, session: AsyncSession, embeddings: Dict[int, str]):
+        """Bulk UPDATE by primary key (one executemany)"""
+        if not embeddings:
+            return
         await session.execute(
-            delete(Memory).where(Memory.expires_at <= now, Memory.expires_at.isnot(None))
+            update(Memory),
+            [{"id": memory_id, "embedding": value} for memory_id, value in embeddings.items()]
         )
         await session.commit()
     
+    @traced("db.cleanup_expired_memories")
+    async def cleanup_expired_memories(self, session: AsyncSession, limit: Optional[int] = None) -> List[Any]:
+        """Delete expired memories (at most `limit`, oldest expiry first); returns their (id, conversation_id) rows"""
+        now = datetime.now()
+        query = (
+            select(Memory.id, Memory.conversation_id)
+            .where(Memory.expires_at <= now, Memory.expires_at.isnot(None))
+            .order_by(Memory.expires_at)
+        )
+        if limit:
+            query = query.limit(limit)
+        result = await session.execute(query)
+        expired = list(result.all())
+        if expired:
+            await session.execute(delete(Memory).where(Memory.id.in_([row.id for row in expired])))
+        await session.commit()
+        for conversation_id in {row.conversation_id for row in expired}:
+            invalidate_tier_cache(conversation_id)
+        return expired
+    
+    @traced("db.update_memory_access")
     async def update_memory_access(self, session: AsyncSession, memory_id: int):
-        await session.execute(
+        await self.update_memories_access(session, [memory_id])
+    
+    @traced("db.update_memories_access")
+    async def update_memories_access(self, session: AsyncSession, memory_ids: List[int]):
+        """Bump access counts and last_accessed; cached tiers are updated in place"""
+        if not memory_ids:
+            return
+        accessed_at = datetime.now()
+        result = await session.execute(
             update(Memory)
-            .where(Memory.id == memory_id)
-            .values(access_count=Memory.access_count + 1, last_accessed=datetime.now())
+            .where(Memory.id.in_(memory_ids))
+            .values(access_count=Memory.access_count + 1, last_accessed=accessed_at)
+            .returning(Memory.id, Memory.conversation_id, Memory.tier, Memory.importance)
         )
+        accessed = result.all()
         await session.commit()
+        _touch_tier_cache(accessed, accessed_at)
     
+    @traced("db.get_user_profile")
     async def get_user_profile(self, session: AsyncSession, user_id: str) -> Optional[UserProfile]:
         result = await session.execute(
             select(UserProfile).where(UserProfile.user_id == user_id)
         )
         return result.scalar_one_or_none()
     
+    @traced("db.save_personal_info")
     async def save_personal_info(self, session: AsyncSession, user_id: str, category: str, key: str, value: str):
         info = PersonalInfo(user_id=user_id, category=category, key=key, value=value)
         session.add(info)
         await session.commit()
     
+    @traced("db.get_persona")
     async def get_persona(self, session: AsyncSession, user_id: str) -> Optional[PersonaModel]:
         """Get persona configuration for a user"""
         result = await session.execute(
@@ -199,6 +438,7 @@ class DatabaseManager:
             updated_at=db_persona.updated_at
         )
     
+    @traced("db.save_persona")
     async def save_persona(self, session: AsyncSession, persona: PersonaModel) -> int:
         """Save or update persona configuration"""
         # Check if persona exists
@@ -237,6 +477,7 @@ class DatabaseManager:
         await session.refresh(db_persona)
         return db_persona.id
     
+    @traced("db.delete_persona")
     async def delete_persona(self, session: AsyncSession, user_id: str):
         """Delete persona configuration for a user"""
         await session.execute(
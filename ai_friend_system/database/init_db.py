@@ -57,6 +57,12 @@ async def create_indexes(engine):
             ON memories(tier, importance DESC, last_accessed DESC)
         """))
         
+        # Index for per-conversation top-N by tier (retrieval window query)
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_memories_conversation_tier_rank 
+            ON memories(conversation_id, tier, importance DESC, last_accessed DESC)
+        """))
+        
         # Index for memory expiration cleanup
         await conn.execute(text("""
             CREATE INDEX IF NOT EXISTS idx_memories_expires 
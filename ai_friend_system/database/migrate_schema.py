@@ -126,6 +126,13 @@ async def migrate_database():
                     except Exception as e:
                         logger.warning(f"Column {col_name} may already exist: {e}")
             
+            # Composite index for the per-tier retrieval query
+            await session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_memories_conversation_tier_rank
+                ON memories(conversation_id, tier, importance DESC, last_accessed DESC)
+            """))
+            logger.info("✅ Ensured index: idx_memories_conversation_tier_rank")
+            
             # Migrate agent_logs table
             logger.info("Migrating agent_logs table...")
             result = await session.execute(text("PRAGMA table_info(agent_logs)"))
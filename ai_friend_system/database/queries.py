@@ -22,6 +22,17 @@ class Queries:
     
     @staticmethod
     async def search_memories(session: AsyncSession, conversation_id: int, query: str, limit: int = 5) -> List[Memory]:
+        # BM25 over the conversation's keyword index when it is loaded
+        from memory.inverted_index import keyword_indexes, tokenize
+        index = keyword_indexes.get(conversation_id)
+        if index is not None:
+            hits = [memory_id for memory_id, _ in index.search(tokenize(query), limit)]
+            if not hits:
+                return []
+            result = await session.execute(select(Memory).where(Memory.id.in_(hits)))
+            order = {memory_id: rank for rank, memory_id in enumerate(hits)}
+            return sorted(result.scalars().all(), key=lambda mem: order[mem.id])
+        
         result = await session.execute(
             select(Memory)
             .where(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from config.database_config import Base
 
@@ -88,6 +88,12 @@ class Memory(Base):
     created_at = Column(DateTime, default=func.now(), index=True)
     expires_at = Column(DateTime, index=True)
 
+    __table_args__ = (
+        # Per-conversation top-N by tier (ROW_NUMBER retrieval query)
+        Index('idx_memories_conversation_tier_rank', 'conversation_id', 'tier',
+              importance.desc(), last_accessed.desc()),
+    )
+
 
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from .schema import Conversation, Message, Memory, AgentLog
 from utils.logger import Logger
+from memory.vector_index import decode_embedding
 
 logger = Logger("TrainingData")
 
@@ -117,7 +118,7 @@ class TrainingDataExporter:
                 "related_memories": json.loads(mem.related_memories) if mem.related_memories else [],
                 "access_count": mem.access_count,
                 "created_at": mem.created_at.isoformat() if mem.created_at else None,
-                "embedding": json.loads(mem.embedding) if mem.embedding else None
+                "embedding": self._embedding_list(mem.embedding)
             }
             training_data["memories"].append(memory_data)
         
@@ -157,6 +158,11 @@ class TrainingDataExporter:
         
         return training_data
     
+    @staticmethod
+    def _embedding_list(value: Optional[str]) -> Optional[List[float]]:
+        embedding = decode_embedding(value)
+        return embedding.tolist() if embedding is not None else None
+    
     async def mark_exported(self, conversation_id: int):
         """Mark conversation as exported"""
         from sqlalchemy import update
@@ -0,0 +1,374 @@
+"""
+Incremental BM25 keyword index for memory retrieval
+One inverted index per conversation: term -> postings (memory ids in
+ascending order with term frequencies) plus per-memory lengths. Memories
+are added as they are stored and dropped when they expire; queries run
+document-at-a-time with MaxScore pruning, so a search touches the postings
+of the query terms rather than every memory. Indexes persist as flat numpy
+arrays (one .npz per conversation) and are reconciled with the database
+when loaded
+"""
+import asyncio
+import math
+import os
+import re
+import heapq
+from array import array
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from config import settings
+from utils.lru_cache import LRUCache
+from utils.text_features import STOP_WORDS
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words or single characters"""
+    return [t for t in _TOKEN.findall((text or '').lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+class _Postings:
+    __slots__ = ('docs', 'tfs', 'max_tf')
+
+    def __init__(self):
+        self.docs = array('q')
+        self.tfs = array('l')
+        self.max_tf = 0
+
+    def add(self, doc_id: int, tf: int):
+        if not self.docs or doc_id > self.docs[-1]:
+            self.docs.append(doc_id)
+            self.tfs.append(tf)
+        else:  # Out-of-order id (reconciling an older memory)
+            i = bisect_left(self.docs, doc_id)
+            self.docs.insert(i, doc_id)
+            self.tfs.insert(i, tf)
+        self.max_tf = max(self.max_tf, tf)
+
+    def tf(self, doc_id: int) -> int:
+        i = bisect_left(self.docs, doc_id)
+        return self.tfs[i] if i < len(self.docs) and self.docs[i] == doc_id else 0
+
+
+class InvertedIndex:
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else settings.get('memory_index.keyword.k1', 1.2)
+        self.b = b if b is not None else settings.get('memory_index.keyword.b', 0.75)
+        self.postings: Dict[str, _Postings] = {}
+        self.df: Dict[str, int] = {}
+        self.doc_terms: Dict[int, Dict[str, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+        self.min_length = 0
+        self.deleted: Set[int] = set()  # Still in postings until the next compaction
+        # Bumped on every change; saved_version is the one last written to disk
+        self.version = 0
+        self.saved_version = 0
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.saved_version
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self.doc_terms
+
+    def add(self, doc_id: int, text: str):
+        if doc_id in self.doc_terms:
+            return
+        if doc_id in self.deleted:
+            self.compact()
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        length = sum(counts.values())
+        self.doc_terms[doc_id] = counts
+        self.lengths[doc_id] = length
+        self.total_length += length
+        self.min_length = length if len(self.doc_terms) == 1 else min(self.min_length, length)
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _Postings()
+            postings.add(doc_id, tf)
+            self.df[term] = self.df.get(term, 0) + 1
+        self.version += 1
+
+    def remove(self, doc_ids: Iterable[int]):
+        for doc_id in doc_ids:
+            counts = self.doc_terms.pop(doc_id, None)
+            if counts is None:
+                continue
+            self.total_length -= self.lengths.pop(doc_id)
+            for term in counts:
+                self.df[term] -= 1
+            self.deleted.add(doc_id)
+            self.version += 1
+        # min_length and max_tf stay as (still valid) bounds until compaction
+        if len(self.deleted) > max(64, len(self.doc_terms) // 4):
+            self.compact()
+
+    def compact(self):
+        """Drop deleted memories from the postings and tighten the bounds"""
+        if not self.deleted:
+            return
+        for term in {t for t, df in self.df.items() if df <= 0}:
+            del self.df[term]
+            del self.postings[term]
+        for term, postings in self.postings.items():
+            if not any(doc in self.deleted for doc in postings.docs):
+                continue
+            rebuilt = _Postings()
+            for doc, tf in zip(postings.docs, postings.tfs):
+                if doc not in self.deleted:
+                    rebuilt.add(doc, tf)
+            self.postings[term] = rebuilt
+        self.min_length = min(self.lengths.values(), default=0)
+        self.deleted.clear()
+
+    def search(self, query_terms: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        """Top-k (memory id, BM25) by MaxScore, best first"""
+        n = len(self.doc_terms)
+        terms = [t for t in dict.fromkeys(query_terms) if self.df.get(t, 0) > 0]
+        if not terms or k <= 0 or n == 0:
+            return []
+
+        k1, b = self.k1, self.b
+        avgdl = self.total_length / n or 1.0
+        idf = {t: math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5)) for t in terms}
+
+        def upper_bound(t):
+            tf = self.postings[t].max_tf
+            return idf[t] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * self.min_length / avgdl))
+
+        # Ascending upper bounds; cumulative[i] bounds what terms[0..i] can add
+        terms.sort(key=upper_bound)
+        lists = [self.postings[t] for t in terms]
+        weights = [idf[t] for t in terms]
+        cumulative = list(np.cumsum([upper_bound(t) for t in terms]))
+        positions = [0] * len(terms)
+
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        first_essential = 0
+        lengths = self.lengths
+        while True:
+            # Only lists whose bounds can lift a doc past the threshold drive candidates
+            candidate = None
+            for i in range(first_essential, len(lists)):
+                if positions[i] < len(lists[i].docs):
+                    doc = lists[i].docs[positions[i]]
+                    if candidate is None or doc < candidate:
+                        candidate = doc
+            if candidate is None:
+                break
+
+            length = lengths.get(candidate)
+            norm = k1 * (1 - b + b * length / avgdl) if length is not None else 0.0
+            score = 0.0
+            for i in range(first_essential, len(lists)):
+                postings, p = lists[i], positions[i]
+                if p < len(postings.docs) and postings.docs[p] == candidate:
+                    if length is not None:
+                        tf = postings.tfs[p]
+                        score += weights[i] * tf * (k1 + 1) / (tf + norm)
+                    positions[i] = p + 1
+            if length is None:  # Deleted, awaiting compaction
+                continue
+
+            for i in range(first_essential - 1, -1, -1):
+                if len(heap) == k and score + cumulative[i] <= threshold:
+                    break
+                tf = lists[i].tf(candidate)
+                if tf:
+                    score += weights[i] * tf * (k1 + 1) / (tf + norm)
+
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -candidate))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -candidate))
+            else:
+                continue
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < len(lists) and cumulative[first_essential] <= threshold:
+                    first_essential += 1
+
+        return [(-neg_doc, score) for score, neg_doc in sorted(heap, reverse=True)]
+
+    def keyword_scores(self, doc_ids: Iterable[int], query_terms: Sequence[str]) -> Dict[int, float]:
+        """BM25 of the given memories scaled to 0..1 (1.0 = every query term once at average length, x2 boost)"""
+        n = len(self.doc_terms)
+        terms = list(dict.fromkeys(query_terms))
+        if not terms or n == 0:
+            return {}
+        k1, b = self.k1, self.b
+        avgdl = self.total_length / n or 1.0
+        idf = {t: math.log(1 + (n - self.df.get(t, 0) + 0.5) / (self.df.get(t, 0) + 0.5)) for t in terms}
+        ideal = sum(idf.values())
+
+        scores = {}
+        for doc_id in doc_ids:
+            counts = self.doc_terms.get(doc_id)
+            if counts is None:
+                continue
+            norm = k1 * (1 - b + b * self.lengths[doc_id] / avgdl)
+            score = sum(idf[t] * counts[t] * (k1 + 1) / (counts[t] + norm) for t in terms if t in counts)
+            scores[doc_id] = min(1.0, score / ideal * 2.0)
+        return scores
+
+    def snapshot(self) -> Tuple[Dict[str, Tuple[array, array]], Set[int], Dict[int, int]]:
+        """Copies of the postings, deletions and lengths (cheap, on the loop); flatten with arrays_from"""
+        postings = {term: (p.docs[:], p.tfs[:]) for term, p in self.postings.items()}
+        return postings, set(self.deleted), dict(self.lengths)
+
+    @staticmethod
+    def arrays_from(snapshot) -> Dict[str, np.ndarray]:
+        """Flat arrays: terms as one UTF-8 blob + offsets, postings offsets, ids and tfs, doc lengths
+
+        Terms are not a numpy string array: those are fixed-width, so one
+        very long token would size every row
+        """
+        postings, deleted, lengths = snapshot
+        terms = [term.encode('utf-8') for term in postings]
+        sizes = np.fromiter((len(docs) for docs, _ in postings.values()), dtype=np.int64, count=len(postings))
+        docs = np.frombuffer(b''.join(docs.tobytes() for docs, _ in postings.values()), dtype=np.int64)
+        tfs = np.concatenate([np.asarray(tfs, dtype=np.int32) for _, tfs in postings.values()] or [np.zeros(0, np.int32)])
+
+        if deleted:
+            # One mask over every posting, then per-term counts of what is kept
+            keep = ~np.isin(docs, np.fromiter(deleted, dtype=np.int64, count=len(deleted)))
+            term_of = np.repeat(np.arange(len(terms)), sizes)
+            sizes = np.bincount(term_of[keep], minlength=len(terms))
+            docs, tfs = docs[keep], tfs[keep]
+            live = sizes > 0
+            terms = [term for term, alive in zip(terms, live.tolist()) if alive]
+            sizes = sizes[live]
+
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in terms], out=term_offsets[1:])
+        return {
+            'term_bytes': np.frombuffer(b''.join(terms), dtype=np.uint8),
+            'term_offsets': term_offsets,
+            'offsets': offsets,
+            'docs': docs,
+            'tfs': tfs,
+            'doc_ids': np.fromiter(lengths, dtype=np.int64, count=len(lengths)),
+            'lengths': np.fromiter(lengths.values(), dtype=np.int32, count=len(lengths))
+        }
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return self.arrays_from(self.snapshot())
+
+    @staticmethod
+    def write(path: Path, arrays: Dict[str, np.ndarray]):
+        """Atomic .npz write (blocking: run off the event loop)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{id(arrays)}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def save(self, path: Path):
+        self.write(path, self.to_arrays())
+
+    @classmethod
+    def load(cls, path: Path) -> "InvertedIndex":
+        index = cls()
+        with np.load(path) as data:
+            blob, term_offsets = data['term_bytes'].tobytes(), data['term_offsets'].tolist()
+            terms = [blob[term_offsets[i]:term_offsets[i + 1]].decode('utf-8') for i in range(len(term_offsets) - 1)]
+            offsets, docs, tfs = data['offsets'], data['docs'], data['tfs']
+            for i, term in enumerate(terms):
+                postings = _Postings()
+                start, end = offsets[i], offsets[i + 1]
+                postings.docs.frombytes(docs[start:end].tobytes())
+                postings.tfs.extend(tfs[start:end].tolist())
+                postings.max_tf = int(tfs[start:end].max()) if end > start else 0
+                index.postings[term] = postings
+                index.df[term] = int(end - start)
+                for doc, tf in zip(docs[start:end].tolist(), tfs[start:end].tolist()):
+                    index.doc_terms.setdefault(doc, {})[term] = tf
+            index.lengths = dict(zip(data['doc_ids'].tolist(), data['lengths'].tolist()))
+        for doc in index.lengths:
+            index.doc_terms.setdefault(doc, {})
+        index.total_length = sum(index.lengths.values())
+        index.min_length = min(index.lengths.values(), default=0)
+        return index
+
+
+def index_path(conversation_id: int) -> Path:
+    root = settings.base_dir / settings.get('memory_index.keyword.path', 'data/keyword_index')
+    return root / f"{conversation_id}.npz"
+
+
+def load_index(conversation_id: int) -> Optional[InvertedIndex]:
+    """Persisted index, or None if missing or unreadable (blocking)"""
+    path = index_path(conversation_id)
+    if not path.exists():
+        return None
+    try:
+        return InvertedIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_snapshot(path: Path, snapshot):
+    InvertedIndex.write(path, InvertedIndex.arrays_from(snapshot))
+
+
+# conversation id -> [lock, holders + waiters] while a persist is running
+_persist_locks: Dict[int, List[Any]] = {}
+
+
+@asynccontextmanager
+async def _persist_lock(conversation_id: int) -> AsyncIterator[None]:
+    entry = _persist_locks.setdefault(conversation_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _persist_locks[conversation_id]
+
+
+async def persist(conversation_id: int, index: InvertedIndex):
+    """Snapshot on the loop (the index is only mutated there), flatten and write in a thread
+
+    Persists of one conversation run one at a time, each snapshotting only
+    once the previous write is done, so an older snapshot can never land
+    last. The index stays dirty unless the write succeeds.
+    """
+    async with _persist_lock(conversation_id):
+        version = index.version
+        await asyncio.to_thread(_write_snapshot, index_path(conversation_id), index.snapshot())
+        index.saved_version = max(index.saved_version, version)
+
+
+async def persist_dirty() -> int:
+    """Persist every loaded index changed since its last write; returns how many were written
+
+    Writes only mark indexes dirty; this runs on the maintenance schedule.
+    An index evicted before it is persisted just reconciles with the
+    database when it is next loaded
+    """
+    written = 0
+    for conversation_id, index in keyword_indexes.items():
+        if index.dirty:
+            await persist(conversation_id, index)
+            written += 1
+    return written
+
+
+# Loaded indexes by conversation id (evicted ones are reloaded from disk)
+keyword_indexes = LRUCache(settings.get('memory_index.max_conversations', 256))
@@ -0,0 +1,165 @@
+"""
+Scheduled memory maintenance
+Replaces the per-write optimize task: a background loop with its own
+sessions that, every interval, deletes expired memories in bounded chunks
+(pausing between chunks so SQLite writers are not starved), consolidates
+the conversations that received new memories since their last pass
+(tracked by a per-conversation memory-id watermark, forgotten once the
+conversation is caught up), a few per run, and writes out the keyword
+indexes changed since the last pass
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+from config import settings, db_config
+from database import DatabaseManager
+from utils.logger import Logger
+from .inverted_index import persist_dirty as persist_keyword_indexes
+from .memory_optimizer import MemoryOptimizer
+
+logger = Logger("MemoryMaintenance")
+
+
+class MemoryMaintenance:
+    def __init__(self):
+        self.enabled = settings.get('memory_maintenance.enabled', True)
+        self.interval = settings.get('memory_maintenance.interval_seconds', 60)
+        self.chunk_size = settings.get('memory_maintenance.expiry_chunk_size', 1000)
+        self.max_chunks = settings.get('memory_maintenance.max_chunks_per_run', 10)
+        self.chunk_pause = settings.get('memory_maintenance.chunk_pause_ms', 50) / 1000
+        self.conversations_per_run = settings.get('memory_maintenance.conversations_per_run', 5)
+
+        self.optimizer = MemoryOptimizer(DatabaseManager())
+        self._task: Optional[asyncio.Task] = None
+
+        # conversation id -> newest memory id stored / newest id already consolidated;
+        # only conversations with unconsolidated memories are kept
+        self.pending: Dict[int, int] = {}
+        self.watermarks: Dict[int, int] = {}
+
+        self.runs: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.expired_total = 0
+        self.consolidated_total = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def mark_dirty(self, conversation_id: int, memory_id: int):
+        """Write path hook: O(1), no database work"""
+        if memory_id > self.pending.get(conversation_id, 0):
+            self.pending[conversation_id] = memory_id
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("Memory maintenance started (interval=%ss)", self.interval)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await persist_keyword_indexes()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    async def run_once(self) -> Dict[str, Any]:
+        """One maintenance pass; returns (and records) its report"""
+        started = time.perf_counter()
+        report = {
+            'started_at': datetime.now().isoformat(),
+            'expired': 0,
+            'chunks': 0,
+            'consolidated': 0,
+            'conversations': 0,
+            'indexes_persisted': 0,
+            'error': None
+        }
+        if db_config.async_session is None:
+            return report
+
+        try:
+            expiry_start = time.perf_counter()
+            await self._expire(report)
+            report['expiry_ms'] = round((time.perf_counter() - expiry_start) * 1000, 2)
+
+            consolidation_start = time.perf_counter()
+            await self._consolidate(report)
+            report['consolidation_ms'] = round((time.perf_counter() - consolidation_start) * 1000, 2)
+
+            # Keyword index writes are debounced to here instead of every store
+            report['indexes_persisted'] = await persist_keyword_indexes()
+        except Exception as e:
+            report['error'] = str(e)
+            logger.warning(f"Memory maintenance run failed: {e}")
+
+        report['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self.runs.append(report)
+        self.expired_total += report['expired']
+        self.consolidated_total += report['consolidated']
+        if report['expired'] or report['consolidated']:
+            logger.info(
+                "Maintenance: %d expired in %d chunk(s), %d consolidated across %d conversation(s) (%.0fms)",
+                report['expired'], report['chunks'], report['consolidated'],
+                report['conversations'], report['duration_ms']
+            )
+        return report
+
+    async def _expire(self, report: Dict[str, Any]):
+        # Short transactions with pauses in between: other writers get the lock
+        for _ in range(self.max_chunks):
+            async for session in db_config.get_session():
+                deleted = await self.optimizer.cleanup_expired(session, self.chunk_size)
+            report['expired'] += deleted
+            report['chunks'] += 1
+            if deleted < self.chunk_size:
+                return
+            await asyncio.sleep(self.chunk_pause)
+
+    async def _consolidate(self, report: Dict[str, Any]):
+        due = [cid for cid, newest in self.pending.items() if newest > self.watermarks.get(cid, 0)]
+        # Longest-waiting (lowest watermark) first, a few per run
+        due.sort(key=lambda cid: self.watermarks.get(cid, 0))
+        for conversation_id in due[:self.conversations_per_run]:
+            newest = self.pending[conversation_id]
+            merged = None
+            async for session in db_config.get_session():
+                merged = await self.optimizer.consolidate_similar(session, conversation_id)
+            if merged is None:  # Consolidated too recently: stays due
+                continue
+            if self.pending.get(conversation_id) == newest:
+                # Caught up: nothing to track until the next store
+                del self.pending[conversation_id]
+                self.watermarks.pop(conversation_id, None)
+            else:
+                self.watermarks[conversation_id] = newest
+            report['consolidated'] += merged
+            report['conversations'] += 1
+            await asyncio.sleep(self.chunk_pause)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "pending_conversations": sum(
+                1 for cid, newest in self.pending.items() if newest > self.watermarks.get(cid, 0)
+            ),
+            "expired_total": self.expired_total,
+            "consolidated_total": self.consolidated_total,
+            "last_runs": list(self.runs)[-5:]
+        }
+
+
+# Shared scheduler, started and stopped with the app
+memory_maintenance = MemoryMaintenance()
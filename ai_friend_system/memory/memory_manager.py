@@ -1,13 +1,28 @@
 import asyncio
-from typing import List, Dict, Optional, Any
+import numpy as np
+from typing import List, Dict, Optional, Any, Union
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import DatabaseManager, MemoryModel
 from config.constants import MemoryTier
+from config import db_config
 from .memory_tiers import MemoryTierManager
 from .memory_optimizer import MemoryOptimizer
+from .maintenance import memory_maintenance
 from .semantic_scorer import SemanticScorer
+from .vector_index import VectorIndex, vector_indexes, encode_embedding, decode_embedding
+from .inverted_index import InvertedIndex, keyword_indexes, tokenize, load_index
 from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from services.embedding_service import embedding_service
+from utils.logger import Logger
+from utils.tracing import traced, tracer
+from utils.text_features import TextFeatures
+
+logger = Logger("MemoryManager")
+
+# Tiers retrieve_context draws from
+_CONTEXT_TIERS = (MemoryTier.PERMANENT.value, MemoryTier.PERSONAL.value, MemoryTier.TEMPORARY.value)
 
 class MemoryManager:
     def __init__(self, db_manager: DatabaseManager):
@@ -16,7 +31,12 @@ class MemoryManager:
         self.optimizer = MemoryOptimizer(db_manager)
         self.semantic_scorer = SemanticScorer()  # Advanced: semantic relevance scoring
         self.executor = ThreadPoolExecutor(max_workers=2)
+        self.vector_candidates = settings.get('memory_index.candidates', 50)
+        self.keyword_candidates = settings.get('memory_index.keyword.candidates', 20)
+        self.hydrate_batch = settings.get('memory_index.hydrate_batch', 256)
+        self._index_locks: Dict[Any, asyncio.Lock] = {}
     
+    @traced("memory.store")
     async def store_memory(self, session: AsyncSession, conversation_id: int, content: str, 
                           context: Dict, importance: float) -> int:
         tier = self.tier_manager.determine_tier(content, importance, context)
@@ -48,26 +68,55 @@ class MemoryManager:
             training_relevance=importance  # Use importance as training relevance
         )
         
+        # Embedded on the service's worker thread; a memory without an embedding is backfilled on hydration
+        vector = None
+        try:
+            vector = await embedding_service.embed_one(content)
+            memory.embedding = encode_embedding(vector)
+        except Exception as e:
+            logger.warning("Memory embedding failed: %s", e)
+        
         memory_id = await self.db_manager.save_memory(session, memory)
         
-        # Run optimization in background
-        asyncio.create_task(self.optimizer.optimize_memories(session, conversation_id))
+        index = vector_indexes.get(conversation_id)
+        if index is not None and vector is not None:
+            try:
+                index.add([memory_id], [vector])
+            except ValueError as e:
+                # Built for another embedding width: rebuild on next retrieval
+                logger.warning("Dropping vector index for conversation %s: %s", conversation_id, e)
+                vector_indexes.pop(conversation_id)
+        keyword_index = keyword_indexes.get(conversation_id)
+        if keyword_index is not None:
+            keyword_index.add(memory_id, content)  # Persisted by the maintenance loop
+        
+        # Expiry and consolidation run on the maintenance schedule, not per write
+        memory_maintenance.mark_dirty(conversation_id, memory_id)
         
         return memory_id
     
+    @traced("memory.retrieve_context")
     async def retrieve_context(self, session: AsyncSession, conversation_id: int, 
-                              query: str, conversation_context: Dict[str, Any] = None) -> List[Dict]:
+                              query: Union[str, TextFeatures], conversation_context: Dict[str, Any] = None) -> List[Dict]:
         """ADVANCED: Optimized memory retrieval with semantic relevance scoring"""
         context_memories = []
+        query_terms = tokenize(TextFeatures.of(query).text)
         
-        # Retrieve from different tiers in parallel with strict limits
-        tasks = [
-            self.db_manager.get_memories_by_tier(session, conversation_id, MemoryTier.PERMANENT.value),
-            self.db_manager.get_memories_by_tier(session, conversation_id, MemoryTier.PERSONAL.value),
-            self.db_manager.get_memories_by_tier(session, conversation_id, MemoryTier.TEMPORARY.value)
-        ]
-        
-        results = await asyncio.gather(*tasks)
+        # Dense and BM25 top-k candidates first; fall back to the per-tier queries
+        vector_ids, keyword_index = await asyncio.gather(
+            self._vector_hits(conversation_id, query),
+            self._get_keyword_index(conversation_id)
+        )
+        candidate_ids = list(vector_ids)
+        if keyword_index is not None and query_terms:
+            with tracer.span("memory.keyword_search", indexed=len(keyword_index)):
+                candidate_ids.extend(memory_id for memory_id, _ in keyword_index.search(query_terms, self.keyword_candidates))
+        candidates = await self._get_memories(list(dict.fromkeys(candidate_ids)))
+        if candidates:
+            results = [candidates]
+        else:
+            # Top rows per tier: cached long-lived tiers, one windowed query for the rest
+            results = [await self._get_tier_memories(conversation_id)]
         
         # Convert to dict format for scoring
         all_memories = []
@@ -86,14 +135,19 @@ class MemoryManager:
         
         # ADVANCED: Rank memories by semantic relevance
         if all_memories:
-            scored_memories = self.semantic_scorer.rank_memories(
-                all_memories, 
-                query, 
-                conversation_context
-            )
-            
-            # Take top 5 most relevant
-            top_memories = scored_memories[:5]
+            with tracer.span("memory.rank", candidates=len(all_memories)):
+                # Top 5 most relevant
+                # (keyword relevance is BM25 when the conversation's index is loaded)
+                keyword_scores = None
+                if keyword_index is not None:
+                    keyword_scores = keyword_index.keyword_scores((m['id'] for m in all_memories), query_terms)
+                top_memories = self.semantic_scorer.rank_memories(
+                    all_memories, 
+                    query, 
+                    conversation_context,
+                    top_k=5,
+                    keyword_scores=keyword_scores
+                )
             
             for mem in top_memories:
                 context_memories.append({
@@ -111,31 +165,134 @@ class MemoryManager:
         
         return context_memories
     
+    async def _vector_hits(self, conversation_id: int, query: Union[str, TextFeatures]) -> List[int]:
+        """Top-k memory ids by embedding similarity, best first (empty if unavailable)"""
+        text = TextFeatures.of(query).text
+        if not text:
+            return []
+        try:
+            index = await self._load_once(vector_indexes, conversation_id, self._hydrate_index)
+            if index is None or index.size == 0:
+                return []
+            with tracer.span("memory.vector_search", indexed=index.size):
+                query_vector = await embedding_service.embed_one(text)
+                hits = index.search(query_vector, self.vector_candidates)
+        except Exception as e:
+            logger.warning("Vector retrieval unavailable: %s", e)
+            return []
+        return [memory_id for memory_id, _ in hits]
+    
+    async def _get_memories(self, memory_ids: List[int]) -> List:
+        """Rows for the given ids in the context tiers, in the given order"""
+        if not memory_ids:
+            return []
+        memories = []
+        async for id_session in db_config.get_session():
+            memories = await self.db_manager.get_memories_by_ids(id_session, memory_ids)
+        order = {memory_id: rank for rank, memory_id in enumerate(memory_ids)}
+        memories = [mem for mem in memories if mem.tier in _CONTEXT_TIERS]
+        memories.sort(key=lambda mem: order[mem.id])
+        return memories
+    
+    async def _load_once(self, cache, conversation_id: int, loader):
+        """Cached index, or one loader() call per conversation even when turns overlap"""
+        index = cache.get(conversation_id)
+        if index is not None:
+            return index
+        
+        key = (id(cache), conversation_id)
+        lock = self._index_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            index = cache.get(conversation_id)
+            if index is None:
+                index = await loader(conversation_id)
+                if index is not None:
+                    cache.set(conversation_id, index)
+        self._index_locks.pop(key, None)
+        return index
+    
+    async def _get_keyword_index(self, conversation_id: int) -> Optional[InvertedIndex]:
+        try:
+            return await self._load_once(keyword_indexes, conversation_id, self._hydrate_keyword_index)
+        except Exception as e:
+            logger.warning("Keyword index unavailable: %s", e)
+            return None
+    
+    async def _hydrate_keyword_index(self, conversation_id: int) -> Optional[InvertedIndex]:
+        """Load the persisted index and reconcile it with the conversation's memories"""
+        with tracer.span("memory.hydrate_keyword_index", conversation_id=conversation_id):
+            index = await asyncio.to_thread(load_index, conversation_id) or InvertedIndex()
+            rows = []
+            async for index_session in db_config.get_session():
+                rows = await self.db_manager.get_memory_texts(index_session, conversation_id)
+            
+            live = {memory_id for memory_id, _ in rows}
+            index.remove([memory_id for memory_id in index.doc_terms if memory_id not in live])
+            for memory_id, content in rows:
+                index.add(memory_id, content)  # No-op for ids already indexed
+            return index
+    
+    async def _hydrate_index(self, conversation_id: int) -> Optional[VectorIndex]:
+        """Build the index from stored embeddings, embedding (and saving) any that are missing"""
+        with tracer.span("memory.hydrate_index", conversation_id=conversation_id):
+            rows = []
+            async for index_session in db_config.get_session():
+                rows = await self.db_manager.get_memory_embeddings(index_session, conversation_id)
+            if not rows:
+                return None
+            
+            dim = await embedding_service.dimension()
+            ids, vectors, missing = [], [], []
+            for memory_id, content, embedding in rows:
+                vector = decode_embedding(embedding)
+                if vector is None or len(vector) != dim:  # Never embedded, or by another model
+                    missing.append((memory_id, content))
+                else:
+                    ids.append(memory_id)
+                    vectors.append(vector)
+            
+            for start in range(0, len(missing), self.hydrate_batch):
+                batch = missing[start:start + self.hydrate_batch]
+                encoded = await embedding_service.embed([content for _, content in batch])
+                ids.extend(memory_id for memory_id, _ in batch)
+                vectors.extend(encoded)
+                async for write_session in db_config.get_session():
+                    await self.db_manager.update_memory_embeddings(
+                        write_session,
+                        {memory_id: encode_embedding(vector) for (memory_id, _), vector in zip(batch, encoded)}
+                    )
+            
+            index = VectorIndex(dim, capacity=max(64, len(ids)))
+            index.add(ids, np.stack(vectors))
+            return index
+    
+    async def _get_tier_memories(self, conversation_id: int) -> List:
+        by_tier = {}
+        for tier in _CONTEXT_TIERS:
+            cached = self.db_manager.get_cached_memories_by_tier(conversation_id, tier)
+            if cached is not None:
+                by_tier[tier] = cached
+        missing = [tier for tier in _CONTEXT_TIERS if tier not in by_tier]
+        if missing:
+            with tracer.span("memory.tier_query", tiers=len(missing)):
+                async for tier_session in db_config.get_session():
+                    by_tier.update(await self.db_manager.get_top_memories_by_tiers(tier_session, conversation_id, missing))
+        return [mem for tier in _CONTEXT_TIERS for mem in by_tier.get(tier, [])]
+    
     async def _batch_update_memory_access(self, session: AsyncSession, memory_ids: List[int]):
         """Batch update memory access counts for performance"""
         try:
-            from sqlalchemy import update
-            from database.schema import Memory
-            from datetime import datetime
-            
-            await session.execute(
-                update(Memory)
-                .where(Memory.id.in_(memory_ids))
-                .values(
-                    access_count=Memory.access_count + 1,
-                    last_accessed=datetime.utcnow()
-                )
-            )
-            await session.commit()
+            # Own session: this runs as a background task, after the caller's may be closed
+            async for access_session in db_config.get_session():
+                await self.db_manager.update_memories_access(access_session, memory_ids)
         except Exception:
             pass  # Non-critical, can fail silently
     
-    def _extract_tags(self, content: str, context: Dict) -> List[str]:
+    def _extract_tags(self, content: Union[str, TextFeatures], context: Dict) -> List[str]:
         tags = []
-        words = content.lower().split()
         
         # Simple tag extraction
-        important_words = [w for w in words if len(w) > 5][:5]
+        important_words = [w for w in TextFeatures.of(content).tokens if len(w) > 5][:5]
         tags.extend(important_words)
         
         if context.get('emotion'):
@@ -1,13 +1,29 @@
 import asyncio
-from typing import List, Dict
+import json
+import time
+from typing import Any, List, Dict, Optional, Set
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
 from database import DatabaseManager, Memory
+from utils.logger import Logger
+from .inverted_index import keyword_indexes
+from .minhash import near_duplicate_groups
+from .vector_index import vector_indexes
+
+logger = Logger("MemoryOptimizer")
 
 class MemoryOptimizer:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
         self.optimization_running = False
+        self.tier_priority = {tier: cfg.get('priority', 0) for tier, cfg in settings.memory_config.items()}
+        self.consolidation_enabled = settings.get('memory_consolidation.enabled', True)
+        self.consolidation_interval = settings.get('memory_consolidation.min_interval_seconds', 300)
+        self.max_scan = settings.get('memory_consolidation.max_scan', 2000)
+        self.merge_batch = settings.get('memory_consolidation.batch_size', 100)
+        self._last_consolidated: Dict[int, float] = {}
+        self.merged_total = 0
     
     async def optimize_memories(self, session: AsyncSession, conversation_id: int):
         if self.optimization_running:
@@ -15,18 +31,109 @@ class MemoryOptimizer:
         
         self.optimization_running = True
         try:
-            await self._cleanup_expired(session)
-            await self._consolidate_similar(session, conversation_id)
+            await self.cleanup_expired(session)
+            await self.consolidate_similar(session, conversation_id)
             await self._update_importance_scores(session, conversation_id)
         finally:
             self.optimization_running = False
     
-    async def _cleanup_expired(self, session: AsyncSession):
-        await self.db_manager.cleanup_expired_memories(session)
+    async def cleanup_expired(self, session: AsyncSession, limit: int = None) -> int:
+        """Delete expired memories (at most `limit`); returns how many were removed"""
+        expired = await self.db_manager.cleanup_expired_memories(session, limit)
+        
+        by_conversation: Dict[int, List[int]] = {}
+        for memory_id, conversation_id in expired:
+            by_conversation.setdefault(conversation_id, []).append(memory_id)
+        for conversation_id, memory_ids in by_conversation.items():
+            await self._drop_from_indexes(conversation_id, memory_ids)
+        return len(expired)
+    
+    async def _drop_from_indexes(self, conversation_id: int, memory_ids: List[int]):
+        """Remove deleted memories from loaded indexes (unloaded ones reconcile when hydrated)"""
+        vector_index = vector_indexes.get(conversation_id)
+        if vector_index is not None:
+            vector_index.remove(memory_ids)
+        keyword_index = keyword_indexes.get(conversation_id)
+        if keyword_index is not None:
+            keyword_index.remove(memory_ids)  # Persisted by the maintenance loop
     
-    async def _consolidate_similar(self, session: AsyncSession, conversation_id: int):
-        # Placeholder for future similarity detection and consolidation
-        pass
+    async def consolidate_similar(self, session: AsyncSession, conversation_id: int) -> Optional[int]:
+        """Fold duplicate memories (MinHash/LSH candidates, confirmed by identical normalized text) into one row
+
+        Returns how many memories were folded, or None if the conversation was
+        consolidated too recently to run again yet
+        """
+        if not self.consolidation_enabled:
+            return 0
+        now = time.monotonic()
+        if now - self._last_consolidated.get(conversation_id, float('-inf')) < self.consolidation_interval:
+            return None
+        self._last_consolidated[conversation_id] = now
+        
+        # Bounded scan: the most recent memories are where repeats accumulate
+        memories = await self.db_manager.get_recent_memories(session, conversation_id, self.max_scan)
+        by_id = {mem.id: mem for mem in memories}
+        # Canonical preference: higher tier, then importance, then the newer row
+        order = [mem.id for mem in sorted(memories, key=self._canonical_rank, reverse=True)]
+        groups = await asyncio.to_thread(
+            near_duplicate_groups, {mem.id: mem.content for mem in memories}, None, order
+        )
+        
+        folded = {memory_id for group in groups for memory_id in group[1:]}
+        merged_total = 0
+        for start in range(0, len(groups), self.merge_batch):
+            canonical_rows, merged_ids = [], []
+            for group in groups[start:start + self.merge_batch]:
+                row, merged = self._merge_group([by_id[memory_id] for memory_id in group], folded)
+                canonical_rows.append(row)
+                merged_ids.extend(merged)
+            await self.db_manager.merge_memories(session, conversation_id, canonical_rows, merged_ids)
+            await self._drop_from_indexes(conversation_id, merged_ids)
+            merged_total += len(merged_ids)
+        
+        if merged_total:
+            self.merged_total += merged_total
+            logger.info(f"Consolidated {merged_total} near-duplicate memories in conversation {conversation_id}")
+        return merged_total
+    
+    def _canonical_rank(self, mem: Memory):
+        return (self.tier_priority.get(mem.tier, 0), mem.importance or 0.0, mem.id)
+    
+    def _merge_group(self, group: List[Memory], folded: Set[int] = frozenset()):
+        """Canonical row values for a duplicate group (canonical first), and the ids folded into it
+
+        Members carry the canonical's text up to case and punctuation, so
+        folding them loses no content
+        """
+        canonical, merged = group[0], group[1:]
+        
+        tags: Dict[str, None] = {}
+        related: Dict[int, None] = {}
+        for mem in [canonical] + merged:
+            for tag in (mem.tags or '').split(','):
+                if tag.strip():
+                    tags[tag.strip()] = None
+            try:
+                related.update(dict.fromkeys(json.loads(mem.related_memories or '[]')))
+            except (ValueError, TypeError):
+                pass
+        # Links only to rows that still exist after the fold
+        for memory_id in folded | {mem.id for mem in group}:
+            related.pop(memory_id, None)
+        
+        expiries = [mem.expires_at for mem in group]
+        accessed = [mem.last_accessed for mem in group if mem.last_accessed]
+        row: Dict[str, Any] = {
+            'id': canonical.id,
+            'importance': max(mem.importance or 0.0 for mem in group),
+            'access_count': sum(mem.access_count or 0 for mem in group),
+            'tags': ','.join(tags) or None,
+            'related_memories': json.dumps(list(related)),
+            # The survivor lives as long as the longest-lived duplicate
+            'expires_at': None if any(e is None for e in expiries) else max(expiries),
+            'last_accessed': max(accessed) if accessed else canonical.last_accessed
+        }
+        return row, [mem.id for mem in merged]
     
     async def _update_importance_scores(self, session: AsyncSession, conversation_id: int):
         # Update importance based on access patterns
@@ -0,0 +1,108 @@
+"""
+MinHash signatures and LSH banding for near-duplicate memories
+Texts become sets of word shingles; a signature keeps the minimum of each of
+num_perm universal hashes over the set, so matching signature rows estimate
+Jaccard similarity. Signatures are split into bands and only texts sharing a
+whole band land in the same bucket, which keeps candidate generation close
+to linear instead of comparing every pair. Candidates are then confirmed
+exactly, so a high shingle overlap alone never groups two texts
+"""
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from config import settings
+
+_TOKEN = re.compile(r"\w+")
+_PRIME = np.uint64((1 << 31) - 1)  # a * x stays below 2**62 for x, a < 2**31
+
+
+def shingles(text: str, size: int = 2) -> FrozenSet[str]:
+    """Word n-grams of the lowercased text (single words for very short texts)"""
+    words = _TOKEN.findall((text or '').lower())
+    if len(words) < size:
+        return frozenset(words)
+    return frozenset(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def normalize(text: str) -> str:
+    """Lowercased word tokens joined by single spaces: case, punctuation and spacing ignored"""
+    return ' '.join(_TOKEN.findall((text or '').lower()))
+
+
+class MinHashLSH:
+    def __init__(self, num_perm: int = None, bands: int = None, seed: int = 1):
+        self.num_perm = num_perm or settings.get('memory_consolidation.num_perm', 64)
+        self.bands = bands or settings.get('memory_consolidation.bands', 16)
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm ({self.num_perm}) must be a multiple of bands ({self.bands})")
+        self.rows = self.num_perm // self.bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), self.num_perm, dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = defaultdict(list)
+
+    def signature(self, shingle_set: Iterable[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        hashes %= _PRIME
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def insert(self, key: Hashable, signature: np.ndarray):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            self._buckets[(band, chunk.tobytes())].append(key)
+
+    def candidate_pairs(self) -> Set[Tuple[Hashable, Hashable]]:
+        """Pairs that share at least one band"""
+        pairs = set()
+        for keys in self._buckets.values():
+            if len(keys) < 2:
+                continue
+            for i in range(len(keys)):
+                for j in range(i + 1, len(keys)):
+                    a, b = keys[i], keys[j]
+                    pairs.add((a, b) if a < b else (b, a))
+        return pairs
+
+
+def near_duplicate_groups(texts: Dict[Hashable, str], lsh: MinHashLSH = None,
+                          order: Optional[Iterable[Hashable]] = None) -> List[List[Hashable]]:
+    """Groups of texts that normalize to the same text, canonical first
+
+    LSH proposes candidate pairs; each candidate is confirmed against its
+    group's canonical text only, never transitively through another member.
+    Only identical normalized text confirms: sentences that differ in one
+    entity ("... live in Berlin" / "... live in Paris") share most shingles
+    but state different facts, so they are never grouped.
+    `order` ranks canonical candidates, best first (default: ascending keys)
+    """
+    lsh = lsh or MinHashLSH()
+    normalized = {key: normalize(text) for key, text in texts.items()}
+    for key, text in normalized.items():
+        shingle_set = shingles(text)
+        if shingle_set:
+            lsh.insert(key, lsh.signature(shingle_set))
+
+    neighbours: Dict[Hashable, Set[Hashable]] = defaultdict(set)
+    for a, b in lsh.candidate_pairs():
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+
+    grouped: Set[Hashable] = set()
+    groups = []
+    for canonical in (order if order is not None else sorted(texts)):
+        if canonical in grouped or canonical not in neighbours:
+            continue
+        duplicates = sorted(
+            key for key in neighbours[canonical]
+            if key not in grouped and normalized[key] == normalized[canonical]
+        )
+        if duplicates:
+            grouped.add(canonical)
+            grouped.update(duplicates)
+            groups.append([canonical] + duplicates)
+    return groups
@@ -73,21 +73,39 @@
 
 """
 Advanced semantic memory with embeddings and vector search
+One process-wide engine backed by a persistent Chroma store under the data
+directory, so memories (and their indexes) survive restarts instead of being
+re-embedded. Embeddings come from services.embedding_service. Per-user
+collection handles are kept in a bounded LRU and the store is warm-loaded in
+the background at startup.
 """
 
+import asyncio
+import time
 import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
+from config import settings
 from utils.logger import Logger
+from utils.lru_cache import LRUCache
+from services.embedding_service import embedding_service
 
 
 class SemanticMemoryEngine:
-    def __init__(self):
+    def __init__(self, path: Optional[str] = None):
         self.logger = Logger("SemanticMemory")
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
-        self.chroma_client = chromadb.Client()
-        self.collections: Dict[str, Any] = {}
+        self.path = path or settings.base_dir / settings.get('memory_index.semantic_path', 'data/semantic_memory')
+        self.collections = LRUCache(settings.get('memory_index.max_collections', 128))
+        self._client = None
+        self._warm_task: Optional[asyncio.Task] = None
+        self.warm_stats: Dict[str, Any] = {"state": "cold"}
+
+    @property
+    def chroma_client(self):
+        """Persistent client, opened on first use"""
+        if self._client is None:
+            self._client = chromadb.PersistentClient(path=str(self.path))
+        return self._client
 
     def _normalize_user_id(self, user_id) -> str:
         if isinstance(user_id, dict):
@@ -97,18 +115,44 @@ class SemanticMemoryEngine:
     def get_collection(self, user_id):
         user_id = self._normalize_user_id(user_id)
 
-        if user_id not in self.collections:
-            collection_name = f"memories_{user_id}"
-            self.collections[user_id] = self.chroma_client.create_collection(
-                name=collection_name,
-                get_or_create=True
-            )
-        return self.collections[user_id]
-
-    async def save_memory(self, user_id: str, content: str, metadata: Dict[str, Any]):
+        collection = self.collections.get(user_id)
+        if collection is None:
+            collection = self.chroma_client.get_or_create_collection(name=f"memories_{user_id}")
+            self.collections.set(user_id, collection)
+        return collection
+
+    def start_warm_load(self):
+        """Open the store, load the model and touch existing collections off the event loop"""
+        if self._warm_task is None or self._warm_task.done():
+            self._warm_task = asyncio.create_task(asyncio.to_thread(self._warm_load))
+
+    def _warm_load(self):
+        start = time.perf_counter()
+        self.warm_stats = {"state": "loading"}
+        try:
+            embedding_service.model
+            names = [getattr(c, "name", c) for c in self.chroma_client.list_collections()]
+            names = [name for name in names if name.startswith("memories_")]
+            loaded = memories = 0
+            for name in names[:self.collections.maxsize]:
+                collection = self.chroma_client.get_or_create_collection(name=name)
+                memories += collection.count()  # Forces the segment to load
+                self.collections.set(name[len("memories_"):], collection)
+                loaded += 1
+            self.warm_stats = {
+                "state": "ready",
+                "collections": loaded,
+                "memories": memories,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+            self.logger.info("Semantic memory warm-loaded: %d collections, %d memories", loaded, memories)
+        except Exception as e:
+            self.warm_stats = {"state": "failed", "error": str(e)}
+            self.logger.warning(f"Semantic memory warm-load failed: {e}")
+
+    def _add_sync(self, user_id, content: str, embedding: List[float], metadata: Dict[str, Any]) -> str:
         collection = self.get_collection(user_id)
 
-        embedding = self.model.encode(content).tolist()
         memory_id = str(uuid.uuid4())
 
         collection.add(
@@ -120,10 +164,9 @@ class SemanticMemoryEngine:
 
         return memory_id
 
-    async def search_memories(self, user_id: str, query: str, n_results: int = 5):
+    def _query_sync(self, user_id, query_embedding: List[float], n_results: int) -> List[Dict]:
         collection = self.get_collection(user_id)
 
-        query_embedding = self.model.encode(query).tolist()
         results = collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results
@@ -140,6 +183,26 @@ class SemanticMemoryEngine:
 
         return memories
 
+    # Embeddings come from the shared micro-batching service; Chroma I/O runs in a worker thread
+    async def save_memory(self, user_id: str, content: str, metadata: Dict[str, Any]):
+        embedding = (await embedding_service.embed_one(content)).tolist()
+        return await asyncio.to_thread(self._add_sync, user_id, content, embedding, metadata)
+
+    async def search_memories(self, user_id: str, query: str, n_results: int = 5):
+        query_embedding = (await embedding_service.embed_one(query)).tolist()
+        return await asyncio.to_thread(self._query_sync, user_id, query_embedding, n_results)
+
     async def delete_memory(self, user_id: str, memory_id: str):
         collection = self.get_collection(user_id)
-        collection.delete(ids=[memory_id])
+        await asyncio.to_thread(collection.delete, ids=[memory_id])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "warm_load": self.warm_stats,
+            "collections": self.collections.get_stats()
+        }
+
+
+# Shared engine (chat and memory routes use the same store)
+semantic_memory = SemanticMemoryEngine()
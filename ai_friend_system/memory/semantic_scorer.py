@@ -1,36 +1,84 @@
 """
 Advanced semantic relevance scoring for memory retrieval
 Uses keyword matching, context similarity, and temporal relevance
+
+score_memory() scores one memory; rank_memories() scores the whole candidate
+set column-wise with NumPy (same weights and thresholds, same results) and
+selects the top k without sorting everything
 """
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
+import numpy as np
 from utils.logger import Logger
+from utils.text_features import TextFeatures
 
 logger = Logger("SemanticScorer")
 
+TIER_SCORES = {
+    'permanent': 1.0,
+    'personal': 0.9,
+    'temporary': 0.6,
+    'sub_temporary': 0.4,
+    'session': 0.2
+}
+
+# Age thresholds (days) and their temporal scores; older than the last is 0.2
+_AGE_DAYS = np.array([1, 7, 30, 90])
+_AGE_SCORES = np.array([1.0, 0.8, 0.6, 0.4, 0.2])
+
+
+@lru_cache(maxsize=4096)
+def _parse_tags(tags: str) -> Tuple[str, ...]:
+    return tuple(tag.strip().lower() for tag in tags.split(','))
+
+
+@lru_cache(maxsize=8192)
+def _token_set(content: str) -> frozenset:
+    """Lowercase token set of a memory's content (memories recur across turns)"""
+    return frozenset(content.lower().split())
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    """datetime or ISO string -> naive local datetime (None if missing/unparsable)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if type(value) is datetime and value.tzinfo is None:
+        return value
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
 class SemanticScorer:
     """Calculate semantic relevance scores for memory retrieval"""
     
     def __init__(self):
         self.logger = logger
     
-    def score_memory(self, memory: Dict[str, Any], query: str, 
+    def score_memory(self, memory: Dict[str, Any], query: Union[str, TextFeatures], 
                     conversation_context: Dict[str, Any] = None) -> float:
         """
         Calculate relevance score for a memory
         
         Args:
             memory: Memory dict with content, tags, tier, etc.
-            query: Current query/message
+            query: Current query/message (raw or as TextFeatures)
             conversation_context: Current conversation context
         
         Returns:
             Relevance score (0.0 to 1.0)
         """
         scores = []
+        query = TextFeatures.of(query)
+        content = TextFeatures(memory.get('content') or '')
         
         # 1. Keyword overlap score (0.0 - 0.4)
-        keyword_score = self._keyword_overlap_score(memory.get('content', ''), query)
+        keyword_score = self._keyword_overlap_score(content, query)
         scores.append(('keyword', keyword_score * 0.4))
         
         # 2. Tag relevance score (0.0 - 0.2)
@@ -47,7 +95,7 @@ class SemanticScorer:
         
         # 5. Context similarity score (0.0 - 0.1)
         if conversation_context:
-            context_score = self._context_similarity_score(memory, conversation_context)
+            context_score = self._context_similarity_score(memory, conversation_context, content)
             scores.append(('context', context_score * 0.1))
         
         # Total score
@@ -57,20 +105,17 @@ class SemanticScorer:
         
         return min(1.0, total)
     
-    def _keyword_overlap_score(self, memory_content: str, query: str) -> float:
+    def _keyword_overlap_score(self, memory_content: Union[str, TextFeatures],
+                               query: Union[str, TextFeatures]) -> float:
         """Calculate keyword overlap between memory and query"""
-        if not memory_content or not query:
+        memory_content = TextFeatures.of(memory_content)
+        query = TextFeatures.of(query)
+        if not memory_content.text or not query.text:
             return 0.0
         
-        # Simple word-based overlap
-        memory_words = set(memory_content.lower().split())
-        query_words = set(query.lower().split())
-        
-        # Remove common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'}
-        
-        memory_words = memory_words - stop_words
-        query_words = query_words - stop_words
+        # Simple word-based overlap, common stop words removed
+        memory_words = memory_content.content_set
+        query_words = query.content_set
         
         if not query_words:
             return 0.0
@@ -81,13 +126,13 @@ class SemanticScorer:
         
         return min(1.0, overlap_ratio * 2.0)  # Boost for better matching
     
-    def _tag_relevance_score(self, tags: str, query: str) -> float:
+    def _tag_relevance_score(self, tags: str, query: Union[str, TextFeatures]) -> float:
         """Calculate relevance based on tags"""
         if not tags:
             return 0.0
         
         tag_list = [tag.strip().lower() for tag in tags.split(',')]
-        query_words = set(query.lower().split())
+        query_words = TextFeatures.of(query).token_set
         
         # Check if any tag matches query words
         matches = sum(1 for tag in tag_list if tag in query_words or any(tag in word for word in query_words))
@@ -99,14 +144,7 @@ class SemanticScorer:
     
     def _tier_importance_score(self, tier: str) -> float:
         """Calculate score based on memory tier"""
-        tier_scores = {
-            'permanent': 1.0,
-            'personal': 0.9,
-            'temporary': 0.6,
-            'sub_temporary': 0.4,
-            'session': 0.2
-        }
-        return tier_scores.get(tier.lower(), 0.5)
+        return TIER_SCORES.get(tier.lower(), 0.5)
     
     def _temporal_relevance_score(self, created_at: datetime = None, 
                                   last_accessed: datetime = None) -> float:
@@ -138,7 +176,8 @@ class SemanticScorer:
             return 0.2
     
     def _context_similarity_score(self, memory: Dict[str, Any], 
-                                 conversation_context: Dict[str, Any]) -> float:
+                                 conversation_context: Dict[str, Any],
+                                 content: TextFeatures = None) -> float:
         """Calculate similarity based on conversation context"""
         # Check emotion match
         memory_emotion = memory.get('emotion_at_creation')
@@ -151,9 +190,8 @@ class SemanticScorer:
         # Check topic continuity
         current_topic = conversation_context.get('current_topic')
         if current_topic:
-            memory_content = memory.get('content', '').lower()
             topic_words = set(current_topic.lower().split())
-            content_words = set(memory_content.split())
+            content_words = (content or TextFeatures(memory.get('content') or '')).token_set
             
             overlap = len(topic_words & content_words)
             if overlap > 0:
@@ -161,19 +199,119 @@ class SemanticScorer:
         
         return 0.0
     
-    def rank_memories(self, memories: List[Dict[str, Any]], query: str,
-                     conversation_context: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Rank memories by relevance score"""
-        scored_memories = []
+    def rank_memories(self, memories: List[Dict[str, Any]], query: Union[str, TextFeatures],
+                     conversation_context: Dict[str, Any] = None,
+                     top_k: Optional[int] = None,
+                     keyword_scores: Optional[Dict[int, float]] = None) -> List[Dict[str, Any]]:
+        """Rank memories by relevance score (only the best top_k when given)"""
+        if not memories:
+            return []
+        query = TextFeatures.of(query)  # Tokenized once for every candidate
+        scores = self.score_memories(memories, query, conversation_context, keyword_scores)
+        
+        # Descending by score, ties in input order (as a stable sort would)
+        n = len(scores)
+        if top_k is not None and top_k < n:
+            if top_k <= 0:
+                return []
+            kth = np.partition(scores, n - top_k)[n - top_k]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:top_k - len(above)]
+            selected = np.concatenate([above, ties])
+        else:
+            selected = np.arange(n)
+        order = selected[np.lexsort((selected, -scores[selected]))]
+        
+        return [{**memories[i], 'relevance_score': score}
+                for i, score in zip(order.tolist(), scores[order].tolist())]
+    
+    def score_memories(self, memories: List[Dict[str, Any]], query: Union[str, TextFeatures],
+                       conversation_context: Dict[str, Any] = None,
+                       keyword_scores: Optional[Dict[int, float]] = None) -> np.ndarray:
+        """score_memory() for every memory at once, as a float64 array
+
+        keyword_scores (memory id -> 0..1, e.g. BM25 from the keyword index)
+        replaces the set-overlap keyword component when given
+        """
+        query = TextFeatures.of(query)
+        n = len(memories)
+        contents = [memory.get('content') or '' for memory in memories]
+        token_sets = [_token_set(content) for content in contents]
         
+        # 1. Keyword overlap (stop words are already out of the query side)
+        query_words = query.content_set
+        if keyword_scores is not None:
+            keyword = np.fromiter((keyword_scores.get(memory.get('id'), 0.0) for memory in memories),
+                                  dtype=np.float64, count=n)
+        elif query.text and query_words:
+            overlap = np.fromiter((len(tokens & query_words) for tokens in token_sets), dtype=np.float64, count=n)
+            has_content = np.fromiter((bool(content) for content in contents), dtype=bool, count=n)
+            keyword = np.where(has_content, np.minimum(1.0, overlap / len(query_words) * 2.0), 0.0)
+        else:
+            keyword = np.zeros(n)
+        
+        # 2. Tag relevance (each distinct tags string is scored once)
+        tag_ratios: Dict[str, float] = {}
+        query_blob = '\0'.join(query.token_set)
         for memory in memories:
-            score = self.score_memory(memory, query, conversation_context)
-            scored_memories.append({
-                **memory,
-                'relevance_score': score
-            })
+            tags = memory.get('tags', '')
+            if tags and tags not in tag_ratios:
+                tag_ratios[tags] = self._tag_ratio(tags, query.token_set, query_blob)
+        tag = np.fromiter(
+            (tag_ratios[tags] if tags else 0.0 for tags in (memory.get('tags', '') for memory in memories)),
+            dtype=np.float64, count=n
+        )
+        
+        # 3. Tier importance
+        tier = np.fromiter(
+            (TIER_SCORES.get(memory.get('tier', 'temporary').lower(), 0.5) for memory in memories),
+            dtype=np.float64, count=n
+        )
+        
+        # 4. Temporal relevance from whole days of age
+        now = datetime.now()
+        created = [_as_datetime(memory.get('created_at')) for memory in memories]
+        known = np.fromiter((c is not None for c in created), dtype=bool, count=n)
+        temporal = np.full(n, 0.5)
+        if known.any():
+            age_days = np.fromiter(((now - c).days for c in created if c is not None), dtype=np.int64)
+            temporal[known] = _AGE_SCORES[np.searchsorted(_AGE_DAYS, age_days, side='right')]
         
-        # Sort by relevance score (descending)
-        scored_memories.sort(key=lambda x: x['relevance_score'], reverse=True)
+        total = keyword * 0.4 + tag * 0.2 + tier * 0.2 + temporal * 0.1
+        
+        # 5. Context similarity
+        if conversation_context:
+            total = total + self._context_scores(memories, token_sets, conversation_context) * 0.1
+        
+        return np.minimum(1.0, total)
+    
+    @staticmethod
+    def _tag_ratio(tags: str, query_words: frozenset, query_blob: str) -> float:
+        """_tag_relevance_score with the substring test run once over the joined query words"""
+        if not query_words:
+            return 0.0
+        tag_list = _parse_tags(tags)
+        matches = sum(1 for tag in tag_list if tag in query_blob and '\0' not in tag)
+        return min(1.0, matches / len(tag_list))
+    
+    @staticmethod
+    def _context_scores(memories: List[Dict[str, Any]], token_sets: List[frozenset],
+                        conversation_context: Dict[str, Any]) -> np.ndarray:
+        n = len(memories)
+        emotion = conversation_context.get('emotion')
+        current_emotion = emotion.get('emotion') if isinstance(emotion, dict) else emotion
+        
+        scores = np.zeros(n)
+        current_topic = conversation_context.get('current_topic')
+        if current_topic:
+            topic_words = set(current_topic.lower().split())
+            overlap = np.fromiter((len(tokens & topic_words) for tokens in token_sets), dtype=np.float64, count=n)
+            scores = np.where(overlap > 0, np.minimum(0.5, overlap / max(len(topic_words), 1)), 0.0)
         
-        return scored_memories
+        if current_emotion:
+            emotion_match = np.fromiter(
+                (memory.get('emotion_at_creation') == current_emotion for memory in memories),
+                dtype=bool, count=n
+            )
+            scores = np.where(emotion_match, 0.5, scores)
+        return scores
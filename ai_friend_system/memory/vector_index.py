@@ -0,0 +1,89 @@
+"""
+In-process dense vector index for memory retrieval
+One contiguous float32 matrix (plus a parallel id array) per conversation,
+hydrated from Memory.embedding on first use and appended to as memories are
+stored. Embeddings come from services.embedding_service and are
+L2-normalized, so the dot product is the cosine.
+"""
+import base64
+import json
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from config import settings
+from utils.lru_cache import LRUCache
+
+
+def encode_embedding(vector: np.ndarray) -> str:
+    """Compact Memory.embedding value: base64 of the float32 bytes"""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def decode_embedding(value: Optional[str]) -> Optional[np.ndarray]:
+    """Memory.embedding -> float32 vector (base64, or a legacy JSON list)"""
+    if not value:
+        return None
+    try:
+        if value.lstrip().startswith('['):
+            return np.asarray(json.loads(value), dtype=np.float32)
+        return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+    except (ValueError, TypeError):
+        return None
+
+
+class VectorIndex:
+    """Append-friendly matrix of memory embeddings for one conversation"""
+
+    __slots__ = ('dim', '_matrix', '_ids', 'size')
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:self.size] = self._matrix[:self.size]
+        ids[:self.size] = self._ids[:self.size]
+        self._matrix, self._ids = matrix, ids
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} != index dim {self.dim}")
+        self._reserve(len(ids))
+        self._matrix[self.size:self.size + len(ids)] = vectors
+        self._ids[self.size:self.size + len(ids)] = ids
+        self.size += len(ids)
+
+    def remove(self, ids: Sequence[int]):
+        """Drop ids, compacting the rows that remain"""
+        keep = ~np.isin(self._ids[:self.size], np.asarray(ids, dtype=np.int64))
+        kept = int(keep.sum())
+        self._matrix[:kept] = self._matrix[:self.size][keep]
+        self._ids[:kept] = self._ids[:self.size][keep]
+        self.size = kept
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-k (id, cosine) by dot product"""
+        if self.size == 0 or k <= 0:
+            return []
+        scores = self._matrix[:self.size] @ np.asarray(query, dtype=np.float32)
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return list(zip(self._ids[top].tolist(), scores[top].tolist()))
+
+    def __contains__(self, memory_id: int) -> bool:
+        return bool((self._ids[:self.size] == memory_id).any())
+
+
+# Hydrated indexes by conversation id (least recently used ones are rebuilt on demand)
+vector_indexes = LRUCache(settings.get('memory_index.max_conversations', 256))
@@ -12,8 +12,12 @@ from .redis_client import (
     close_redis,
 )
 
+# ---- Embedding Service ----
+from .embedding_service import embedding_service
+
 __all__ = [
     "redis_client",
     "connect_redis",
     "close_redis",
+    "embedding_service",
 ]
@@ -0,0 +1,239 @@
+"""
+Content-addressed embedding cache
+Vectors are keyed by a hash of (model name, normalized text) and kept in two
+tiers: an in-process LRU, and an append-only file of fixed-width float32
+records that is memory-mapped so disk hits are read without copying. The
+on-disk store records the model it was built with and is wiped when the
+configured model (or its dimension) changes; past max_records it is
+compacted down to its newest half
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+from config import settings
+from utils.logger import Logger
+from utils.lru_cache import LRUCache
+
+logger = Logger("EmbeddingCache")
+
+_KEY_BYTES = 16
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC with whitespace collapsed (case is kept: not every model is uncased)"""
+    return unicodedata.normalize('NFC', ' '.join((text or '').split()))
+
+
+class _DiskStore:
+    """keys.bin (16-byte digests) + vectors.f32 (dim float32 per row), row i <-> key i"""
+
+    def __init__(self, path: Path, model_name: str, max_records: int = 200000):
+        self.path = path
+        self.model_name = model_name
+        self.max_records = max(2, int(max_records))
+        self.compactions = 0
+        self.dim: Optional[int] = None
+        self.rows: Dict[bytes, int] = {}
+        self._map: Optional[np.memmap] = None
+        self._keys_file = None
+        self._vectors_file = None
+        self._open()
+
+    def _open(self):
+        meta_path = self.path / 'meta.json'
+        meta = {}
+        if meta_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+            except ValueError:
+                meta = {}
+        if meta.get('model') != self.model_name:
+            if meta:
+                logger.info("Embedding model changed (%s -> %s), clearing disk cache", meta.get('model'), self.model_name)
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+        self.dim = meta.get('dim')
+        if not self.dim:
+            return
+
+        keys = (self.path / 'keys.bin').read_bytes() if (self.path / 'keys.bin').exists() else b''
+        vector_bytes = (self.path / 'vectors.f32').stat().st_size if (self.path / 'vectors.f32').exists() else 0
+        # A torn append leaves at most one partial record; only count complete pairs
+        count = min(len(keys) // _KEY_BYTES, vector_bytes // (self.dim * 4))
+        for row in range(count):
+            self.rows[keys[row * _KEY_BYTES:(row + 1) * _KEY_BYTES]] = row
+        self._truncate(count)
+
+    def _truncate(self, count: int):
+        for name, width in (('keys.bin', _KEY_BYTES), ('vectors.f32', self.dim * 4)):
+            file_path = self.path / name
+            if file_path.exists() and file_path.stat().st_size != count * width:
+                with open(file_path, 'r+b') as f:
+                    f.truncate(count * width)
+
+    def _init_files(self, dim: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        (self.path / 'meta.json').write_text(json.dumps({'model': self.model_name, 'dim': dim}))
+
+    def _mapped(self, row: int) -> np.memmap:
+        if self._map is None or row >= len(self._map):
+            if self._vectors_file:
+                self._vectors_file.flush()
+            rows = (self.path / 'vectors.f32').stat().st_size // (self.dim * 4)
+            self._map = np.memmap(self.path / 'vectors.f32', dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self._map
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return self._mapped(row)[row]
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            logger.info("Embedding dim changed (%d -> %d), clearing disk cache", self.dim, vectors.shape[1])
+            self.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.dim = None
+            self.rows.clear()
+        if self.dim is None:
+            self._init_files(vectors.shape[1])
+
+        new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self.rows]
+        if not new:
+            return
+        new = new[-self.max_records:]
+        if len(self.rows) + len(new) > self.max_records:
+            self._compact(max(0, self.max_records // 2 - len(new)))
+        if self._vectors_file is None:
+            self._vectors_file = open(self.path / 'vectors.f32', 'ab')
+            self._keys_file = open(self.path / 'keys.bin', 'ab')
+        # Vectors first: a key is only trusted once its record is complete
+        self._vectors_file.write(np.stack([vector for _, vector in new]).tobytes())
+        self._vectors_file.flush()
+        self._keys_file.write(b''.join(key for key, _ in new))
+        self._keys_file.flush()
+        start = len(self.rows)
+        for offset, (key, _) in enumerate(new):
+            self.rows[key] = start + offset
+
+    def _compact(self, keep: int):
+        """Rewrite the files with only the newest `keep` records (appended last = newest)"""
+        self.close()
+        count = len(self.rows)
+        start = count - keep
+        with open(self.path / 'keys.bin', 'rb') as f:
+            f.seek(start * _KEY_BYTES)
+            kept_keys = f.read(keep * _KEY_BYTES)
+        with open(self.path / 'vectors.f32', 'rb') as f:
+            f.seek(start * self.dim * 4)
+            kept_vectors = f.read(keep * self.dim * 4)
+
+        # Without meta.json the store is discarded on open, so a crash between
+        # the two renames can never pair keys with the wrong vectors
+        (self.path / 'meta.json').unlink()
+        for name, data in (('keys.bin', kept_keys), ('vectors.f32', kept_vectors)):
+            tmp_path = self.path / f'{name}.tmp'
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self.path / name)
+        self._init_files(self.dim)
+
+        self.rows = {kept_keys[row * _KEY_BYTES:(row + 1) * _KEY_BYTES]: row for row in range(keep)}
+        self.compactions += 1
+        logger.info("Compacted disk embedding cache: kept %d of %d records", keep, count)
+
+    def close(self):
+        for f in (self._vectors_file, self._keys_file):
+            if f:
+                f.close()
+        self._vectors_file = self._keys_file = None
+        self._map = None
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.rows) * ((self.dim or 0) * 4 + _KEY_BYTES)
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, memory_size: Optional[int] = None, disk_path: Optional[str] = None,
+                 disk_max_records: Optional[int] = None):
+        self.model_name = model_name
+        self.memory = LRUCache(memory_size or settings.get('embeddings.cache.memory_size', 10000))
+        self._lock = threading.Lock()
+
+        self.disk: Optional[_DiskStore] = None
+        if settings.get('embeddings.cache.disk_enabled', True):
+            path = Path(disk_path or settings.base_dir / settings.get('embeddings.cache.disk_path', 'data/embedding_cache'))
+            try:
+                self.disk = _DiskStore(
+                    path, model_name,
+                    max_records=disk_max_records or settings.get('embeddings.cache.disk_max_records', 200000)
+                )
+            except OSError as e:
+                logger.warning(f"Disk embedding cache disabled: {e}")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=_KEY_BYTES)
+        digest.update(self.model_name.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_text(text).encode('utf-8'))
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory_hits += 1
+            return vector
+        if self.disk is not None:
+            with self._lock:
+                vector = self.disk.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self.memory.set(key, vector)
+                return vector
+        self.misses += 1
+        return None
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors):
+            self.memory.set(key, vector)
+        if self.disk is not None:
+            with self._lock:
+                try:
+                    self.disk.put_many(keys, vectors)
+                except OSError as e:
+                    logger.warning(f"Disk embedding cache write failed, disabling: {e}")
+                    self.disk.close()
+                    self.disk = None
+
+    def close(self):
+        if self.disk is not None:
+            with self._lock:
+                self.disk.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory": self.memory.get_stats(),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "disk_records": len(self.disk.rows) if self.disk else 0,
+            "disk_max_records": self.disk.max_records if self.disk else 0,
+            "disk_compactions": self.disk.compactions if self.disk else 0,
+            "disk_bytes": self.disk.size_bytes if self.disk else 0
+        }
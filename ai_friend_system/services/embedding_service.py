@@ -0,0 +1,226 @@
+"""
+Micro-batched embedding service
+Callers await embed(); texts from concurrent callers are queued and encoded
+together on one dedicated worker thread (up to max_batch texts, waiting at
+most max_wait for a batch to fill), so the event loop never runs a forward
+pass and concurrent users share batches instead of each encoding alone.
+Texts already in the embedding cache never reach the queue
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from config import settings
+from utils.logger import Logger
+from .embedding_cache import EmbeddingCache
+
+logger = Logger("EmbeddingService")
+
+
+class _Request:
+    __slots__ = ('texts', 'keys', 'future', 'loop', 'enqueued')
+
+    def __init__(self, texts: List[str], keys: List[bytes], future: asyncio.Future,
+                 loop: asyncio.AbstractEventLoop):
+        self.texts = texts
+        self.keys = keys
+        self.future = future
+        self.loop = loop
+        self.enqueued = time.perf_counter()
+
+
+class EmbeddingService:
+    def __init__(self, model_name: Optional[str] = None, max_batch: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None):
+        self.model_name = model_name or settings.get('embeddings.model', 'all-MiniLM-L6-v2')
+        self.max_batch = max_batch or settings.get('embeddings.max_batch', 64)
+        self.max_wait = (max_wait_ms or settings.get('embeddings.max_wait_ms', 5)) / 1000
+        self.cache: Optional[EmbeddingCache] = None
+        if settings.get('embeddings.cache.enabled', True):
+            self.cache = EmbeddingCache(self.model_name)
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.texts = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self.batch_sizes = deque(maxlen=1000)
+        self.encode_times = deque(maxlen=1000)
+        self.queue_waits = deque(maxlen=1000)
+
+    @property
+    def model(self):
+        """SentenceTransformer, loaded once (on the worker, or by warm-up)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._start_lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+        self._thread = None
+        if self.cache is not None:
+            self.cache.close()
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(n, dim) float32, L2-normalized"""
+        texts = [text or '' for text in texts]
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return await self._submit(texts, [])
+
+        keys = [self.cache.key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        # Encode each missing text once, even if it repeats within the call
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = await self._submit(list(missing.values()), list(missing))
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return np.stack(vectors)
+
+    async def _submit(self, texts: List[str], keys: List[bytes]) -> np.ndarray:
+        if not self.running:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Request(texts, keys, future, loop))
+        return await future
+
+    async def embed_one(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+    async def dimension(self) -> int:
+        """Width of the configured model's vectors (probed once)"""
+        if self._dim is None:
+            self._dim = int((await self.embed_one('')).shape[0])
+        return self._dim
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Blocking encode for code already off the event loop (scripts, warm-up)"""
+        vectors = np.asarray(self.model.encode(list(texts)), dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            size = len(request.texts)
+            deadline = time.perf_counter() + self.max_wait
+            stopping = False
+
+            # Fill the batch until it is full or the wait runs out
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            self._encode_batch(batch)
+            if stopping:
+                return
+
+    def _encode_batch(self, batch: List[_Request]):
+        started = time.perf_counter()
+        texts = [text for request in batch for text in request.texts]
+        try:
+            vectors = self.encode(texts)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Embedding batch of %d failed: %s", len(texts), e)
+            for request in batch:
+                self._deliver(request, None, e)
+            return
+
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.texts += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        self.batch_sizes.append(len(texts))
+        self.encode_times.append(elapsed)
+
+        offset = 0
+        for request in batch:
+            n = len(request.texts)
+            self.queue_waits.append(started - request.enqueued)
+            if request.keys:
+                self.cache.put_many(request.keys, vectors[offset:offset + n])
+            self._deliver(request, vectors[offset:offset + n], None)
+            offset += n
+
+    def _deliver(self, request: _Request, result: Optional[np.ndarray], error: Optional[Exception]):
+        try:
+            request.loop.call_soon_threadsafe(self._resolve, request.future, result, error)
+        except RuntimeError:  # Caller's loop already closed
+            pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Optional[np.ndarray], error: Optional[Exception]):
+        if future.done():  # Caller was cancelled
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def _p95_ms(values) -> float:
+        values = sorted(values)
+        return round(values[min(int(len(values) * 0.95), len(values) - 1)] * 1000, 2) if values else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        sizes = list(self.batch_sizes)
+        return {
+            "running": self.running,
+            "model": self.model_name,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "texts": self.texts,
+            "errors": self.errors,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "encode_p95_ms": self._p95_ms(self.encode_times),
+            "queue_wait_p95_ms": self._p95_ms(self.queue_waits),
+            "cache": self.cache.get_stats() if self.cache else None
+        }
+
+
+# Shared service: semantic memory, the memory vector index and consolidation all embed through it
+embedding_service = EmbeddingService()
@@ -0,0 +1,118 @@
+"""
+Shared test setup
+
+Benchmarks are marked @pytest.mark.benchmark and skipped unless run with
+--benchmark (or BENCHMARK=1); their timings go to the JUnit report via
+record_property rather than asserts, so load on the machine can't fail them.
+
+Opt-in event-loop stall checks: run with --loop-watchdog (or LOOP_WATCHDOG=1).
+Every event loop the tests create is watched, and a test that blocks a loop
+longer than --loop-threshold-ms fails with the offending call sites. Mark a
+test with @pytest.mark.allow_loop_block to exempt it.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark", action="store_true", default=os.getenv("BENCHMARK") == "1",
+        help="run tests marked benchmark"
+    )
+    group = parser.getgroup("loop-watchdog")
+    group.addoption(
+        "--loop-watchdog", action="store_true",
+        default=os.getenv("LOOP_WATCHDOG") == "1",
+        help="fail tests that block the event loop"
+    )
+    group.addoption(
+        "--loop-threshold-ms", type=float,
+        default=float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100")),
+        help="stall threshold for --loop-watchdog (default 100ms)"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "allow_loop_block: exempt a test from --loop-watchdog")
+    config.addinivalue_line("markers", "benchmark: timing comparison, only run with --benchmark")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark: run with --benchmark")
+    for item in items:
+        if item.get_closest_marker("benchmark"):
+            item.add_marker(skip)
+
+
+class _WatchedLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """Attaches the watchdog to every new loop (asyncio.run included)"""
+
+    def __init__(self, watchdog):
+        super().__init__()
+        self.watchdog = watchdog
+
+    def new_event_loop(self):
+        loop = super().new_event_loop()
+        loop.call_soon(self.watchdog.attach, loop)
+        return loop
+
+
+@pytest.fixture(scope="session", autouse=True)
+def loop_watchdog(request):
+    if not request.config.getoption("--loop-watchdog"):
+        yield None
+        return
+
+    from utils.loop_watchdog import LoopWatchdog
+
+    watchdog = LoopWatchdog(threshold=request.config.getoption("--loop-threshold-ms") / 1000)
+    previous_policy = asyncio.get_event_loop_policy()
+    asyncio.set_event_loop_policy(_WatchedLoopPolicy(watchdog))
+    watchdog.start()
+    yield watchdog
+    watchdog.stop()
+    asyncio.set_event_loop_policy(previous_policy)
+
+
+@pytest.fixture(autouse=True)
+def _fail_on_loop_stall(request, loop_watchdog):
+    if loop_watchdog is None or request.node.get_closest_marker("allow_loop_block"):
+        yield
+        return
+
+    loop_watchdog.reset()
+    yield
+    if loop_watchdog.incident_count:
+        report = json.dumps(loop_watchdog.report(5), indent=2)
+        pytest.fail(f"Event loop blocked {loop_watchdog.incident_count} time(s):\n{report}", pytrace=False)
+
+
+@pytest.fixture
+def temp_database(tmp_path):
+    """Async context factory: a fresh SQLite file behind the global db_config
+
+    Opened inside the test's own event loop; also empties the process-wide
+    tier cache so conversation ids from other tests don't leak in.
+    """
+    from config import db_config
+    from database.db_manager import tier_cache
+    from database.schema import Base
+
+    @asynccontextmanager
+    async def open_database():
+        tier_cache.clear()
+        db_config.initialize(tmp_path / "test.db")
+        async with db_config.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            yield db_config
+        finally:
+            await db_config.engine.dispose()
+            tier_cache.clear()
+
+    return open_database
@@ -0,0 +1,446 @@
+"""
+Agent tests: sentiment lexicon parity with TextBlob, an opt-in benchmark,
+batch emotion analysis parity, emotion cache keys, the shared phrase
+automaton (multi-word phrases, word boundaries), the agent registry and
+coordinator (dependencies, timeouts, memoization), sampled telemetry
+(sampling, payload cap, batched flushes) and the agent base class
+"""
+import asyncio
+import json
+import time
+import pytest
+
+from agents.sentiment import SentimentLexicon
+
+CORPUS = [
+    "I am so happy today!",
+    "This is the worst day ever.",
+    "I am not happy about this",
+    "I'm not sad, just tired",
+    "That was very very good!",
+    "It is terribly bad :(",
+    "You're so nice, isn't it?",
+    "I don't like it at all",
+    "Never been better",
+    "What a wonderful surprise :)",
+    "I feel awful and miserable",
+    "The movie was okay, nothing special",
+    "Absolutely fantastic work, thank you!!",
+    "I'm really worried about the exam",
+    "She is extremely kind and generous",
+    "That's a terrible idea",
+    "Meh, it was fine I guess",
+    "I love you <3",
+    "This is not bad at all",
+    "Hmm, interesting question",
+    "I hate waiting in long lines",
+    "What a beautiful morning",
+    "I'm so excited I can't wait!",
+    "He seemed quite angry yesterday",
+    "Great, another meeting (!)",
+    "The food was incredibly delicious",
+    "I am feeling a bit down today",
+    "Wow that is amazing XD",
+    "This is pretty boring honestly",
+    "No, that is not right",
+    "Thanks for the help, you are awesome",
+    "My friend is sick and I feel bad",
+    "It was a perfectly normal day",
+    "I'm confused and a little lost :/",
+    "Such a lovely and peaceful evening",
+    "The service was slow and the staff rude",
+    "Not the best, not the worst",
+    "I'm glad you're here",
+    "Everything is going wrong",
+    "Hello there, how are you?",
+]
+
+
+@pytest.fixture(scope="module")
+def lexicon():
+    return SentimentLexicon()
+
+
+def test_parity_with_textblob(lexicon):
+    textblob = pytest.importorskip("textblob")
+
+    mismatches = []
+    for text in CORPUS:
+        expected = textblob.TextBlob(text).sentiment
+        polarity, subjectivity = lexicon.score(text)
+        if abs(polarity - expected.polarity) > 0.01 or abs(subjectivity - expected.subjectivity) > 0.01:
+            mismatches.append((text, (polarity, subjectivity), tuple(expected)))
+
+    assert not mismatches, mismatches
+
+
+def test_negation_and_modifiers(lexicon):
+    happy, _ = lexicon.score("I am happy")
+    not_happy, _ = lexicon.score("I am not happy")
+    very_happy, _ = lexicon.score("I am very happy")
+
+    assert happy > 0
+    assert not_happy < 0
+    assert very_happy > happy
+    assert lexicon.score("") == (0.0, 0.0)
+
+
+@pytest.mark.benchmark
+def test_benchmark_against_textblob(lexicon, record_property):
+    textblob = pytest.importorskip("textblob")
+    rounds = 20
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in CORPUS:
+            textblob.TextBlob(text).sentiment
+    textblob_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in CORPUS:
+            lexicon.score(text)
+    lexicon_time = time.perf_counter() - start
+
+    calls = rounds * len(CORPUS)
+    record_property("textblob_us_per_call", round(textblob_time / calls * 1e6, 1))
+    record_property("lexicon_us_per_call", round(lexicon_time / calls * 1e6, 1))
+
+
+def test_analyze_many_matches_analyze():
+    from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer
+
+    analyzer = AdvancedEmotionAnalyzer()
+    texts = CORPUS + ["SO HAPPY!!!", "sooo tired??", "why? why??", "", "I am so happy today!"]
+
+    assert analyzer.analyze_many(texts) == [analyzer.analyze_sync(text) for text in texts]
+    assert analyzer.analyze_many([]) == []
+
+
+def test_emotion_cache_keys():
+    from agents.advanced_emotion_analyzer import AdvancedEmotionAnalyzer, emotion_result_cache
+    from agents.emotion_agent import EmotionAgent
+
+    agent = EmotionAgent()
+    assert agent.cache_key("Wow") == agent.cache_key("wow")
+    assert agent.cache_key("wow") != agent.cache_key("wow!")
+
+    analyzer = AdvancedEmotionAnalyzer()
+    emotion_result_cache.clear()
+    hits = emotion_result_cache.hits
+    for text in ("I am so happy", "i am so happy ", "I AM SO HAPPY"):
+        assert asyncio.run(analyzer.analyze(text)) == analyzer.analyze_sync(text)
+    assert emotion_result_cache.hits == hits + 1  # Caps changes intensity: separate entry
+
+
+def test_phrase_automaton_matches_multi_word_phrases():
+    from agents.lexicon import Lexicon
+
+    phrases = Lexicon()
+    phrases.register('emotion', 'excited', ['cant wait', 'wait', 'wow'])
+    phrases.register('emotion', 'confused', ["don't understand"])
+
+    matches = phrases.scan("I can't wait, I CANT WAIT! wow")
+    assert matches.text == "i cant wait, i cant wait! wow"  # Positions index the normalized text
+    assert [(hit.phrase, hit.start, hit.end) for hit in matches.get('emotion')] == [
+        ('cant wait', 2, 11), ('wait', 7, 11), ('cant wait', 15, 24), ('wait', 20, 24), ('wow', 26, 29)
+    ]
+    assert matches.label_counts('emotion') == {'excited': 3}  # Repeats count once
+    assert matches.has('emotion', 'confused') is False
+    assert phrases.scan("i dont understand").labels('emotion') == {'confused'}
+    assert phrases.scan("can't  wait").get('emotion', 'excited')[0].phrase == 'wait'  # Spacing is literal
+
+
+def test_phrase_automaton_respects_word_boundaries():
+    from agents.lexicon import Lexicon
+
+    phrases = Lexicon()
+    phrases.register('emotion', 'happy', ['happy'])
+    phrases.register('task', 'reminder', ['remind'], prefix=True)
+
+    for text in ("unhappy", "happyness", "happy_hour", "unreminded"):
+        assert not phrases.scan(text).hits, text
+    for text in ("happy", "so happy!", "(happy)", "happy-go-lucky"):
+        assert phrases.scan(text).labels('emotion') == {'happy'}, text
+    assert phrases.scan("set a reminder").labels('task') == {'reminder'}  # Stem: open on the right
+
+
+def test_phrase_automaton_registration_is_idempotent():
+    from agents.lexicon import Lexicon
+
+    phrases = Lexicon()
+    phrases.register('context', 'question', ['what', 'why'])
+    phrases.scan("why")
+    stats = phrases.get_stats()
+    phrases.register('context', 'question', ['WHAT', 'why', ''])
+    assert phrases.get_stats() == stats
+
+    # Same phrase under another label: one trie entry, two hits; recompiled on the next scan
+    phrases.register('task', 'information', ['what'])
+    assert phrases.get_stats()["registrations"] == stats["registrations"] + 1
+    assert phrases.get_stats()["phrases"] == stats["phrases"]
+    assert {(hit.category, hit.label) for hit in phrases.scan("what?").hits} == {
+        ('context', 'question'), ('task', 'information')
+    }
+
+
+def test_agents_share_the_phrase_automaton():
+    from agents.emotion_agent import EmotionAgent
+    from agents.task_agent import TaskAgent
+
+    emotion, task = EmotionAgent(), TaskAgent()
+    assert emotion.process_sync({'text': "I can't wait"})['emotion'] == 'excited'
+    assert emotion.process_sync({'text': "I'm unhappy"})['emotion'] == 'sad'  # Not "happy"
+    assert task.process_sync({'text': "Set a reminder, it's important"}) == {
+        'has_task': True, 'task_types': ['reminder'], 'priority': 'high'
+    }
+
+
+class RecordingAgent:
+    """Agent factory: async agents that log their inputs and can stall or fail"""
+
+    def __init__(self, name, delay=0.0, error=None):
+        from agents.base_agent import BaseAgent
+
+        self.calls = []
+        recording = self
+
+        class Agent(BaseAgent):
+            async def process(self, input_data):
+                recording.calls.append(input_data)
+                await asyncio.sleep(delay)
+                if error:
+                    raise error
+                return {'seen': input_data.get('agent_results', {}), 'text': input_data['text']}
+
+        self.agent = Agent(name)
+
+    def __call__(self):
+        return self.agent
+
+
+def make_registry(*specs):
+    from agents.registry import AgentRegistry
+
+    registry = AgentRegistry()
+    agents = {}
+    for spec in specs:
+        agents[spec.name] = spec.factory
+        registry.register(spec)
+    return registry, agents
+
+
+def test_registry_resolves_only_what_is_needed_in_dependency_order():
+    from agents.registry import AgentSpec
+
+    registry, _ = make_registry(
+        AgentSpec("reply", RecordingAgent("reply"), depends_on=("mood", "topic")),
+        AgentSpec("mood", RecordingAgent("mood"), outputs=("emotion", "mood")),
+        AgentSpec("topic", RecordingAgent("topic"), depends_on=("mood",)),
+        AgentSpec("extra", RecordingAgent("extra")),
+    )
+    assert [spec.name for spec in registry.resolve(["emotion"])] == ["mood"]
+    assert [spec.name for spec in registry.resolve(["reply"])] == ["mood", "topic", "reply"]
+    assert [spec.name for spec in registry.resolve()] == ["mood", "topic", "reply", "extra"]
+    assert registry.resolve(["nothing"]) == []
+    assert registry.get("mood").describe()["status"] == "registered"  # Built lazily
+
+    registry.register(AgentSpec("loop", RecordingAgent("loop"), depends_on=("loop",)))
+    with pytest.raises(ValueError, match="cycle"):
+        registry.resolve(["loop"])
+    registry.register(AgentSpec("orphan", RecordingAgent("orphan"), depends_on=("missing",)))
+    with pytest.raises(ValueError, match="Unknown"):
+        registry.resolve(["orphan"])
+
+
+def test_coordinator_passes_dependency_results_and_isolates_timeouts():
+    from agents.agent_coordinator import AgentCoordinator
+    from agents.registry import AgentSpec
+
+    registry, agents = make_registry(
+        AgentSpec("fast", RecordingAgent("fast", delay=0.05)),
+        AgentSpec("other", RecordingAgent("other", delay=0.05)),
+        AgentSpec("slow", RecordingAgent("slow", delay=1.0), timeout=0.05),
+        AgentSpec("joined", RecordingAgent("joined"), depends_on=("fast", "slow")),
+        AgentSpec("unused", RecordingAgent("unused")),
+    )
+    coordinator = AgentCoordinator(registry)
+
+    start = time.perf_counter()
+    combined = asyncio.run(coordinator.process_parallel({'text': "hi"}, outputs=["joined", "other"]))
+    assert time.perf_counter() - start < 0.5  # Siblings overlapped; the stall was cut off
+
+    assert combined["success"] is False  # The timeout is reported...
+    assert combined["slow"] == {} and combined["unused"] == {}
+    # ...but the dependent still ran, with an empty result in the timed-out slot
+    assert combined["joined"]["seen"] == {"fast": {'seen': {}, 'text': "hi"}, "slow": {}}
+    assert combined["other"]["text"] == "hi"
+    assert not agents["unused"].calls
+
+
+def test_coordinator_memoizes_text_determined_agents_only():
+    from agents.agent_coordinator import AgentCoordinator, agent_result_cache
+    from agents.registry import AgentSpec
+
+    registry, agents = make_registry(
+        AgentSpec("memo", RecordingAgent("memo"), cacheable=True),
+        AgentSpec("history", RecordingAgent("history"), cacheable=False),
+        AgentSpec("derived", RecordingAgent("derived"), cacheable=True, depends_on=("history",)),
+        AgentSpec("failing", RecordingAgent("failing", error=RuntimeError("boom")), cacheable=True),
+        AgentSpec("long", RecordingAgent("long"), cacheable=True, min_chars=10),
+    )
+    coordinator = AgentCoordinator(registry)
+    agent_result_cache.clear()
+
+    async def scenario():
+        turns = ("Hello there", "hello  THERE ", "short")
+        return [await coordinator.process_parallel({'text': text}, outputs=list(agents)) for text in turns]
+
+    first, again, other = asyncio.run(scenario())
+    assert len(agents["memo"].calls) == 2  # Same normalized text: served from the cache once
+    assert again["memo"] == first["memo"]
+    assert len(agents["history"].calls) == 3
+    assert len(agents["derived"].calls) == 3  # Depends on a non-cacheable agent
+    assert len(agents["failing"].calls) == 3  # Failures are never memoized
+    assert len(agents["long"].calls) == 1 and other["long"] == {}  # Cached, then skipped under min_chars
+    assert ("failing", "hello there") not in agent_result_cache
+    assert ("memo", "hello there") in agent_result_cache
+
+
+def make_telemetry(sample_rate=1.0, batch_size=200, max_payload_chars=2000):
+    from agents.telemetry import AgentTelemetry
+
+    telemetry = AgentTelemetry()
+    telemetry.enabled = True
+    telemetry.sample_rate = sample_rate
+    telemetry.batch_size = batch_size
+    telemetry.flush_interval = 60.0  # Only size-triggered flushes and stop() in tests
+    telemetry.max_payload_chars = max_payload_chars
+    return telemetry
+
+
+def outcome(success=True, **result):
+    if success:
+        return {'success': True, 'result': result, 'mode': 'inline', 'execution_time': 0.001}
+    return {'success': False, 'error': 'boom', 'mode': 'thread', 'execution_time': 0.002}
+
+
+def test_telemetry_samples_only_while_running(monkeypatch):
+    from agents import telemetry as telemetry_module
+
+    telemetry = make_telemetry(sample_rate=0.5)
+    telemetry.record("emotion", {'text': "hi"}, outcome())  # Not started: never buffered
+    assert telemetry.recorded == 0
+
+    draws = iter([0.1, 0.9, 0.4, 0.5])
+    monkeypatch.setattr(telemetry_module.random, "random", lambda: next(draws))
+
+    async def scenario():
+        telemetry.start()
+        for _ in range(4):
+            telemetry.record("emotion", {'text': "hi"}, outcome())
+        await telemetry.stop()
+
+    asyncio.run(scenario())
+    assert telemetry.recorded == 2  # Draws below the rate are kept
+    assert telemetry.get_stats()["buffered"] == 2  # No database: left buffered
+    assert not telemetry.running
+
+
+def test_telemetry_payload_cap_stays_valid_json():
+    telemetry = make_telemetry(max_payload_chars=120)
+    assert telemetry._serialize({'text': "short"}) == '{"text":"short"}'
+
+    for payload in ({'text': "x" * 500}, {'text': '"quoted" \\ ' * 50}, {'text': "ü\n" * 200}):
+        capped = telemetry._serialize(payload)
+        assert len(capped) <= 120
+        loaded = json.loads(capped)
+        assert loaded["truncated"] is True
+        assert loaded["chars"] == len(json.dumps(payload, ensure_ascii=False, separators=(',', ':')))
+        assert len(loaded["preview"]) > 40  # The escape-aware search keeps most of the budget
+
+
+def test_telemetry_flushes_batches_to_agent_logs(temp_database):
+    from sqlalchemy import select
+    from database.schema import AgentLog
+    from utils.logger import request_context
+
+    async def scenario():
+        async with temp_database() as db_config:
+            telemetry = make_telemetry(batch_size=2)
+            telemetry.start()
+            with request_context("req-7"):
+                telemetry.record("emotion", {'text': "hi", 'lexicon': object(), 'features': object()},
+                                 outcome(emotion="happy", confidence=0.8))
+                telemetry.record("task", {'text': "hi"}, outcome(success=False))
+            for _ in range(10):  # A full batch wakes the writer early
+                await asyncio.sleep(0.01)
+                if telemetry.written:
+                    break
+            assert telemetry.written == 2
+
+            telemetry.record("context", {'text': "later"}, outcome())
+            await telemetry.stop()  # Drains the rest
+            assert telemetry.get_stats()["buffered"] == 0
+
+            async for session in db_config.get_session():
+                rows = (await session.execute(select(AgentLog).order_by(AgentLog.id))).scalars().all()
+
+            assert [row.agent_type for row in rows] == ["emotion", "task", "context"]
+            emotion, task, _ = rows
+            assert json.loads(emotion.input_data) == {'text': "hi", 'request_id': "req-7"}
+            assert json.loads(emotion.output_data) == {'emotion': "happy", 'confidence': 0.8}
+            assert (emotion.confidence_score, emotion.action, emotion.success) == (0.8, "execute:inline", True)
+            assert json.loads(task.output_data) == {'error': "boom"}
+            assert (task.action, task.success, task.confidence_score) == ("execute:thread", False, None)
+            assert telemetry.get_stats()["written"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_telemetry_drops_a_batch_that_fails_to_write(temp_database, monkeypatch):
+    async def scenario():
+        async with temp_database() as db_config:
+            telemetry = make_telemetry(batch_size=10)
+            telemetry.start()
+            for text in "abc":
+                telemetry.record("emotion", {'text': text}, outcome())
+
+            def broken_session():
+                raise RuntimeError("disk full")
+
+            monkeypatch.setattr(db_config, "async_session", broken_session)
+            telemetry.batch_size = 2
+            assert await telemetry.flush() == 0  # First batch lost, the rest kept for later
+            stats = telemetry.get_stats()
+            assert (stats["flush_errors"], stats["dropped"], stats["buffered"]) == (1, 2, 1)
+            monkeypatch.undo()
+            await telemetry.stop()
+            assert telemetry.get_stats()["written"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_agent_must_implement_a_process_hook():
+    from abc import abstractmethod
+    from agents.base_agent import BaseAgent
+
+    with pytest.raises(TypeError, match="process_sync or process"):
+        class Incomplete(BaseAgent):
+            pass
+
+    class SyncAgent(BaseAgent):
+        def process_sync(self, input_data):
+            return {}
+
+    class AsyncAgent(BaseAgent):
+        async def process(self, input_data):
+            return {}
+
+    class AbstractBase(BaseAgent):
+        @abstractmethod
+        def describe(self):
+            pass
+
+    assert SyncAgent("sync").agent_type == "sync"
+    assert AsyncAgent("async").agent_type == "async"
@@ -0,0 +1,407 @@
+"""
+Core tests: the turn pipeline DAG (ordering, timeouts and fallbacks,
+critical path), per-session turn queue policies and cancellation, session
+hibernation and revival (including hibernation racing new messages and
+open connections), and the topic vector against a dense NumPy reference
+"""
+import asyncio
+import random
+import numpy as np
+import pytest
+
+from core import session_manager
+from core.session_manager import AIFriendSessions
+from core.conversation_flow import TopicVector
+from core.session_store import SessionStore
+from core.turn_pipeline import Stage, TurnPipeline
+from core.turn_queue import TurnQueue, TurnRejected
+
+
+def sleeper(seconds, value=None, error=None):
+    """Stage body: sleeps, then returns `value` (or its inputs) or raises"""
+    async def run(inputs):
+        await asyncio.sleep(seconds)
+        if error:
+            raise error
+        return value if value is not None else inputs
+    return run
+
+
+def test_pipeline_runs_independent_stages_concurrently():
+    pipeline = TurnPipeline([
+        Stage("reply", sleeper(0.01), depends_on=("left", "right")),
+        Stage("left", sleeper(0.05, "L")),
+        Stage("right", sleeper(0.05, "R")),
+    ])
+    assert pipeline.order.index("reply") == 2
+
+    result = asyncio.run(pipeline.run())
+    timings = result.timings
+    assert result.results["reply"] == {"left": "L", "right": "R"}
+    assert timings["right"].start < timings["left"].end  # Overlapped
+    assert timings["reply"].start >= max(timings["left"].end, timings["right"].end)
+    assert result.total_time < 0.1
+    assert set(result.summary()["stages"]) == {"left", "right", "reply"}
+
+
+def test_pipeline_timeouts_and_errors_use_fallbacks():
+    pipeline = TurnPipeline([
+        Stage("slow", sleeper(1.0, "late"), timeout=0.02, fallback=lambda inputs: "fallback"),
+        Stage("broken", sleeper(0, error=RuntimeError("boom")), fallback=lambda inputs: []),
+        Stage("bare", sleeper(0, error=RuntimeError("no fallback"))),
+        Stage("after", sleeper(0), depends_on=("slow", "broken", "bare")),
+    ])
+    result = asyncio.run(pipeline.run())
+    assert result.results["after"] == {"slow": "fallback", "broken": [], "bare": None}
+    assert result.timings["slow"].status == "timeout"
+    assert result.timings["slow"].duration < 0.5
+    assert (result.timings["broken"].status, result.timings["broken"].error) == ("error", "boom")
+    assert result.timings["after"].status == "ok"
+
+
+def test_pipeline_critical_path_follows_the_slowest_dependency():
+    pipeline = TurnPipeline([
+        Stage("history", sleeper(0.01)),
+        Stage("memories", sleeper(0.06)),
+        Stage("prepare", sleeper(0.01), depends_on=("history",)),
+        Stage("generate", sleeper(0.01), depends_on=("prepare", "memories")),
+        Stage("log", sleeper(0), depends_on=("history",)),
+    ])
+    result = asyncio.run(pipeline.run())
+    assert result.critical_path == ["memories", "generate"]
+    assert result.summary()["critical_path"] == ["memories", "generate"]
+
+
+@pytest.mark.parametrize("stages", [
+    [Stage("a", sleeper(0), depends_on=("b",)), Stage("b", sleeper(0), depends_on=("a",))],
+    [Stage("a", sleeper(0), depends_on=("missing",))],
+    [Stage("a", sleeper(0)), Stage("a", sleeper(0))],
+])
+def test_pipeline_rejects_invalid_graphs(stages):
+    with pytest.raises(ValueError):
+        TurnPipeline(stages)
+
+
+class GatedHandler:
+    """Turn handler that records messages and blocks until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, message):
+        self.calls.append(message)
+        await self.release.wait()
+        return {"response": message}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def start_busy(queue):
+    """Submit a first turn and let the worker pick it up"""
+    first = asyncio.create_task(queue.submit("a"))
+    await settle()
+    return first
+
+
+def test_queue_policy_rejects_when_full():
+    async def scenario():
+        handler = GatedHandler()
+        queue = TurnQueue(handler, max_depth=2, policy="queue", retry_after=2.5)
+        first = await start_busy(queue)
+        waiting = [asyncio.create_task(queue.submit(m)) for m in ("b", "c")]
+        await settle()
+        assert queue.depth == 3
+
+        with pytest.raises(TurnRejected) as rejected:
+            await queue.submit("d")
+        assert rejected.value.to_dict() == {
+            "error": "busy", "reason": "rejected", "queue_depth": 3, "retry_after": 2.5
+        }
+
+        handler.release.set()
+        results = await asyncio.gather(first, *waiting)
+        assert [result["response"] for result in results] == ["a", "b", "c"]
+        assert handler.calls == ["a", "b", "c"]
+        assert queue.get_stats()["rejected"] == 1
+        assert queue.depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_policy_fails_the_dropped_turn():
+    async def scenario():
+        handler = GatedHandler()
+        queue = TurnQueue(handler, max_depth=2, policy="drop_oldest")
+        first = await start_busy(queue)
+        dropped, kept = [asyncio.create_task(queue.submit(m)) for m in ("b", "c")]
+        await settle()
+        newest = asyncio.create_task(queue.submit("d"))
+        await settle()
+
+        with pytest.raises(TurnRejected) as rejected:
+            await dropped
+        assert rejected.value.reason == "dropped"
+
+        handler.release.set()
+        await asyncio.gather(first, kept, newest)
+        assert handler.calls == ["a", "c", "d"]
+        assert queue.get_stats()["dropped"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_policy_merges_up_to_the_cap():
+    async def scenario():
+        handler = GatedHandler()
+        queue = TurnQueue(handler, max_depth=2, policy="coalesce", max_coalesce=3, max_coalesce_chars=8)
+        first = await start_busy(queue)
+        merged = [asyncio.create_task(queue.submit(m)) for m in ("bb", "cc", "dd")]  # "bb\ncc\ndd" = 8 chars
+        await settle()
+        over_chars = asyncio.create_task(queue.submit("e"))  # Would make 10: starts a new turn
+        await settle()
+        assert queue.depth == 3
+
+        with pytest.raises(TurnRejected):  # Both turns full and max_depth reached
+            await queue.submit("f" * 20)
+
+        handler.release.set()
+        results = await asyncio.gather(first, *merged, over_chars)
+        assert handler.calls == ["a", "bb\ncc\ndd", "e"]
+        assert all(result["coalesced_messages"] == 3 for result in results[1:4])
+        assert "coalesced_messages" not in results[4]
+        assert queue.get_stats()["coalesced"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_message_cap():
+    async def scenario():
+        handler = GatedHandler()
+        queue = TurnQueue(handler, max_depth=4, policy="coalesce", max_coalesce=2)
+        first = await start_busy(queue)
+        rest = [asyncio.create_task(queue.submit(m)) for m in "bcdef"]
+        await settle()
+        handler.release.set()
+        await asyncio.gather(first, *rest)
+        assert handler.calls == ["a", "b\nc", "d\ne", "f"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_worker_releases_waiters():
+    async def scenario():
+        handler = GatedHandler()
+        queue = TurnQueue(handler, max_depth=4)
+        first = await start_busy(queue)
+        waiting = [asyncio.create_task(queue.submit(m)) for m in ("b", "c")]
+        await settle()
+
+        queue._worker.cancel()
+        results = await asyncio.gather(first, *waiting, return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        assert queue.depth == 0
+
+        # The queue keeps working afterwards with a fresh worker
+        handler.release.set()
+        assert (await queue.submit("d"))["response"] == "d"
+
+    asyncio.run(scenario())
+
+
+class FakeFriend:
+    """Stands in for AIFriend: records turns, round-trips them through state"""
+
+    def __init__(self):
+        self.user_id = None
+        self.turns = []
+
+    async def initialize(self):
+        pass
+
+    async def start_conversation(self, user_id):
+        self.user_id = user_id
+
+    def to_state(self):
+        return {"user_id": self.user_id, "turns": list(self.turns)}
+
+    async def restore_state(self, state):
+        self.user_id = state["user_id"]
+        self.turns = list(state["turns"])
+
+    async def chat(self, message):
+        await asyncio.sleep(0)
+        self.turns.append(message)
+        return {"response": message}
+
+
+class GatedStore(SessionStore):
+    """Holds every save until the test opens the gate"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.saving = asyncio.Event()
+        self.gate = asyncio.Event()
+
+    async def save(self, user_id, state):
+        self.saving.set()
+        await self.gate.wait()
+        await super().save(user_id, state)
+
+
+@pytest.fixture
+def fake_friend(monkeypatch):
+    monkeypatch.setattr(session_manager, "AIFriend", FakeFriend)
+
+
+def test_hibernate_and_revive(fake_friend, tmp_path):
+    async def scenario():
+        sessions = AIFriendSessions(store=SessionStore(tmp_path))
+        session = await sessions.get_or_create("u1")
+        await session.chat("hello")
+
+        assert await sessions.hibernate("u1")
+        assert sessions.get_active_sessions() == 0
+        assert sessions.store.count() == 1
+
+        revived = await sessions.get_or_create("u1")
+        assert revived is not session
+        assert revived.ai_friend.turns == ["hello"]
+        assert sessions.store.count() == 0  # Consumed on revive
+
+    asyncio.run(scenario())
+
+
+def test_pinned_session_is_not_hibernated(fake_friend, tmp_path):
+    async def scenario():
+        sessions = AIFriendSessions(store=SessionStore(tmp_path))
+        session = await sessions.pin("u1")
+        assert not await sessions.hibernate("u1")
+        assert sessions.sessions["u1"] is session
+
+        sessions.unpin(session)
+        assert await sessions.hibernate("u1")
+
+    asyncio.run(scenario())
+
+
+def test_get_or_create_waits_for_hibernation(fake_friend, tmp_path):
+    async def scenario():
+        store = GatedStore(tmp_path)
+        sessions = AIFriendSessions(store=store)
+        session = await sessions.get_or_create("u1")
+        await session.chat("hello")
+
+        hibernating = asyncio.create_task(sessions.hibernate("u1"))
+        await store.saving.wait()
+        # Arrives mid-save: must not be handed the session about to be evicted
+        arriving = asyncio.create_task(sessions.get_or_create("u1"))
+        await asyncio.sleep(0.01)
+        assert not arriving.done()
+
+        store.gate.set()
+        assert await hibernating
+        revived = await arriving
+        assert revived is not session
+        assert revived.ai_friend.turns == ["hello"]
+        assert sessions.sessions["u1"] is revived
+        assert not sessions._user_locks
+
+    asyncio.run(scenario())
+
+
+def test_turn_during_save_cancels_hibernation(fake_friend, tmp_path):
+    async def scenario():
+        store = GatedStore(tmp_path)
+        sessions = AIFriendSessions(store=store)
+        session = await sessions.get_or_create("u1")
+
+        hibernating = asyncio.create_task(sessions.hibernate("u1"))
+        await store.saving.wait()
+        # A handler that fetched the session before the save started
+        turn = asyncio.create_task(session.chat("still here"))
+        await asyncio.sleep(0)
+
+        store.gate.set()
+        assert not await hibernating
+        assert (await turn)["response"] == "still here"
+        assert sessions.sessions["u1"] is session
+        assert store.count() == 0
+
+    asyncio.run(scenario())
+
+
+class DenseTopic:
+    """Reference topic: the same hashing, decayed eagerly in float64"""
+
+    def __init__(self, dim, decay):
+        self.bucket = TopicVector(dim=dim)._bucket
+        self.decay = decay
+        self.v = np.zeros(dim)
+
+    def observe(self, terms):
+        message = np.zeros_like(self.v)
+        for term in terms:
+            message[self.bucket(term)] += 1
+        if not message.any():
+            return None
+        norms = np.linalg.norm(self.v) * np.linalg.norm(message)
+        similarity = float(np.dot(self.v, message) / norms) if norms else None
+        self.v = self.decay * self.v + message
+        return similarity
+
+
+def random_messages(count, seed=0, vocabulary=40):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(vocabulary)]
+    return [[rng.choice(words) for _ in range(rng.randint(0, 6))] for _ in range(count)]
+
+
+def assert_tracks(topic, reference):
+    assert topic._v * topic._scale == pytest.approx(reference.v, rel=1e-4, abs=1e-6)
+    assert topic._norm_sq == pytest.approx(float(np.dot(reference.v, reference.v)), rel=1e-4)
+
+
+@pytest.mark.parametrize("decay", [0.7, 0.3])
+def test_topic_vector_norm_tracks_a_dense_reference(decay):
+    topic, reference = TopicVector(dim=32, decay=decay), DenseTopic(32, decay)
+    renormalized = 0
+    for terms in random_messages(200):
+        scale = topic._scale
+        similarity = topic.observe(terms)
+        expected = reference.observe(terms)
+        renormalized += topic._scale > scale
+        if expected is None:
+            assert similarity is None
+        else:
+            assert similarity == pytest.approx(expected, abs=1e-4)
+        assert_tracks(topic, reference)
+    assert renormalized  # The lazy scale was folded back in along the way
+
+
+def test_topic_vector_state_round_trip():
+    topic, reference = TopicVector(dim=64, decay=0.7), DenseTopic(64, 0.7)
+    messages = random_messages(30, seed=1)
+    for terms in messages[:15]:
+        topic.observe(terms)
+        reference.observe(terms)
+
+    restored = TopicVector.from_state(topic.to_state(), dim=64, decay=0.7)
+    assert_tracks(restored, reference)
+    assert restored._scale == 1.0
+    assert restored.top_terms(5) == topic.top_terms(5)
+
+    for terms in messages[15:]:
+        similarity = restored.observe(terms)
+        expected = reference.observe(terms)
+        if expected is None:
+            assert similarity is None
+        else:
+            assert similarity == pytest.approx(expected, abs=1e-4)
+    assert_tracks(restored, reference)
+
+    # A state from another dimension is ignored rather than misread
+    assert not TopicVector.from_state(topic.to_state(), dim=32, decay=0.7)._v.any()
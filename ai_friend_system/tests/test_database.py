@@ -0,0 +1,204 @@
+"""
+Database tests: the batched per-tier top-memories query against the per-tier
+queries it replaced, and the long-lived tier cache (fill, access bumps kept
+in place, invalidation on writes, reads racing writes)
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+import pytest
+
+from database import DatabaseManager, MemoryModel
+from database import db_manager as db_module
+from database.schema import Conversation
+
+TIERS = ['permanent', 'personal', 'temporary']
+
+
+async def seed(db_config, dbm, rows):
+    """Conversation with (tier, content, importance) memories; returns (id, memory ids)"""
+    async for session in db_config.get_session():
+        conversation = Conversation(user_id="u1")
+        session.add(conversation)
+        await session.commit()
+        ids = [
+            await dbm.save_memory(session, MemoryModel(
+                id=None, conversation_id=conversation.id, tier=tier, content=content, importance=importance
+            ))
+            for tier, content, importance in rows
+        ]
+        return conversation.id, ids
+
+
+async def seed_into(db_config, dbm, conversation_id, tier, content):
+    async for session in db_config.get_session():
+        return await dbm.save_memory(session, MemoryModel(
+            id=None, conversation_id=conversation_id, tier=tier, content=content, importance=0.9
+        ))
+
+
+async def top(db_config, dbm, conversation_id):
+    async for session in db_config.get_session():
+        return await dbm.get_top_memories_by_tiers(session, conversation_id, TIERS)
+
+
+async def touch(db_config, dbm, ids):
+    async for session in db_config.get_session():
+        await dbm.update_memories_access(session, ids)
+
+
+def contents(rows):
+    return [row.content for row in rows]
+
+
+async def seed_random(db_config, dbm, user_id, count, seed):
+    """Memories spread over every tier, with repeated importances but distinct recency"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    async for session in db_config.get_session():
+        conversation = Conversation(user_id=user_id)
+        session.add(conversation)
+        await session.commit()
+        for i in range(count):
+            await dbm.save_memory(session, MemoryModel(
+                id=None, conversation_id=conversation.id, tier=rng.choice(TIERS + ['sub_temporary']),
+                content=f"{user_id} memory {i}", importance=rng.choice([0.1, 0.5, 0.5, 0.9]),
+                tags=rng.choice([None, 'music']), last_accessed=now - timedelta(minutes=i)
+            ))
+        return conversation.id
+
+
+def test_top_memories_by_tiers_matches_the_per_tier_queries(temp_database):
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            cid = await seed_random(db_config, dbm, "u1", 40, seed=1)
+            other = await seed_random(db_config, dbm, "u2", 40, seed=2)
+            sparse = await seed_random(db_config, dbm, "u3", 2, seed=3)
+            tiers = TIERS + ['sub_temporary', 'session']  # 'session' has no rows
+
+            for conversation_id in (cid, other, sparse):
+                async for session in db_config.get_session():
+                    batched = await dbm.get_top_memories_by_tiers(session, conversation_id, tiers)
+                    assert list(batched) == tiers
+                    for tier in tiers:
+                        expected = await dbm.get_memories_by_tier(session, conversation_id, tier)
+                        assert [
+                            (row.id, row.tier, row.content, row.importance, row.last_accessed, row.tags)
+                            for row in batched[tier]
+                        ] == [
+                            (m.id, m.tier, m.content, m.importance, m.last_accessed, m.tags)
+                            for m in expected
+                        ], (conversation_id, tier)
+
+                    narrow = await dbm.get_top_memories_by_tiers(session, conversation_id, ['personal'], limit=2)
+                    assert narrow == {'personal': batched['personal'][:2]}
+                    # A narrower read never replaces the cached full-width rows
+                    assert dbm.get_cached_memories_by_tier(conversation_id, 'personal') == batched['personal']
+
+            assert all(len(rows) == 5 for rows in (await top(db_config, dbm, cid)).values())  # Limit applied
+
+    asyncio.run(scenario())
+
+
+def test_tier_cache_fills_for_long_lived_tiers_only(temp_database):
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            cid, _ = await seed(db_config, dbm, [
+                ('permanent', 'name', 0.9), ('personal', 'sister', 0.7), ('temporary', 'tired', 0.5)
+            ])
+            assert dbm.get_cached_memories_by_tier(cid, 'permanent') is None
+
+            await top(db_config, dbm, cid)
+            assert contents(dbm.get_cached_memories_by_tier(cid, 'permanent')) == ['name']
+            assert contents(dbm.get_cached_memories_by_tier(cid, 'personal')) == ['sister']
+            assert dbm.get_cached_memories_by_tier(cid, 'temporary') is None
+
+    asyncio.run(scenario())
+
+
+def test_access_updates_keep_the_cache_in_order(temp_database):
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            cid, ids = await seed(db_config, dbm, [
+                ('permanent', f'fact {i}', 0.5) for i in range(6)
+            ] + [('permanent', 'minor', 0.1)])
+            await top(db_config, dbm, cid)
+
+            # Cached row bumped: stays cached, re-ordered like the query would
+            await touch(db_config, dbm, [ids[3]])
+            cached = dbm.get_cached_memories_by_tier(cid, 'permanent')
+            assert cached is not None
+            assert contents(cached) == contents((await top(db_config, dbm, cid))['permanent'])
+            assert cached[0].content == 'fact 3'
+
+            # Uncached row below the cached floor: order unaffected, cache kept
+            await touch(db_config, dbm, [ids[6]])
+            assert dbm.get_cached_memories_by_tier(cid, 'permanent') == cached
+
+            # Uncached row that now outranks the last cached one: dropped
+            uncached = next(i for i, memory_id in enumerate(ids[:6]) if memory_id not in {row.id for row in cached})
+            await touch(db_config, dbm, [ids[uncached]])
+            assert dbm.get_cached_memories_by_tier(cid, 'permanent') is None
+            assert (await top(db_config, dbm, cid))['permanent'][0].content == f'fact {uncached}'
+
+    asyncio.run(scenario())
+
+
+def test_writes_invalidate_the_cache(temp_database):
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            cid, ids = await seed(db_config, dbm, [('permanent', 'a', 0.5), ('personal', 'b', 0.5)])
+            await top(db_config, dbm, cid)
+
+            await seed_into(db_config, dbm, cid, 'personal', 'c')
+            assert dbm.get_cached_memories_by_tier(cid, 'personal') is None
+            assert dbm.get_cached_memories_by_tier(cid, 'permanent') is not None
+
+            await top(db_config, dbm, cid)
+            async for session in db_config.get_session():
+                await dbm.merge_memories(session, cid, [{'id': ids[0], 'importance': 0.9}], [])
+            assert dbm.get_cached_memories_by_tier(cid, 'permanent') is None
+            assert dbm.get_cached_memories_by_tier(cid, 'personal') is None
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("write", ["save", "access"])
+def test_read_racing_a_write_is_not_cached(temp_database, monkeypatch, write):
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            cid, ids = await seed(db_config, dbm, [('personal', 'old', 0.5), ('personal', 'older', 0.5)])
+
+            # Hold the read after its generation is taken, then write
+            in_query = asyncio.Event()
+            release = asyncio.Event()
+            execute = db_module.AsyncSession.execute
+
+            async def gated_execute(session, *args, **kwargs):
+                in_query.set()
+                await release.wait()
+                return await execute(session, *args, **kwargs)
+
+            async def read():
+                async for session in db_config.get_session():
+                    monkeypatch.setattr(session, "execute", lambda *a, **k: gated_execute(session, *a, **k))
+                    return await dbm.get_top_memories_by_tiers(session, cid, ['personal'])
+
+            reading = asyncio.create_task(read())
+            await in_query.wait()
+            if write == "save":
+                await seed_into(db_config, dbm, cid, 'personal', 'new')
+            else:
+                await touch(db_config, dbm, [ids[1]])
+            release.set()
+            await reading
+
+            assert dbm.get_cached_memories_by_tier(cid, 'personal') is None
+            assert not db_module._tier_reads
+
+    asyncio.run(scenario())
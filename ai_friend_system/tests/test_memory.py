@@ -0,0 +1,507 @@
+"""
+Memory tests: columnar SemanticScorer parity with the per-memory scorer, an
+opt-in ranking benchmark at 10 / 1k / 100k candidates, dense and BM25 index
+search, near-duplicate grouping and the semantic memory engine (collection
+LRU, background warm-load)
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+from memory.inverted_index import InvertedIndex
+from memory.minhash import near_duplicate_groups
+from memory.semantic_scorer import SemanticScorer
+from memory.vector_index import VectorIndex, decode_embedding, encode_embedding, vector_indexes
+
+WORDS = (
+    "hiking mountains sister anna pizza favorite food dog walk park music guitar "
+    "exam worried school coffee morning birthday party travel japan movie weekend"
+).split()
+TIERS = ['permanent', 'personal', 'temporary', 'sub_temporary', 'session', 'unknown']
+EMOTIONS = ['joy', 'sadness', 'neutral', None]
+QUERY = "I am going hiking with my sister this weekend"
+CONTEXT = {'emotion': {'emotion': 'joy'}, 'current_topic': 'hiking weekend'}
+
+
+def make_memories(n, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now()
+    memories = []
+    for i in range(n):
+        created = now - timedelta(days=rng.choice([0, 0.5, 3, 10, 45, 200]), minutes=rng.randint(0, 600))
+        memories.append({
+            'id': i,
+            'content': ' '.join(rng.choices(WORDS, k=rng.randint(0, 12))),
+            'tier': rng.choice(TIERS),
+            'importance': rng.random(),
+            'created_at': rng.choice([created, created.isoformat(), None, "not a date"]),
+            'last_accessed': now,
+            'tags': rng.choice([None, '', ','.join(rng.choices(WORDS, k=3)), 'emotion:joy']),
+            'emotion_at_creation': rng.choice(EMOTIONS)
+        })
+    return memories
+
+
+def reference_rank(scorer, memories, query, context):
+    scored = [{**m, 'relevance_score': scorer.score_memory(m, query, context)} for m in memories]
+    scored.sort(key=lambda m: m['relevance_score'], reverse=True)
+    return scored
+
+
+@pytest.mark.parametrize("context", [None, CONTEXT, {'emotion': 'sadness'}])
+def test_rank_memories_matches_score_memory(context):
+    scorer = SemanticScorer()
+    memories = make_memories(500)
+
+    expected = reference_rank(scorer, memories, QUERY, context)
+    ranked = scorer.rank_memories(memories, QUERY, context)
+
+    assert [m['id'] for m in ranked] == [m['id'] for m in expected]
+    for got, want in zip(ranked, expected):
+        assert got['relevance_score'] == pytest.approx(want['relevance_score'], abs=1e-9)
+
+    top = scorer.rank_memories(memories, QUERY, context, top_k=5)
+    assert [m['id'] for m in top] == [m['id'] for m in expected[:5]]
+    assert scorer.rank_memories([], QUERY, context, top_k=5) == []
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n", [10, 1_000, 100_000])
+def test_benchmark_rank_memories(n, record_property):
+    scorer = SemanticScorer()
+    memories = make_memories(n)
+
+    start = time.perf_counter()
+    expected = reference_rank(scorer, memories, QUERY, CONTEXT)[:5]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    top = scorer.rank_memories(memories, QUERY, CONTEXT, top_k=5)
+    columnar_time = time.perf_counter() - start
+
+    record_property("loop_ms", round(loop_time * 1000, 2))
+    record_property("columnar_top5_ms", round(columnar_time * 1000, 2))
+    assert [m['id'] for m in top] == [m['id'] for m in expected]
+
+
+def unit_vectors(n, dim, seed=3):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_vector_index_add_remove_search():
+    vectors = unit_vectors(300, 16)
+    index = VectorIndex(16, capacity=4)
+    index.add(list(range(100)), vectors[:100])
+    for memory_id in range(100, 300):  # One at a time, growing past capacity repeatedly
+        index.add([memory_id], [vectors[memory_id]])
+    assert index.size == 300
+    assert len(index._ids) >= 300
+
+    query = vectors[42]
+    expected = np.argsort(-(vectors @ query))[:10]
+    hits = index.search(query, 10)
+    assert [memory_id for memory_id, _ in hits] == expected.tolist()
+    assert hits[0] == (42, pytest.approx(1.0))
+
+    index.remove(range(0, 300, 2))
+    assert index.size == 150
+    assert 42 not in index and 43 in index
+    hits = index.search(query, 300)
+    assert len(hits) == 150
+    assert all(memory_id % 2 for memory_id, _ in hits)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+    assert index.search(query, 0) == []
+    assert VectorIndex(16).search(query, 5) == []
+    with pytest.raises(ValueError):
+        index.add([999], unit_vectors(1, 8))
+    assert index.size == 150
+
+
+class FakeEmbeddings:
+    """Deterministic 4-d stand-in for the embedding service"""
+
+    dim = 4
+    model = "fake"  # Loaded eagerly by the semantic warm-load
+
+    def __init__(self):
+        self.embedded = []
+
+    async def dimension(self):
+        return self.dim
+
+    async def embed(self, texts):
+        self.embedded.extend(texts)
+        return unit_vectors(len(texts), self.dim, seed=len(self.embedded))
+
+    async def embed_one(self, text):
+        return (await self.embed([text]))[0]
+
+
+def test_hydrate_reembeds_missing_and_wrong_width_vectors(temp_database, monkeypatch):
+    from database import DatabaseManager, MemoryModel
+    from database.schema import Conversation
+    from memory import memory_manager as manager_module
+
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(manager_module, "embedding_service", fake)
+
+    async def scenario():
+        async with temp_database() as db_config:
+            dbm = DatabaseManager()
+            manager = manager_module.MemoryManager(dbm)
+            stored = {
+                "current model": encode_embedding(unit_vectors(1, 4)[0]),
+                "older model": encode_embedding(unit_vectors(1, 3)[0]),
+                "never embedded": None,
+            }
+            async for session in db_config.get_session():
+                conversation = Conversation(user_id="u1")
+                session.add(conversation)
+                await session.commit()
+                for content, embedding in stored.items():
+                    await dbm.save_memory(session, MemoryModel(
+                        id=None, conversation_id=conversation.id, tier='permanent',
+                        content=content, importance=0.5, embedding=embedding
+                    ))
+                cid = conversation.id
+
+            index = await manager._hydrate_index(cid)
+            assert (index.dim, index.size) == (4, 3)
+            assert sorted(fake.embedded) == ["never embedded", "older model"]
+
+            async for session in db_config.get_session():
+                rows = await dbm.get_memory_embeddings(session, cid)
+            assert all(len(decode_embedding(embedding)) == 4 for _, _, embedding in rows)
+
+            # A live index of another width is dropped, not a failed store
+            vector_indexes.set(cid, VectorIndex(3))
+            try:
+                async for session in db_config.get_session():
+                    memory_id = await manager.store_memory(session, cid, "new fact", {}, 0.5)
+                assert memory_id
+                assert vector_indexes.get(cid) is None
+            finally:
+                vector_indexes.pop(cid)
+
+    asyncio.run(scenario())
+
+
+def test_keyword_index_maxscore_matches_exhaustive(tmp_path):
+    memories = make_memories(3000)
+    index = InvertedIndex()
+    for memory in memories:
+        index.add(memory['id'], memory['content'])
+    index.remove(range(0, 3000, 5))
+
+    for query in (["hiking", "sister", "weekend"], ["pizza"], ["guitar", "japan", "nothing"]):
+        exhaustive = index.search(query, len(index))  # k >= documents: nothing is pruned
+        top = index.search(query, 10)
+        assert [memory_id for memory_id, _ in top] == [memory_id for memory_id, _ in exhaustive[:10]]
+        assert [score for _, score in top] == pytest.approx([score for _, score in exhaustive[:10]])
+        assert all(memory_id % 5 for memory_id, _ in exhaustive)
+
+    # One huge token must not widen every term in the snapshot
+    index.add(10_000, "pizza " + "x" * 20_000 + " caf\u00e9")
+    assert sum(array.nbytes for array in index.to_arrays().values()) < 1_000_000
+
+    path = tmp_path / "index.npz"
+    index.save(path)
+    loaded = InvertedIndex.load(path)
+    for query in (["pizza", "walk"], ["caf\u00e9"], ["x" * 20_000]):
+        assert loaded.search(query, 10) == index.search(query, 10)
+
+
+def test_keyword_index_persist_keeps_dirty_and_order(tmp_path, monkeypatch):
+    import threading
+    from memory import inverted_index
+
+    monkeypatch.setattr(inverted_index, "index_path", lambda conversation_id: tmp_path / f"{conversation_id}.npz")
+    write = inverted_index._write_snapshot
+    index = InvertedIndex()
+    index.add(1, "hiking with my sister")
+
+    def failing_write(path, snapshot):
+        raise OSError("disk full")
+
+    async def failed_then_saved():
+        monkeypatch.setattr(inverted_index, "_write_snapshot", failing_write)
+        with pytest.raises(OSError):
+            await inverted_index.persist(7, index)
+        assert index.dirty
+        monkeypatch.setattr(inverted_index, "_write_snapshot", write)
+        await inverted_index.persist(7, index)
+        assert not index.dirty
+
+    asyncio.run(failed_then_saved())
+
+    # First write is slow; a change and a second persist arrive meanwhile
+    first_started, release_first = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_first_write(path, snapshot):
+        calls.append(len(snapshot[2]))
+        if len(calls) == 1:
+            first_started.set()
+            release_first.wait(5)
+        write(path, snapshot)
+
+    async def overlapping():
+        monkeypatch.setattr(inverted_index, "_write_snapshot", slow_first_write)
+        index.add(2, "pizza on the weekend")
+        first = asyncio.create_task(inverted_index.persist(7, index))
+        await asyncio.to_thread(first_started.wait, 5)
+        index.add(3, "guitar lessons in japan")
+        second = asyncio.create_task(inverted_index.persist(7, index))
+        await asyncio.sleep(0.05)
+        assert index.dirty  # Changed after the first snapshot
+        release_first.set()
+        await asyncio.gather(first, second)
+        assert not index.dirty
+        assert not inverted_index._persist_locks
+
+    asyncio.run(overlapping())
+    assert calls == [2, 3]
+    loaded = InvertedIndex.load(tmp_path / "7.npz")
+    assert sorted(loaded.lengths) == [1, 2, 3]
+
+
+def test_maintenance_run_once(temp_database):
+    from database.schema import Conversation, Memory
+    from memory.maintenance import MemoryMaintenance
+    from sqlalchemy import func, select
+
+    async def scenario():
+        async with temp_database() as db_config:
+            async for session in db_config.get_session():
+                conversation = Conversation(user_id="u1")
+                session.add(conversation)
+                await session.commit()
+                cid = conversation.id
+                past = datetime.now() - timedelta(days=1)
+                session.add_all([
+                    Memory(conversation_id=cid, tier='session', content=f"expired {i}", importance=0.1, expires_at=past)
+                    for i in range(25)
+                ] + [
+                    Memory(conversation_id=cid, tier='permanent', content=content, importance=0.5)
+                    for content in ("I live in Berlin", "i live in berlin!", "I live in Paris")
+                ])
+                await session.commit()
+                newest = (await session.execute(select(func.max(Memory.id)))).scalar()
+
+            maintenance = MemoryMaintenance()
+            maintenance.chunk_size, maintenance.max_chunks, maintenance.chunk_pause = 10, 2, 0
+            maintenance.optimizer.consolidation_enabled = True
+            maintenance.mark_dirty(cid, newest)
+            maintenance.mark_dirty(cid, newest - 1)  # Older id: no change
+
+            # Expiry is chunked and capped per run; the rest waits for the next run
+            report = await maintenance.run_once()
+            assert (report['expired'], report['chunks'], report['error']) == (20, 2, None)
+            assert (report['consolidated'], report['conversations']) == (1, 1)
+            # Caught up: nothing left to track for this conversation
+            assert maintenance.pending == {} and maintenance.watermarks == {}
+
+            report = await maintenance.run_once()
+            assert (report['expired'], report['chunks'], report['consolidated']) == (5, 1, 0)
+
+            # Consolidated too recently: the conversation stays due
+            maintenance.mark_dirty(cid, newest + 1)
+            report = await maintenance.run_once()
+            assert report['conversations'] == 0
+            assert maintenance.get_stats()['pending_conversations'] == 1
+
+            # A store landing during consolidation keeps it due past the watermark
+            maintenance.optimizer._last_consolidated.clear()
+            consolidate = maintenance.optimizer.consolidate_similar
+
+            async def consolidate_while_storing(session, conversation_id):
+                maintenance.mark_dirty(conversation_id, newest + 2)
+                return await consolidate(session, conversation_id)
+
+            maintenance.optimizer.consolidate_similar = consolidate_while_storing
+            await maintenance.run_once()
+            assert maintenance.pending == {cid: newest + 2}
+            assert maintenance.watermarks == {cid: newest + 1}
+
+            async for session in db_config.get_session():
+                contents = (await session.execute(select(Memory.content).order_by(Memory.id))).scalars().all()
+            assert contents == ["i live in berlin!", "I live in Paris"]  # Newer row is canonical on ties
+
+    asyncio.run(scenario())
+
+
+def test_near_duplicate_groups():
+    texts = {
+        1: "My name is Alex and I live in Berlin",
+        2: "my name is Alex and I live in Berlin!",
+        3: "I really like green tea in the morning",
+        4: "Pizza is great",
+        5: "My name is Alex and I live in Berlin now",
+        6: "I really  like green tea in the morning.",
+        7: "My name is Sam and I live in Paris",
+    }
+    assert sorted(near_duplicate_groups(texts)) == [[1, 2], [3, 6]]
+    assert near_duplicate_groups(texts, order=[6, 2, 1, 3]) == [[6, 3], [2, 1]]  # Canonical first
+    assert near_duplicate_groups({}) == []
+
+
+@pytest.mark.parametrize("a, b", [
+    ("My name is Alex and I live in Berlin", "My name is Alex and I live in Paris"),
+    ("My sister Anna is 12 years old", "My sister Anna is 21 years old"),
+    ("I love my dog Rex so much", "I love my cat Rex so much"),
+    ("My favorite food is pizza with extra cheese", "My favorite food is pasta with extra cheese"),
+    ("I do not like coffee in the morning", "I do like coffee in the morning"),
+])
+def test_same_sentence_different_entity_never_merges(a, b):
+    assert near_duplicate_groups({1: a, 2: b}) == []
+    # A matches B and B matches C must not fold A into C's group
+    assert sorted(near_duplicate_groups({1: a, 2: a.upper(), 3: b, 4: b + "!"})) == [[1, 2], [3, 4]]
+
+
+def test_merge_group_keeps_links_to_surviving_rows():
+    from types import SimpleNamespace
+    from database import DatabaseManager
+    from memory.memory_optimizer import MemoryOptimizer
+
+    def row(memory_id, related, tags=None):
+        return SimpleNamespace(
+            id=memory_id, tier='permanent', importance=0.5, access_count=1, tags=tags,
+            related_memories=related, expires_at=None, last_accessed=datetime(2026, 1, memory_id)
+        )
+
+    optimizer = MemoryOptimizer(DatabaseManager())
+    group = [row(3, '[1, 9]', 'a'), row(2, '[3, 7]', 'b')]
+    merged_row, merged_ids = optimizer._merge_group(group, folded={2, 7})
+    assert merged_ids == [2]
+    assert merged_row['id'] == 3
+    assert json.loads(merged_row['related_memories']) == [1, 9]
+    assert merged_row['tags'] == 'a,b'
+    assert merged_row['access_count'] == 2
+
+
+class FakeCollection:
+    def __init__(self, name, size=0):
+        self.name = name
+        self.items = {f"seed{i}": (None, f"doc {i}", {}) for i in range(size)}
+
+    def add(self, embeddings, documents, metadatas, ids):
+        for embedding, document, metadata, memory_id in zip(embeddings, documents, metadatas, ids):
+            self.items[memory_id] = (embedding, document, metadata)
+
+    def count(self):
+        return len(self.items)
+
+    def query(self, query_embeddings, n_results):
+        def distance(item):
+            return float(np.linalg.norm(np.subtract(item[0], query_embeddings[0])))
+        ranked = sorted(self.items.values(), key=distance)[:n_results]
+        return {
+            "documents": [[item[1] for item in ranked]],
+            "metadatas": [[item[2] for item in ranked]],
+            "distances": [[distance(item) for item in ranked]]
+        }
+
+    def delete(self, ids):
+        for memory_id in ids:
+            self.items.pop(memory_id, None)
+
+
+class FakeChroma:
+    """Chroma client stand-in that counts collection opens"""
+
+    def __init__(self, sizes=None, listing=None):
+        self.stored = {name: FakeCollection(name, size) for name, size in (sizes or {}).items()}
+        self.opened = []
+        self.listing = listing
+
+    def get_or_create_collection(self, name):
+        self.opened.append(name)
+        return self.stored.setdefault(name, FakeCollection(name))
+
+    def list_collections(self):
+        if self.listing:
+            self.listing()
+        return list(self.stored)  # Names, as newer chromadb returns
+
+
+def make_engine(monkeypatch, tmp_path, client, max_collections=2):
+    from memory import semantic_memory as engine_module
+
+    monkeypatch.setattr(engine_module, "embedding_service", FakeEmbeddings())
+    engine = engine_module.SemanticMemoryEngine(path=tmp_path)
+    engine.collections = engine_module.LRUCache(max_collections)
+    engine._client = client
+    return engine
+
+
+def test_semantic_collections_are_bounded_lru(monkeypatch, tmp_path):
+    client = FakeChroma()
+    engine = make_engine(monkeypatch, tmp_path, client)
+
+    first = engine.get_collection("u1")
+    assert engine.get_collection({"id": "u1"}) is first  # Same user, either form
+    engine.get_collection("u2")
+    engine.get_collection("u1")  # Most recent again
+    engine.get_collection("u3")  # Evicts u2
+    assert client.opened == ["memories_u1", "memories_u2", "memories_u3"]
+    assert "u2" not in engine.collections and "u1" in engine.collections
+
+    engine.get_collection("u2")  # Reopened from the store, contents intact
+    assert client.opened[-1] == "memories_u2"
+    assert engine.get_stats()["collections"]["evictions"] == 2
+
+    async def scenario():
+        memory_id = await engine.save_memory("u1", "likes hiking", {"tier": "personal"})
+        [found] = await engine.search_memories("u1", "hiking", n_results=3)
+        assert found["content"] == "likes hiking" and found["metadata"] == {"tier": "personal"}
+        await engine.delete_memory("u1", memory_id)
+        assert await engine.search_memories("u1", "hiking") == []
+
+    asyncio.run(scenario())
+
+
+def test_semantic_warm_load_runs_off_the_loop(monkeypatch, tmp_path):
+    listing = threading.Event()
+    client = FakeChroma(
+        {"other": 5, "memories_a": 3, "memories_b": 2, "memories_c": 1, "memories_d": 4},
+        listing=lambda: listing.wait(timeout=5)
+    )
+    engine = make_engine(monkeypatch, tmp_path, client, max_collections=3)
+    assert engine.get_stats()["warm_load"] == {"state": "cold"}
+
+    async def scenario():
+        engine.start_warm_load()
+        await asyncio.sleep(0.01)
+        assert engine.warm_stats == {"state": "loading"}  # Blocked listing, loop still running
+        listing.set()
+        await engine._warm_task
+
+    asyncio.run(scenario())
+    stats = engine.warm_stats
+    # Non-memory collections are skipped, then capped at the LRU size
+    assert (stats["state"], stats["collections"], stats["memories"]) == ("ready", 3, 6)
+    assert "other" not in client.opened and "memories_d" not in client.opened
+    opened = list(client.opened)
+    assert engine.get_collection("a").count() == 3
+    assert client.opened == opened  # Served from the warmed LRU
+
+
+def test_semantic_warm_load_failure_is_reported(monkeypatch, tmp_path):
+    def broken():
+        raise RuntimeError("store locked")
+
+    engine = make_engine(monkeypatch, tmp_path, FakeChroma(listing=broken))
+
+    async def scenario():
+        engine.start_warm_load()
+        await engine._warm_task
+
+    asyncio.run(scenario())
+    assert engine.warm_stats == {"state": "failed", "error": "store locked"}
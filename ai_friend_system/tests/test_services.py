@@ -0,0 +1,241 @@
+"""
+Service tests: the embedding cache's on-disk store (reopen, torn appends,
+model changes, the record cap) and the micro-batching embedding service
+(batch sizes, cache short-circuit, error and cancellation delivery)
+"""
+import asyncio
+import json
+import threading
+import numpy as np
+import pytest
+
+from services.embedding_cache import EmbeddingCache, _DiskStore, _KEY_BYTES
+from services.embedding_service import EmbeddingService
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def keys(n, prefix=b"k"):
+    return [(prefix + str(i).encode()).ljust(_KEY_BYTES, b"-") for i in range(n)]
+
+
+def test_disk_store_survives_reopen(tmp_path):
+    store = _DiskStore(tmp_path, "model-a")
+    data = vectors(10)
+    store.put_many(keys(10), data)
+    store.close()
+
+    reopened = _DiskStore(tmp_path, "model-a")
+    assert len(reopened.rows) == 10
+    assert np.array_equal(reopened.get(keys(10)[7]), data[7])
+    assert reopened.get(b"missing".ljust(_KEY_BYTES, b"-")) is None
+
+    # Appends after reopening land after the existing records
+    reopened.put_many(keys(3, b"new"), vectors(3, seed=1))
+    assert np.array_equal(reopened.get(keys(10)[9]), data[9])
+    assert np.array_equal(reopened.get(keys(3, b"new")[2]), vectors(3, seed=1)[2])
+    reopened.close()
+
+
+def test_torn_append_is_truncated_on_open(tmp_path):
+    store = _DiskStore(tmp_path, "model-a")
+    data = vectors(4)
+    store.put_many(keys(4), data)
+    store.close()
+
+    # A crash mid-append: a whole vector record but only half its key
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(vectors(1, seed=9).tobytes())
+    with open(tmp_path / "keys.bin", "ab") as f:
+        f.write(b"torn")
+
+    reopened = _DiskStore(tmp_path, "model-a")
+    assert len(reopened.rows) == 4
+    assert (tmp_path / "keys.bin").stat().st_size == 4 * _KEY_BYTES
+    assert (tmp_path / "vectors.f32").stat().st_size == 4 * 8 * 4
+    reopened.put_many(keys(1, b"after"), vectors(1, seed=2))
+    assert np.array_equal(reopened.get(keys(1, b"after")[0]), vectors(1, seed=2)[0])
+    assert np.array_equal(reopened.get(keys(4)[3]), data[3])
+    reopened.close()
+
+
+def test_model_or_dim_change_wipes_the_store(tmp_path):
+    store = _DiskStore(tmp_path, "model-a")
+    store.put_many(keys(5), vectors(5))
+    store.close()
+
+    assert not _DiskStore(tmp_path, "model-b").rows
+    assert not (tmp_path / "keys.bin").exists()
+
+    store = _DiskStore(tmp_path, "model-b")
+    store.put_many(keys(5), vectors(5))
+    store.put_many(keys(2, b"wide"), vectors(2, dim=16))
+    assert store.dim == 16
+    assert set(store.rows) == set(keys(2, b"wide"))
+    store.close()
+    assert json.loads((tmp_path / "meta.json").read_text()) == {"model": "model-b", "dim": 16}
+
+
+def test_record_cap_keeps_the_newest_records(tmp_path):
+    cache = EmbeddingCache("model-a", memory_size=1, disk_path=str(tmp_path), disk_max_records=10)
+    batches = [(keys(4, bytes([65 + b])), vectors(4, seed=b)) for b in range(4)]  # 16 records
+    for batch_keys, batch_vectors in batches:
+        cache.put_many(batch_keys, batch_vectors)
+
+    stats = cache.get_stats()
+    assert stats["disk_records"] <= 10
+    assert stats["disk_max_records"] == 10
+    assert stats["disk_compactions"] >= 1
+    assert (tmp_path / "keys.bin").stat().st_size == stats["disk_records"] * _KEY_BYTES
+
+    disk = cache.disk
+    newest_keys, newest_vectors = batches[-1]
+    for key, vector in zip(newest_keys, newest_vectors):
+        assert np.array_equal(disk.get(key), vector)
+    assert disk.get(batches[0][0][0]) is None
+    cache.close()
+
+    reopened = _DiskStore(tmp_path, "model-a")
+    assert set(reopened.rows) == set(disk.rows)
+    assert np.array_equal(reopened.get(newest_keys[0]), newest_vectors[0])
+    reopened.close()
+
+
+def test_oversized_batch_is_capped(tmp_path):
+    store = _DiskStore(tmp_path, "model-a", max_records=6)
+    batch_keys, batch_vectors = keys(9), vectors(9)
+    store.put_many(batch_keys, batch_vectors)
+    assert len(store.rows) == 6
+    assert np.array_equal(store.get(batch_keys[8]), batch_vectors[8])
+    assert store.get(batch_keys[0]) is None
+    store.close()
+
+
+class FakeModel:
+    """SentenceTransformer stand-in: 3-d vectors derived from the text, optional gate"""
+
+    def __init__(self, gate=None, fail_on=None):
+        self.batches = []
+        self.gate = gate
+        self.fail_on = fail_on
+        self.encoding = threading.Event()
+
+    def encode(self, texts):
+        self.batches.append(list(texts))
+        self.encoding.set()
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.fail_on in texts:
+            raise RuntimeError(f"cannot encode {self.fail_on}")
+        return np.array([expected(text) * 3 for text in texts])  # Unnormalized on purpose
+
+
+def expected(text):
+    vector = np.array([len(text), sum(map(ord, text)) % 7, 1.0], dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def build(model, cache=None, max_batch=4, max_wait_ms=50):
+        service = EmbeddingService(model_name="fake", max_batch=max_batch, max_wait_ms=max_wait_ms)
+        service.cache = cache
+        service._model = model
+        services.append(service)
+        return service
+
+    yield build
+    for service in services:
+        service.stop()
+
+
+def test_concurrent_callers_share_batches(make_service):
+    model = FakeModel()
+    service = make_service(model)
+    texts = [f"text {i}" for i in range(10)]
+
+    async def scenario():
+        return await asyncio.gather(*(service.embed_one(text) for text in texts))
+
+    results = asyncio.run(scenario())
+    assert [len(batch) for batch in model.batches] == [4, 4, 2]
+    for text, vector in zip(texts, results):
+        assert vector == pytest.approx(expected(text), abs=1e-6)  # Each caller gets its own slice
+    stats = service.get_stats()
+    assert (stats["batches"], stats["texts"], stats["max_batch_size"]) == (3, 10, 4)
+
+
+def test_cached_texts_skip_the_queue(make_service, tmp_path):
+    model = FakeModel()
+    service = make_service(model, cache=EmbeddingCache("fake", memory_size=100, disk_path=str(tmp_path)))
+
+    async def scenario():
+        first = await service.embed(["a", "b", "a", ""])
+        again = await service.embed(["b", "a"])
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert model.batches == [["a", "b", ""]]  # Repeats encoded once; the second call is all hits
+    assert np.array_equal(first[0], first[2]) and np.array_equal(again, first[[1, 0]])
+    assert asyncio.run(service.dimension()) == 3
+    assert model.batches == [["a", "b", ""]]
+
+
+def test_batch_errors_reach_every_caller(make_service):
+    model = FakeModel(fail_on="bad")
+    service = make_service(model)
+
+    async def scenario():
+        results = await asyncio.gather(
+            service.embed_one("fine"), service.embed_one("bad"), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)  # Same batch, same failure
+        return await service.embed_one("after")
+
+    assert asyncio.run(scenario()) == pytest.approx(expected("after"), abs=1e-6)
+    assert service.get_stats()["errors"] == 1
+    assert service.running
+
+
+def test_cancelled_callers_do_not_break_delivery(make_service):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    service = make_service(model)
+    loop_errors = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+        cancelled = asyncio.create_task(service.embed_one("gone"))
+        kept = asyncio.create_task(service.embed_one("kept"))
+        await asyncio.to_thread(model.encoding.wait, 5)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        assert await kept == pytest.approx(expected("kept"), abs=1e-6)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.sleep(0.01)  # Let the late resolve for the cancelled future run
+
+    asyncio.run(scenario())
+    assert model.batches == [["gone", "kept"]]
+    assert loop_errors == []
+
+
+def test_delivery_to_a_closed_loop_is_dropped(make_service):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    service = make_service(model)
+
+    async def abandon():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(service.embed_one("late"), timeout=0.05)
+
+    asyncio.run(abandon())  # Its loop is closed before the batch finishes
+    gate.set()
+
+    assert asyncio.run(service.embed_one("next")) == pytest.approx(expected("next"), abs=1e-6)
+    assert service.running
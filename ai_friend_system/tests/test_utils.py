@@ -0,0 +1,323 @@
+"""
+Utility tests: the event-loop watchdog (stall capture by call site, idle
+loops, the lag hook), tracing (sampling, nesting, OTLP export), logging
+(queue backend, sampling filter, request ids) and shared text features
+(parity with the per-analyzer tokenization they replaced)
+"""
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import time
+import pytest
+
+from utils.logger import (
+    JsonFormatter, RequestContextFilter, SamplingFilter, _LazyQueueHandler,
+    get_request_id, request_context, set_request_id
+)
+from utils.loop_watchdog import LoopWatchdog
+from utils.text_features import TextFeatures
+from utils.tracing import NOOP_SPAN, Tracer, traced
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.allow_loop_block
+def test_watchdog_reports_the_blocking_call_site():
+    samples = []
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.05, on_lag=lambda lag, incident: samples.append(incident))
+
+    async def scenario():
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        block_the_loop(0.2)
+        await asyncio.sleep(0.05)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        watchdog.stop()
+
+    assert watchdog.incident_count == 1
+    [incident] = watchdog.report()
+    assert incident["site"].startswith("tests/test_utils.py")
+    assert incident["site"].endswith("in block_the_loop")
+    assert incident["max_ms"] >= 150
+    assert any(samples) and not all(samples)
+
+    stats = watchdog.get_stats()
+    assert stats["incidents"] == 1 and stats["sites"] == 1
+    assert stats["lag_max_ms"] >= 150
+    assert not stats["running"]
+
+    watchdog.reset()
+    assert watchdog.report() == [] and watchdog.incident_count == 0
+
+
+def test_watchdog_ignores_a_loop_that_is_not_running():
+    loop = asyncio.new_event_loop()
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.02)
+    try:
+        watchdog.start(loop)
+        time.sleep(0.15)
+    finally:
+        watchdog.stop()
+        loop.close()
+
+    assert watchdog.incident_count == 0
+    assert watchdog.get_stats()["samples"] == 0
+
+
+def test_tracer_samples_whole_traces():
+    tracer = Tracer(sample_rate=0.0)
+    with tracer.trace("chat.turn") as root:
+        assert root is NOOP_SPAN
+        with tracer.span("stage.generate") as child:
+            assert child is NOOP_SPAN
+    assert tracer.recent() == []
+    assert tracer.get_stats()["started_traces"] == 1
+    assert tracer.get_stats()["sampled_traces"] == 0
+
+    tracer.set_sampling(sample_rate=5)  # Clamped
+    assert tracer.sample_rate == 1.0
+    with tracer.trace("chat.turn"):
+        pass
+    tracer.set_sampling(enabled=False)
+    with tracer.trace("chat.turn"):
+        pass
+    assert tracer.get_stats()["sampled_traces"] == 1
+    assert tracer.get_stats()["buffered_traces"] == 1
+
+
+def test_spans_nest_within_a_trace_only():
+    tracer = Tracer()
+
+    with tracer.span("background") as span:
+        assert span is NOOP_SPAN  # No trace open: nothing recorded
+
+    @traced("helper")
+    async def helper():
+        with tracer.span("leaf", depth=2):
+            await asyncio.sleep(0)
+
+    async def turn():
+        with tracer.trace("chat.turn", user="u1"):
+            with tracer.span("stage.prepare") as prepare:
+                prepare.set_attribute("tokens", 12)
+            await asyncio.gather(helper(), helper())  # Tasks inherit the current span
+            with pytest.raises(ValueError):
+                with tracer.span("stage.save"):
+                    raise ValueError("disk")
+
+    asyncio.run(turn())
+    [summary] = tracer.recent()
+    by_name = {}
+    for span in summary["spans"]:
+        by_name.setdefault(span["name"], []).append(span)
+
+    root = by_name["chat.turn"][0]
+    assert summary["name"] == "chat.turn" and summary["span_count"] == 7
+    assert root["parent_id"] is None and root["attributes"] == {"user": "u1"}
+    assert by_name["stage.prepare"][0]["parent_id"] == root["span_id"]
+    assert by_name["stage.prepare"][0]["attributes"] == {"tokens": 12}
+    helpers = {span["span_id"] for span in by_name["helper"]}
+    assert [span["parent_id"] for span in by_name["helper"]] == [root["span_id"]] * 2
+    assert {span["parent_id"] for span in by_name["leaf"]} == helpers
+    assert by_name["stage.save"][0]["status"] == "error"
+
+
+def test_spans_past_the_cap_are_dropped():
+    tracer = Tracer(max_spans_per_trace=2)
+    with tracer.trace("chat.turn"):
+        for name in ("a", "b", "c"):
+            with tracer.span(name):
+                pass
+    [summary] = tracer.recent()
+    assert [span["name"] for span in summary["spans"]] == ["chat.turn", "a"]
+    assert summary["dropped_spans"] == 2
+
+
+def test_otlp_export():
+    tracer = Tracer(service_name="test-service")
+    with tracer.trace("chat.turn", count=3, ratio=0.5, cached=True, model="m"):
+        with pytest.raises(RuntimeError):
+            with tracer.span("stage.generate"):
+                raise RuntimeError("llm down")
+
+    export = tracer.export_otlp()
+    [resource] = export["resourceSpans"]
+    assert resource["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "test-service"}}]
+    root, child = resource["scopeSpans"][0]["spans"]
+    assert root["parentSpanId"] == "" and child["parentSpanId"] == root["spanId"]
+    assert root["traceId"] == child["traceId"] and len(root["traceId"]) == 32
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+    assert root["attributes"] == [
+        {"key": "count", "value": {"intValue": "3"}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+        {"key": "cached", "value": {"boolValue": True}},
+        {"key": "model", "value": {"stringValue": "m"}},
+    ]
+    assert root["status"] == {"code": 1}
+    assert child["status"] == {"code": 2, "message": "RuntimeError: llm down"}
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_queue_handler_formats_on_the_writer_thread():
+    log_queue = queue.Queue(maxsize=2)
+    handler = _LazyQueueHandler(log_queue)
+    output = ListHandler()
+    output.setFormatter(JsonFormatter())
+
+    logger = logging.getLogger("tests.queue_backend")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addFilter(RequestContextFilter())
+    logger.addHandler(handler)
+    try:
+        with request_context("req-1"):
+            logger.info("took %.1fms for %s", 12.34, "u1")
+        record = log_queue.queue[0]
+        assert (record.msg, record.args, record.request_id) == ("took %.1fms for %s", (12.34, "u1"), "req-1")
+
+        logger.info("second")
+        logger.info("third")  # Queue full: dropped, never blocks the caller
+        assert handler.dropped == 1
+
+        listener = logging.handlers.QueueListener(log_queue, output)
+        listener.start()
+        listener.stop()  # Drains the queue
+    finally:
+        logger.removeHandler(handler)
+
+    first, second = (json.loads(line) for line in output.lines)
+    assert first["msg"] == "took 12.3ms for u1"
+    assert first["request_id"] == "req-1" and first["level"] == "INFO"
+    assert second["msg"] == "second" and second["request_id"] == "-"
+
+
+def make_record(level=logging.INFO):
+    return logging.LogRecord("tests", level, __file__, 1, "message", None, None)
+
+
+def test_sampling_filter_never_drops_warnings():
+    sampling = SamplingFilter(sample_rate=0.0)
+    assert not any(sampling.filter(make_record()) for _ in range(50))
+    assert sampling.sampled_out == 50
+    assert sampling.filter(make_record(logging.WARNING))
+    assert sampling.filter(make_record(logging.ERROR))
+
+
+def test_sampling_filter_rate_limits_with_a_burst():
+    limited = SamplingFilter(rate_per_second=0.001, burst=3)
+    passed = [limited.filter(make_record(logging.DEBUG)) for _ in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    assert limited.rate_limited == 7
+    assert limited.filter(make_record(logging.WARNING))
+
+
+def test_request_ids_follow_the_context():
+    async def turn(name):
+        set_request_id(name)
+        await asyncio.sleep(0)
+        return get_request_id()
+
+    async def scenario():
+        with request_context("outer") as outer:
+            with request_context() as nested:
+                assert nested == outer == "outer"  # Reused, not replaced
+            with request_context("inner"):
+                assert get_request_id() == "inner"
+            assert get_request_id() == "outer"
+            # Tasks copy the context: their own ids don't leak into the caller
+            assert await asyncio.gather(turn("a"), turn("b")) == ["a", "b"]
+            assert get_request_id() == "outer"
+        generated = set_request_id()
+        assert len(generated) == 12 and get_request_id() == generated
+
+    asyncio.run(scenario())
+
+
+# The stop-word literal each analyzer used to rebuild per call
+OLD_STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are',
+    'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it',
+    'we', 'they', 'me', 'him', 'her', 'us', 'them'
+}
+
+TEXTS = [
+    "",
+    "   ",
+    "Hello there, how are you?",
+    "I am SO happy!!! The Weather is great.",
+    "tabs\tand\nnewlines  and   runs of spaces",
+    "Straße ÉCOLE naïve İstanbul",
+    "It is what it is... or is it?",
+    "don't stop-me now, I'm having a good time",
+    "The the THE a An",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_features_match_the_old_tokenization(text):
+    features = TextFeatures(text)
+    words = text.lower().split()
+
+    assert list(features.words) == text.split()
+    assert list(features.tokens) == words
+    assert features.token_set == set(words)
+    assert features.content_set == set(words) - OLD_STOP_WORDS
+    assert list(features.content_terms) == [w for w in words if w not in OLD_STOP_WORDS]
+    assert (features.has_question, features.has_exclamation, features.has_period) == ('?' in text, '!' in text, '.' in text)
+    assert list(features.ngrams(2)) == list(zip(words, words[1:]))
+    assert features.ngrams(2) is features.ngrams(2)  # Computed once
+    assert TextFeatures.of(features) is features
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_analyzers_agree_on_strings_and_features(text):
+    from core.conversation_flow import ConversationFlowTracker
+    from core.nlp_engine import NLPEngine
+    from memory.semantic_scorer import SemanticScorer
+
+    features = TextFeatures(text)
+    engine = NLPEngine()
+    analysis = engine.analyze_text(text)
+    assert analysis == engine.analyze_text(features)
+    assert analysis == {  # The per-call version it replaced
+        'word_count': len(text.split()),
+        'sentence_count': len(re.split(r'[.!?]+', text)),
+        'has_question': '?' in text,
+        'has_exclamation': '!' in text,
+        'capitalized_words': len([w for w in text.split() if w[0].isupper()]),
+        'is_short': len(text.split()) < 5,
+        'is_long': len(text.split()) > 50
+    }
+    assert engine.clean_text(features) == engine.clean_text(text)
+
+    tracker = ConversationFlowTracker()
+    keywords = [w for w in text.lower().split() if len(w) > 3 and w not in OLD_STOP_WORDS]
+    assert tracker._extract_topic_keywords(text) == keywords[:5]
+    assert tracker._extract_topic_keywords(features) == keywords[:5]
+
+    scorer = SemanticScorer()
+    memory = "I am so happy the weather is great in Istanbul"
+    query_words = set(text.lower().split()) - OLD_STOP_WORDS
+    old_overlap = 0.0
+    if text and query_words:
+        shared = (set(memory.lower().split()) - OLD_STOP_WORDS) & query_words
+        old_overlap = min(1.0, len(shared) / len(query_words) * 2.0)
+    assert scorer._keyword_overlap_score(memory, text) == old_overlap
+    assert scorer._keyword_overlap_score(TextFeatures(memory), features) == old_overlap
@@ -1,58 +1,258 @@
+import atexit
+import contextvars
+from contextlib import contextmanager
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+import uuid
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Optional
 from config import settings
 
+# Correlation id of the request / chat turn currently being handled
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def set_request_id(request_id: Optional[str] = None) -> str:
+    """Bind a correlation id to the current context (generated if omitted)"""
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    return request_id
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None):
+    """Scope a correlation id, reusing the caller's one if already bound"""
+    current = request_id_var.get()
+    if current and not request_id:
+        yield current
+        return
+
+    token = request_id_var.set(request_id or new_request_id())
+    try:
+        yield request_id_var.get()
+    finally:
+        request_id_var.reset(token)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the correlation id on the calling thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Per-logger sampling and token-bucket rate limiting for INFO/DEBUG
+
+    WARNING and above always pass, so hot-path chatter can be thinned
+    without ever hiding failures.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_per_second: float = 0.0, burst: int = 100):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_per_second = rate_per_second
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+
+        if self.rate_per_second > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate_per_second)
+                self._last = now
+                if self._tokens < 1.0:
+                    self.rate_limited += 1
+                    return False
+                self._tokens -= 1.0
+
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; runs on the writer thread"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that defers message formatting to the writer thread"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stdlib version formats here (on the event loop); keep msg/args as-is
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogBackend:
+    """Shared queue + background writer thread for every Logger"""
+
+    def __init__(self):
+        log_dir = Path(__file__).parent.parent / 'data' / 'logs'
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+        text_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+        )
+
+        # File handler
+        log_file = log_dir / f'{datetime.now().strftime("%Y%m%d")}.log'
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonFormatter() if settings.get('logging.json', True) else text_formatter)
+
+        # Console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(text_formatter)
+
+        self.handlers = [file_handler, console_handler]
+        self.context_filter = RequestContextFilter()
+        self.async_enabled = settings.get('logging.async', True)
+        self.listener = None
+
+        if self.async_enabled:
+            self.queue: queue.Queue = queue.Queue(maxsize=settings.get('logging.queue_size', 10000))
+            self.queue_handler = _LazyQueueHandler(self.queue)
+            self.listener = logging.handlers.QueueListener(
+                self.queue, *self.handlers, respect_handler_level=True
+            )
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def attach(self, logger: logging.Logger):
+        logger.addFilter(self.context_filter)
+        if self.async_enabled:
+            logger.addHandler(self.queue_handler)
+        else:
+            for handler in self.handlers:
+                logger.addHandler(handler)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize() if self.async_enabled else 0,
+            "dropped": self.queue_handler.dropped if self.async_enabled else 0,
+        }
+
+
 class Logger:
     _loggers = {}
-    
+    _filters: Dict[str, SamplingFilter] = {}
+    _backend: Optional[_LogBackend] = None
+    _backend_lock = threading.Lock()
+
     def __init__(self, name: str):
         if name in Logger._loggers:
             self.logger = Logger._loggers[name]
         else:
             self.logger = self._setup_logger(name)
             Logger._loggers[name] = self.logger
-    
+
+    @classmethod
+    def _get_backend(cls) -> _LogBackend:
+        if cls._backend is None:
+            with cls._backend_lock:
+                if cls._backend is None:
+                    cls._backend = _LogBackend()
+        return cls._backend
+
     def _setup_logger(self, name: str) -> logging.Logger:
         logger = logging.getLogger(name)
         logger.setLevel(getattr(logging, settings.get('logging.level', 'INFO')))
-        
-        # Create logs directory
-        log_dir = Path(__file__).parent.parent / 'data' / 'logs'
-        log_dir.mkdir(parents=True, exist_ok=True)
-        
-        # File handler
-        log_file = log_dir / f'{datetime.now().strftime("%Y%m%d")}.log'
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        # Formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        logger.propagate = False
+
+        # Hot-path sampling / rate limiting (INFO and below)
+        sampling_filter = SamplingFilter(
+            sample_rate=settings.get(f'logging.sampling.{name}', 1.0),
+            rate_per_second=settings.get('logging.rate_limit_per_second', 0),
+            burst=settings.get('logging.rate_limit_burst', 100)
         )
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
+        logger.addFilter(sampling_filter)
+        Logger._filters[name] = sampling_filter
+
+        self._get_backend().attach(logger)
+
         return logger
-    
-    def debug(self, message: str):
-        self.logger.debug(message)
-    
-    def info(self, message: str):
-        self.logger.info(message)
-    
-    def warning(self, message: str):
-        self.logger.warning(message)
-    
-    def error(self, message: str):
-        self.logger.error(message)
-    
-    def critical(self, message: str):
-        self.logger.critical(message)
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, object]:
+        """Queue depth, drops and per-logger sampling counters"""
+        backend = cls._get_backend()
+        return {
+            **backend.get_stats(),
+            "sampled_out": {n: f.sampled_out for n, f in cls._filters.items() if f.sampled_out},
+            "rate_limited": {n: f.rate_limited for n, f in cls._filters.items() if f.rate_limited},
+        }
+
+    @classmethod
+    def shutdown(cls):
+        if cls._backend:
+            cls._backend.stop()
+
+    # Messages use lazy %-style args: logger.info("took %.3fs", elapsed)
+    def debug(self, message: str, *args, **kwargs):
+        self.logger.debug(message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        self.logger.info(message, *args, **kwargs)
+
+    def warning(self, message: str, *args, **kwargs):
+        self.logger.warning(message, *args, **kwargs)
+
+    def error(self, message: str, *args, **kwargs):
+        self.logger.error(message, *args, **kwargs)
+
+    def critical(self, message: str, *args, **kwargs):
+        self.logger.critical(message, *args, **kwargs)
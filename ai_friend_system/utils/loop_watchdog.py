@@ -0,0 +1,214 @@
+"""
+Event-loop lag watchdog
+A daemon thread pings the event loop with call_soon_threadsafe every
+`interval` seconds. If the ping is not serviced within `threshold` the loop
+is blocked: the loop thread's stack is captured while it is still stuck and
+the incident is aggregated by call site (deepest frame in our own code).
+Lives in utils (no core imports) so the test suite can watch its loops
+without pulling in the application
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from config import settings
+from utils.logger import Logger
+
+logger = Logger("LoopWatchdog")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Never blame the watchdog or asyncio plumbing for a stall
+_IGNORED_FILES = (str(Path(__file__).resolve()), str(Path(asyncio.__file__).parent))
+
+
+class LoopIncident:
+    """Stalls aggregated under one call site"""
+
+    __slots__ = ('site', 'blocked_in', 'count', 'total', 'max', 'last_seen', 'stack')
+
+    def __init__(self, site: str, blocked_in: str, stack: List[str]):
+        self.site = site
+        self.blocked_in = blocked_in
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last_seen: Optional[datetime] = None
+        self.stack = stack
+
+    def add(self, lag: float, stack: List[str]):
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        self.last_seen = datetime.now()
+        self.stack = stack  # Keep the most recent capture
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "site": self.site,
+            "blocked_in": self.blocked_in,
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "stack": self.stack
+        }
+
+
+class LoopWatchdog:
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None,
+                 on_lag: Optional[Callable[[float, bool], None]] = None):
+        self.interval = interval or settings.get('performance.loop_watchdog.interval_ms', 50) / 1000
+        self.threshold = threshold or settings.get('performance.loop_watchdog.threshold_ms', 100) / 1000
+        self.stack_depth = settings.get('performance.loop_watchdog.stack_depth', 25)
+        self.max_sites = settings.get('performance.loop_watchdog.max_sites', 100)
+        # Per-sample hook (lag seconds, past threshold), e.g. perf_monitor.track_loop_lag
+        self.on_lag = on_lag
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        self.incidents: Dict[str, LoopIncident] = {}
+        self.incident_count = 0
+        self.lags = deque(maxlen=1000)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Watch `loop` (default: the running one); call from the loop's thread"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        try:
+            self.attach(loop)
+        except RuntimeError:
+            pass  # No running loop yet: attach() from the loop thread later
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Loop watchdog started (interval=%.0fms, threshold=%.0fms)",
+            self.interval * 1000, self.threshold * 1000
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            loop = self._loop
+            # A stopped (but open) loop never services the ping: not a stall
+            if loop is None or loop.is_closed() or not loop.is_running():
+                continue
+
+            serviced = threading.Event()
+            sent = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(serviced.set)
+            except RuntimeError:  # Loop closed between the check and the call
+                continue
+
+            if serviced.wait(self.threshold):
+                self._record_lag(time.perf_counter() - sent)
+                continue
+
+            # Still blocked: capture where, then wait for it to come back
+            stack = self._capture_stack()
+            while not serviced.wait(self.interval):
+                if self._stop.is_set() or loop.is_closed() or not loop.is_running():
+                    break
+            if not serviced.is_set():
+                continue  # Loop stopped or closed meanwhile: the sample means nothing
+            lag = time.perf_counter() - sent
+            self._record_lag(lag)
+            self._record_incident(stack, lag)
+
+    def _capture_stack(self) -> traceback.StackSummary:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return traceback.StackSummary()
+        return traceback.extract_stack(frame, limit=self.stack_depth)
+
+    def _record_lag(self, lag: float):
+        self.lags.append(lag)
+        if self.on_lag is not None:
+            self.on_lag(lag, lag >= self.threshold)
+
+    def _record_incident(self, stack: traceback.StackSummary, lag: float):
+        frames = [f for f in stack if not f.filename.startswith(_IGNORED_FILES)]
+        if not frames:
+            return
+        own = [f for f in frames if self._is_own_code(f.filename)]
+        site_frame = own[-1] if own else frames[-1]
+        site = self._describe(site_frame)
+        formatted = [self._describe(f) for f in frames]
+
+        with self._lock:
+            incident = self.incidents.get(site)
+            if incident is None:
+                if len(self.incidents) >= self.max_sites:
+                    # Make room by dropping the least frequent site
+                    del self.incidents[min(self.incidents, key=lambda s: self.incidents[s].count)]
+                incident = self.incidents[site] = LoopIncident(site, self._describe(frames[-1]), formatted)
+            incident.add(lag, formatted)
+            self.incident_count += 1
+
+        logger.warning("Event loop blocked for %.0fms at %s", lag * 1000, site)
+
+    @staticmethod
+    def _is_own_code(filename: str) -> bool:
+        return filename.startswith(str(PROJECT_ROOT)) and 'site-packages' not in filename
+
+    @staticmethod
+    def _describe(frame: traceback.FrameSummary) -> str:
+        path = Path(frame.filename)
+        try:
+            path = path.relative_to(PROJECT_ROOT)
+        except ValueError:
+            pass
+        return f"{path}:{frame.lineno} in {frame.name}"
+
+    def report(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Call sites ordered by total blocked time"""
+        with self._lock:
+            incidents = sorted(self.incidents.values(), key=lambda i: i.total, reverse=True)
+            return [incident.to_dict() for incident in incidents[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self.incidents.clear()
+            self.incident_count = 0
+        self.lags.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            "running": self.running,
+            "interval_ms": round(self.interval * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "samples": len(lags),
+            "lag_p95_ms": round(lags[min(int(len(lags) * 0.95), len(lags) - 1)] * 1000, 2) if lags else 0.0,
+            "lag_max_ms": round(lags[-1] * 1000, 2) if lags else 0.0,
+            "incidents": self.incident_count,
+            "sites": len(self.incidents)
+        }
+
+
+# Global watchdog (started by the app; tests opt in via --loop-watchdog)
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,98 @@
+"""
+Small in-process LRU cache with hit statistics
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping with least-recently-used eviction
+
+    Bounded by entry count, and also by total size when `maxbytes` is given
+    (`sizeof(value)` is measured once per set; a value larger than the whole
+    budget is not kept)
+    """
+
+    def __init__(self, maxsize: int = 256, maxbytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = max(1, int(maxsize))
+        self.maxbytes = int(maxbytes) if maxbytes else None
+        self._sizeof = sizeof if self.maxbytes else None
+        self._sizes: Dict[Hashable, int] = {}
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Value without touching recency or hit counts"""
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            if self._sizeof is not None:
+                size = self._sizeof(value)
+                self.bytes -= self._sizes.pop(key, 0)
+                if size > self.maxbytes:  # Would evict everything else and still not fit
+                    self._data.pop(key, None)
+                    return
+                self.bytes += size
+                self._sizes[key] = size
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (self.maxbytes and self.bytes > self.maxbytes):
+                evicted, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(evicted, 0)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            self.bytes -= self._sizes.pop(key, 0)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Snapshot of the entries (no recency or hit-count changes)"""
+        with self._lock:
+            return list(self._data.items())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+        if self.maxbytes:
+            stats.update(bytes=self.bytes, maxbytes=self.maxbytes)
+        return stats
@@ -0,0 +1,62 @@
+"""
+Per-text features shared by every analyzer
+Build one TextFeatures per message and hand it to the NLP engine, agents,
+flow tracker and memory scorer instead of letting each re-split and
+re-lowercase the raw string
+"""
+import sys
+from typing import Dict, Tuple, Union
+
+# Shared stop-word table (interned so token lookups compare by identity first)
+STOP_WORDS = frozenset(sys.intern(w) for w in (
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did',
+    'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'
+))
+
+
+class TextFeatures:
+    """Immutable-by-convention token view of one text
+
+    words          whitespace tokens, original case
+    tokens         lowercase whitespace tokens
+    content_terms  tokens minus stop words (order kept)
+    """
+
+    __slots__ = (
+        'text', 'lower', 'words', 'tokens', 'token_set',
+        'content_terms', 'content_set',
+        'has_question', 'has_exclamation', 'has_period',
+        '_ngrams'
+    )
+
+    def __init__(self, text: str):
+        text = text or ''
+        self.text = text
+        self.lower = text.lower()
+        self.words: Tuple[str, ...] = tuple(text.split())
+        self.tokens: Tuple[str, ...] = tuple(self.lower.split())
+        self.token_set = frozenset(self.tokens)
+        self.content_terms: Tuple[str, ...] = tuple(t for t in self.tokens if t not in STOP_WORDS)
+        self.content_set = self.token_set - STOP_WORDS
+        self.has_question = '?' in text
+        self.has_exclamation = '!' in text
+        self.has_period = '.' in text
+        self._ngrams: Dict[int, Tuple[Tuple[str, ...], ...]] = {}
+
+    @classmethod
+    def of(cls, value: Union[str, "TextFeatures", None]) -> "TextFeatures":
+        """Accept either a raw string or already-built features"""
+        return value if isinstance(value, TextFeatures) else cls(value)
+
+    def ngrams(self, n: int = 2) -> Tuple[Tuple[str, ...], ...]:
+        """Token n-grams, computed once per n"""
+        grams = self._ngrams.get(n)
+        if grams is None:
+            tokens = self.tokens
+            grams = self._ngrams[n] = tuple(zip(*(tokens[i:] for i in range(n))))
+        return grams
+
+    def __repr__(self) -> str:
+        return f"TextFeatures({self.text[:40]!r}, tokens={len(self.tokens)})"
@@ -0,0 +1,267 @@
+"""
+Lightweight in-process tracing
+Nested spans per chat turn with head sampling, a ring buffer of recent traces
+and OpenTelemetry-compatible (OTLP/JSON) export
+"""
+import asyncio
+import contextvars
+import random
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Deque, Dict, List, Optional
+from config import settings
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns",
+                 "attributes", "status", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled traces so callers never branch"""
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "dropped_spans")
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+
+    @property
+    def root(self) -> Optional[Span]:
+        return next((s for s in self.spans if s.parent_id is None), None)
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "duration_ms": round(root.duration_ms, 2) if root else None,
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped_spans,
+            "spans": [
+                {
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "offset_ms": round((s.start_ns - root.start_ns) / 1e6, 2) if root else 0.0,
+                    "duration_ms": round(s.duration_ms, 2),
+                    "status": s.status,
+                    "attributes": s.attributes
+                }
+                for s in sorted(self.spans, key=lambda s: s.start_ns)
+            ]
+        }
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans and keeps the most recent sampled traces in memory"""
+
+    def __init__(self, enabled: bool = True, sample_rate: float = 1.0,
+                 max_traces: int = 200, max_spans_per_trace: int = 256,
+                 service_name: str = "ai-friend"):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_spans_per_trace = max_spans_per_trace
+        self.service_name = service_name
+        self.traces: Deque[Trace] = deque(maxlen=max_traces)
+        self.started_traces = 0
+        self.sampled_traces = 0
+
+    def set_sampling(self, sample_rate: Optional[float] = None, enabled: Optional[bool] = None):
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Open the root span of a new trace (the chat-turn entry point); nests if already traced"""
+        if _current_span.get() is not None:
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+
+        self.started_traces += 1
+        if not self.enabled or random.random() >= self.sample_rate:
+            # Unsampled: mark the context so nested spans are skipped too
+            token = _current_span.set(NOOP_SPAN)
+            try:
+                yield NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+        self.sampled_traces += 1
+        trace = Trace()
+        self.traces.append(trace)
+        with self._open(trace, None, name, attributes) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a child of the current span; a no-op outside a trace
+
+        Background work (maintenance, hydration, admin routes) therefore
+        doesn't start single-span traces that push chat turns out of the ring
+        """
+        parent = _current_span.get()
+        if parent is None or parent is NOOP_SPAN:
+            yield NOOP_SPAN
+            return
+        with self._open(parent.trace, parent.span_id, name, attributes) as span:
+            yield span
+
+    @contextmanager
+    def _open(self, trace: Trace, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        span = Span(trace, name, parent_id, attributes)
+        if len(trace.spans) < self.max_spans_per_trace:
+            trace.spans.append(span)
+        else:
+            trace.dropped_spans += 1
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def current_span(self):
+        return _current_span.get() or NOOP_SPAN
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return [t.summary() for t in list(self.traces)[-limit:]][::-1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "started_traces": self.started_traces,
+            "sampled_traces": self.sampled_traces,
+            "buffered_traces": len(self.traces)
+        }
+
+    # =====================================================
+    # OTLP/JSON EXPORT
+    # =====================================================
+    def export_otlp(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Recent traces as an OTLP/JSON ExportTraceServiceRequest"""
+        traces = list(self.traces)
+        if limit:
+            traces = traces[-limit:]
+
+        spans = []
+        for trace in traces:
+            for span in trace.spans:
+                spans.append({
+                    "traceId": trace.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                    "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+                    "status": (
+                        {"code": 2, "message": span.error or ""}  # STATUS_CODE_ERROR
+                        if span.status == "error" else {"code": 1}  # STATUS_CODE_OK
+                    )
+                })
+
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [_otlp_attribute("service.name", self.service_name)]
+                },
+                "scopeSpans": [{
+                    "scope": {"name": "ai_friend.tracing", "version": "1.0.0"},
+                    "spans": spans
+                }]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def traced(name: Optional[str] = None):
+    """Decorator that wraps a sync or async function in a span (when called inside a trace)"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        # Outside a trace the call runs untouched: no context manager at all
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Global tracer instance
+tracer = Tracer(
+    enabled=settings.get('tracing.enabled', True),
+    sample_rate=settings.get('tracing.sample_rate', 1.0),
+    max_traces=settings.get('tracing.max_traces', 200),
+    max_spans_per_trace=settings.get('tracing.max_spans_per_trace', 256),
+    service_name=settings.get('tracing.service_name', 'ai-friend')
+)